@@ -0,0 +1,315 @@
+"""
+This module holds the analysis pipeline shared by the scripts as pure functions.
+Every function takes arrays, Series or DataFrames and returns new ones, so it can be
+imported into services and called in a loop without the interactive prompts.
+
+Pipeline: close -> fill missing values -> log returns -> risk adjustment
+-> rolling metric -> IQR bounds -> outliers
+
+Author: kangwijen
+
+Example:
+    from analytics import fill_missing, log_returns, risk_adjust, rolling_sharpe
+    returns = risk_adjust(log_returns(fill_missing(data['Close'])), 0.05, 252)
+    sharpe = fill_missing(rolling_sharpe(returns, 21))
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Anderson-Darling critical values of the fitted normal distribution at 15%, 10%, 5%, 2.5% and 1%
+ANDERSON_SIGNIFICANCE_LEVELS = np.array([15.0, 10.0, 5.0, 2.5, 1.0])
+ANDERSON_CRITICAL_VALUES = np.array([0.561, 0.631, 0.752, 0.873, 1.035])
+
+# Anderson-Darling test of normality, with the same attribute names as scipy's result
+AndersonResult = namedtuple('AndersonResult', ['statistic', 'pvalue', 'critical_values', 'significance_level'])
+
+
+def fill_missing(data):
+    """
+    Forward fill and then backward fill missing values.
+    """
+    return data.ffill().bfill()
+
+
+def fill_listed(data, returns):
+    """
+    Fill missing values like `fill_missing`, but only over the dates from each column's first
+    return on, so the dates before a ticker was listed stay missing.
+    """
+    listed = returns.notna().cummax()
+    return fill_missing(data.where(listed)).where(listed)
+
+
+def log_returns(data):
+    """
+    Calculate the log returns of a close series or (dates x tickers) frame.
+    The first row, which has no previous close, is dropped.
+    """
+    return np.log(data / data.shift(1)).iloc[1:]
+
+
+def risk_adjust(returns, risk_free_rate=0.05, period=252):
+    """
+    Subtract the per-period risk-free rate from the returns.
+    """
+    return returns - risk_free_rate / period
+
+
+def align_returns(returns, benchmark_returns):
+    """
+    Align the returns and the benchmark returns by index (date), keeping common dates only.
+    """
+    return returns.align(benchmark_returns, join='inner', axis=0)
+
+
+def cumulative_sums(values):
+    """
+    Calculate the prefix sums of a 1-D or 2-D array with NaN counted as zero.
+    Returns the prefix sums and the prefix counts of NaN, both with a leading zero row.
+    """
+    values = np.asarray(values, dtype='float64')
+    missing = np.isnan(values)
+    zeros = np.zeros((1,) + values.shape[1:])
+    cumulative = np.concatenate([zeros, np.cumsum(np.where(missing, 0.0, values), axis=0)])
+    missing_count = np.concatenate([zeros, np.cumsum(missing, axis=0)])
+    return cumulative, missing_count
+
+
+def window_sums(cumulative, missing_count, window):
+    """
+    Calculate the rolling sums from `cumulative_sums` output in O(n).
+    Windows that contain a NaN are NaN, like pandas' `rolling(window).sum()`.
+    """
+    result = np.full(cumulative[1:].shape, np.nan)
+    sums = cumulative[window:] - cumulative[:-window]
+    sums[(missing_count[window:] - missing_count[:-window]) > 0] = np.nan
+    result[window - 1:] = sums
+    return result
+
+
+def rolling_sum(values, window):
+    """
+    Calculate the rolling sum over the rows of a 1-D or 2-D array with cumulative sums.
+    Windows that contain a NaN are NaN, like pandas' `rolling(window).sum()`.
+    """
+    return window_sums(*cumulative_sums(values), window)
+
+
+def _like(result, data):
+    """
+    Wrap a NumPy result in the pandas type of the input, if any.
+    """
+    if isinstance(data, pd.DataFrame):
+        return pd.DataFrame(result, index=data.index, columns=data.columns)
+    if isinstance(data, pd.Series):
+        return pd.Series(result, index=data.index, name=data.name)
+    return result
+
+
+def rolling_downside_deviation(returns, window=21, minimum_acceptable_return=0.0):
+    """
+    Calculate the rolling downside deviation over the full return series.
+    It is the root mean square of the shortfalls below the minimum acceptable return in each window,
+    computed from cumulative sums in O(n) for a series or a (dates x tickers) matrix.
+    """
+    values = np.asarray(returns, dtype='float64')
+    shortfalls = np.minimum(values - minimum_acceptable_return, 0.0)
+    deviation = np.sqrt(rolling_sum(shortfalls * shortfalls, window) / window)
+    return _like(deviation, returns)
+
+
+def rolling_sharpe(returns, window=21):
+    """
+    Calculate the rolling Sharpe ratio of risk-adjusted returns.
+    """
+    rolling = returns.rolling(window)
+    return rolling.mean() / rolling.std()
+
+
+def rolling_sortino(returns, window=21, minimum_acceptable_return=0.0):
+    """
+    Calculate the rolling Sortino ratio of risk-adjusted returns.
+    Windows without any shortfall below the minimum acceptable return are NaN.
+    """
+    downside_deviation = rolling_downside_deviation(returns, window, minimum_acceptable_return)
+    excess_return = returns.rolling(window).mean() - minimum_acceptable_return
+    return excess_return / downside_deviation.where(downside_deviation > 0)
+
+
+def rolling_beta(returns, benchmark_returns, window=21):
+    """
+    Calculate the rolling beta of the returns against aligned benchmark returns.
+    """
+    rolling_covariance = returns.rolling(window).cov(benchmark_returns)
+    rolling_variance = benchmark_returns.rolling(window).var()
+    return rolling_covariance.div(rolling_variance, axis=0)
+
+
+def rolling_treynor(returns, beta, window=21):
+    """
+    Calculate the rolling Treynor ratio of risk-adjusted returns from their rolling beta.
+    """
+    return returns.rolling(window).mean() / beta
+
+
+def rolling_alpha(returns, benchmark_returns, beta, window=21, risk_free_rate=0.05, period=252):
+    """
+    Calculate the smoothed rolling Alpha of risk-adjusted returns.
+    The expected return comes from the CAPM with the rolling beta and the benchmark's rolling mean.
+    """
+    daily_risk_free_rate = risk_free_rate / period
+
+    # Calculate the expected return of the stock
+    rolling_mean = benchmark_returns.rolling(window).mean()
+    expected_return = daily_risk_free_rate + beta.mul(rolling_mean - daily_risk_free_rate, axis=0)
+
+    # Calculate the rolling Alpha, fill missing values and smooth it
+    alpha = fill_missing(returns - expected_return)
+    return alpha.ewm(span=window).mean()
+
+
+def iqr_bounds(data, scale=1.5):
+    """
+    Calculate the lower and upper outlier bounds with the IQR rule.
+    Returns scalars for a Series and per-column Series for a DataFrame.
+    """
+    q1 = data.quantile(0.25)
+    q3 = data.quantile(0.75)
+    iqr = q3 - q1
+    return q1 - scale * iqr, q3 + scale * iqr
+
+
+def rolling_quantiles(data, window, probabilities):
+    """
+    Calculate rolling quantiles over the rows of a Series or (dates x tickers) frame with pandas'
+    `rolling().quantile`, which keeps every column's window in a skiplist in compiled code.
+    `kernels.rolling_quantiles` swaps in a compiled sorted-window kernel when numba is installed.
+    Windows that contain a NaN are NaN.
+    Returns one result per probability, shaped like the input.
+    """
+    values = np.asarray(data, dtype='float64')
+    rolling = pd.DataFrame(values[:, None] if values.ndim == 1 else values).rolling(window)
+    results = [rolling.quantile(probability).to_numpy() for probability in probabilities]
+    return [_like(result[:, 0] if values.ndim == 1 else result, data) for result in results]
+
+
+def rolling_iqr_bounds(data, window=252, scale=1.5):
+    """
+    Calculate time-varying lower and upper outlier bounds with the IQR rule over a rolling window.
+    Returns bounds shaped like the input.
+    """
+    q1, q3 = rolling_quantiles(data, window, [0.25, 0.75])
+    iqr = q3 - q1
+    return q1 - scale * iqr, q3 + scale * iqr
+
+
+def find_outliers(data, lower_bound, upper_bound):
+    """
+    Return the values of a series that fall outside the bounds.
+    """
+    return data[(data < lower_bound) | (data > upper_bound)]
+
+
+def summary_statistics(returns):
+    """
+    Calculate the mean, standard deviation, skewness and kurtosis of the returns.
+    """
+    return {
+        'mean': returns.mean(),
+        'std_dev': returns.std(),
+        'skewness': returns.skew(),
+        'kurtosis': returns.kurtosis(),
+    }
+
+
+def normality_tests(returns):
+    """
+    Run the Jarque-Bera, Shapiro-Wilk, Kolmogorov-Smirnov and Anderson-Darling tests.
+    Returns (statistic, p-value) pairs keyed by test name, and the Anderson-Darling result.
+    The Anderson-Darling p-value is interpolated from scipy's tables, so it is clipped to the
+    1% to 15% range, and NaN on SciPy before 1.17.
+    """
+    from scipy.stats import shapiro, anderson, kstest, jarque_bera
+
+    values = np.asarray(pd.Series(returns).dropna(), dtype='float64')
+    tests = {
+        'jarque_bera': tuple(jarque_bera(values)),
+        'shapiro_wilk': tuple(shapiro(values)),
+        'kolmogorov_smirnov': tuple(kstest(values, 'norm')),
+    }
+    try:
+        statistic, p_value = anderson(values, method='interpolate')
+    except TypeError:
+        # Older SciPy has no `method` and only reports the critical values
+        statistic, p_value = anderson(values).statistic, np.nan
+    return tests, AndersonResult(
+        statistic, p_value, anderson_critical_values(len(values)), ANDERSON_SIGNIFICANCE_LEVELS
+    )
+
+
+def anderson_critical_values(count):
+    """
+    Return the Anderson-Darling critical values of the fitted normal at the
+    ANDERSON_SIGNIFICANCE_LEVELS for samples of `count` values, adjusted for the sample size and
+    rounded like scipy's `anderson`. An array of counts gives one row per count.
+    """
+    count = np.asarray(count, dtype='float64')
+    adjustment = 1.0 + 0.75 / count + 2.25 / count ** 2
+    return np.around(ANDERSON_CRITICAL_VALUES / adjustment[..., None], 3)
+
+
+def unit_root_tests(returns):
+    """
+    Run the augmented Dickey-Fuller, Phillips-Perron and KPSS tests.
+    Returns (statistic, p-value) pairs keyed by test name.
+    """
+    from arch.unitroot import ADF, PhillipsPerron, KPSS
+
+    results = {
+        'adf': ADF(returns),
+        'phillips_perron': PhillipsPerron(returns),
+        'kpss': KPSS(returns),
+    }
+    return {name: (result.stat, result.pvalue) for name, result in results.items()}
+
+
+def ljung_box(returns, lags=10):
+    """
+    Run the Ljung-Box test for every lag up to `lags`.
+    Returns a frame with the 'lb_stat' and 'lb_pvalue' columns indexed by lag.
+    """
+    from statsmodels.stats.diagnostic import acorr_ljungbox
+
+    return acorr_ljungbox(returns, lags=lags, return_df=True)
+
+
+def durbin_watson(returns):
+    """
+    Calculate the Durbin-Watson statistic of the returns.
+    """
+    from statsmodels.stats.stattools import durbin_watson as statsmodels_durbin_watson
+
+    return statsmodels_durbin_watson(returns)
+
+
+def qq_plot_data(returns):
+    """
+    Calculate the normal QQ plot quantiles and the least-squares fit line.
+    Returns the theoretical quantiles, the sample quantiles and the (slope, intercept, r) fit.
+    """
+    from scipy import stats
+
+    (osm, osr), fit = stats.probplot(returns, dist='norm')
+    return osm, osr, fit
+
+
+def seasonal_decomposition(data, period=30):
+    """
+    Perform a multiplicative seasonal decomposition of a close series.
+    """
+    from statsmodels.tsa.seasonal import seasonal_decompose
+
+    return seasonal_decompose(data, model='multiplicative', period=period)
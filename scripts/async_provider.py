@@ -0,0 +1,302 @@
+"""
+This script fetches daily bars of many symbols concurrently with asyncio, so a nightly refresh of
+a universe waits on the network once instead of once per symbol. All requests share one HTTP
+connection pool, at most CONCURRENCY of them are in flight, a token bucket keeps them under RATE
+requests per second, and throttled or failed requests are retried with exponential backoff. The
+base URL is configurable, so the provider runs against a local stub server serving the same
+chart JSON. It needs aiohttp (`pip install aiohttp`), which is only imported on the first fetch.
+
+Author: kangwijen
+
+Parameters: symbols on the command line or a file with one symbol per line
+Returns: None
+Example: python async_provider.py --file idx.txt --concurrency 8 --rate 5
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+
+import numpy as np
+import pandas as pd
+
+from symbols import read_symbols
+from pricestore import COLUMNS, PriceStore, Provider, normalize_bars
+
+# Default server of the chart endpoint
+DEFAULT_BASE_URL = 'https://query1.finance.yahoo.com'
+
+# HTTP statuses worth retrying: throttling and server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def transient_errors():
+    """
+    Return the exceptions worth retrying: connection errors and timeouts, including aiohttp's own
+    when it is installed, whether the session was opened here or passed in.
+    """
+    errors = (OSError, asyncio.TimeoutError)
+    try:
+        import aiohttp
+    except ImportError:
+        return errors
+    return errors + (aiohttp.ClientError,)
+
+
+class TokenBucket:
+    """
+    Token bucket that lets `rate` requests per second through, with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = None
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Wait until a token is available and take it.
+        """
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self.updated is not None:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                # Hold the lock while waiting so the tokens go out in order
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.updated = loop.time()
+            self.tokens -= 1
+
+
+def parse_chart(payload, symbol):
+    """
+    Turn a chart endpoint response into the store columns, dated in the exchange's time zone.
+    """
+    chart = payload.get('chart') or {}
+    if chart.get('error'):
+        raise ValueError(f"{symbol}: {chart['error'].get('description', chart['error'])}")
+    result = (chart.get('result') or [None])[0]
+    if not result or not result.get('timestamp'):
+        return pd.DataFrame(columns=COLUMNS, dtype='float64')
+
+    quote = result['indicators']['quote'][0]
+    timezone = result.get('meta', {}).get('exchangeTimezoneName', 'UTC')
+    dates = pd.to_datetime(result['timestamp'], unit='s', utc=True).tz_convert(timezone).normalize()
+    data = pd.DataFrame(
+        {column: np.asarray(quote.get(column.lower(), []), dtype='float64') for column in COLUMNS},
+        index=dates
+    )
+    return normalize_bars(data.dropna(subset=['Close']))
+
+
+class AsyncProvider(Provider):
+    """
+    Fetch daily bars from a Yahoo-style chart endpoint over a shared aiohttp session.
+    Use `fetch_many` inside `async with` to fetch many symbols concurrently; `fetch` opens a
+    session for one symbol so the provider also plugs into a `PriceStore`.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, concurrency=8, rate=5.0, burst=None, retries=4,
+                 backoff=0.5, max_backoff=30.0, timeout=30.0, session=None):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = session
+        self.owns_session = False
+        self.semaphore = None
+        self.bucket = None
+        self.transient_errors = None
+
+    async def __aenter__(self):
+        if self.session is None:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency)
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': 'Mozilla/5.0'}
+            )
+            self.owns_session = True
+        self.transient_errors = transient_errors()
+        # The limits belong to the running event loop
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.bucket = TokenBucket(self.rate, self.burst)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.owns_session:
+            await self.session.close()
+            self.session = None
+            self.owns_session = False
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Return the seconds to wait before a retry: the server's Retry-After when given, otherwise
+        an exponential backoff with full jitter, capped at `max_backoff`.
+        """
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff * 2 ** attempt, self.max_backoff))
+
+    async def get_json(self, url, params=None):
+        """
+        GET a JSON document within the concurrency and rate limits, retrying throttled requests,
+        server errors and connection errors up to `retries` times.
+        """
+        attempt = 0
+        while True:
+            retry_after = None
+            async with self.semaphore:
+                await self.bucket.acquire()
+                try:
+                    async with self.session.get(url, params=params) as response:
+                        if response.status < 400 or response.status == 404:
+                            return await response.json(content_type=None)
+                        if response.status not in RETRY_STATUSES or attempt >= self.retries:
+                            raise ValueError(f'HTTP {response.status} from {url}')
+                        retry_after = response.headers.get('Retry-After')
+                except self.transient_errors as error:
+                    if attempt >= self.retries:
+                        raise ValueError(f'Request to {url} failed: {error}') from error
+            # Back off outside the semaphore so the other requests keep going
+            await asyncio.sleep(self.delay(attempt, retry_after))
+            attempt += 1
+
+    async def fetch_async(self, symbol, start=None):
+        """
+        Return the bars of a symbol from `start` (inclusive) onwards, or the full history.
+        """
+        start = pd.Timestamp(start) if start is not None else pd.Timestamp(0)
+        # The cached dates are in the exchange's time zone, which may be ahead of UTC, so ask from a
+        # day earlier to get the last cached bar again and trim to `start` afterwards
+        params = {
+            'period1': max(int((start - pd.Timedelta(days=1)).timestamp()), 0),
+            'period2': int(pd.Timestamp.now().timestamp()) + 86400,
+            'interval': '1d',
+            'events': 'history',
+        }
+        payload = await self.get_json(f'{self.base_url}/v8/finance/chart/{symbol}', params)
+        data = parse_chart(payload, symbol)
+        return data.loc[start.normalize():] if not data.empty else data
+
+    async def fetch_many(self, symbols, start=None):
+        """
+        Fetch many symbols concurrently. `start` is one date for every symbol or a dict of dates
+        by symbol.
+        Returns a dict of bars by symbol and a dict of the symbols that failed with their error.
+        """
+        starts = start if isinstance(start, dict) else dict.fromkeys(symbols, start)
+        results = await asyncio.gather(
+            *(self.fetch_async(symbol, starts.get(symbol)) for symbol in symbols), return_exceptions=True
+        )
+        bars = {}
+        errors = {}
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                errors[symbol] = str(result)
+            else:
+                bars[symbol] = result
+        return bars, errors
+
+    def fetch(self, symbol, start=None):
+        """
+        Fetch one symbol synchronously, for use as a `PriceStore` provider.
+        """
+        async def run():
+            async with self:
+                return await self.fetch_async(symbol, start)
+
+        return asyncio.run(run())
+
+
+class PrefetchedProvider(Provider):
+    """
+    Serve bars that were already fetched, so `PriceStore.update` merges them as usual.
+    """
+
+    def __init__(self, bars):
+        self.bars = bars
+
+    def fetch(self, symbol, start=None):
+        data = self.bars[symbol]
+        return data.loc[pd.Timestamp(start):] if start is not None else data
+
+
+async def refresh_async(symbols, store=None, provider=None):
+    """
+    Bring the store up to date for many symbols, fetching the bars after every symbol's last
+    cached date concurrently and merging them like `PriceStore.update`.
+    Returns a dict of the symbols that failed with their error.
+    """
+    store = store or PriceStore()
+    provider = provider or AsyncProvider()
+    stale = [symbol for symbol in symbols if not store.is_fresh(symbol)]
+    starts = {}
+    for symbol in stale:
+        cached = store.load(symbol)
+        starts[symbol] = None if cached is None or cached.empty else cached.index[-1]
+
+    async with provider:
+        bars, errors = await provider.fetch_many(stale, starts)
+
+    # Merge and write with the store's own logic, serving the fetched bars instead of fetching again
+    fetcher = store.provider
+    store.provider = PrefetchedProvider(bars)
+    try:
+        for symbol in bars:
+            try:
+                store.update(symbol)
+            except Exception as error:
+                errors[symbol] = str(error)
+    finally:
+        store.provider = fetcher
+    return errors
+
+
+def refresh(symbols, store=None, provider=None):
+    """
+    Run `refresh_async` from synchronous code.
+    """
+    return asyncio.run(refresh_async(symbols, store, provider))
+
+
+def main(argv=None):
+    """
+    Parse the command line and refresh the price store for many symbols concurrently.
+    """
+    parser = argparse.ArgumentParser(description='Concurrent refresh of the price store.')
+    parser.add_argument('symbols', nargs='*', help='stock symbols')
+    parser.add_argument('--file', help='file with one symbol per line')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help=f'chart server (default is {DEFAULT_BASE_URL})')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight (default is 8)')
+    parser.add_argument('--rate', type=float, default=5.0, help='requests per second (default is 5)')
+    parser.add_argument('--retries', type=int, default=4, help='retries per request (default is 4)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds per request (default is 30)')
+    args = parser.parse_args(argv)
+
+    symbols = read_symbols(args.symbols, args.file)
+    if not symbols:
+        parser.error('no symbols given')
+    provider = AsyncProvider(args.base_url, args.concurrency, args.rate, retries=args.retries, timeout=args.timeout)
+    errors = refresh(symbols, provider=provider)
+    for symbol, error in errors.items():
+        print(f'Skipped {symbol}: {error}', file=sys.stderr)
+    print(f'Refreshed {len(symbols) - len(errors)} of {len(symbols)} symbols')
+
+
+if __name__ == '__main__':
+    main()
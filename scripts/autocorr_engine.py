@@ -0,0 +1,199 @@
+"""
+This module runs the Ljung-Box and Durbin-Watson tests on a whole (dates x tickers) return matrix.
+The autocorrelation function of every column comes from one FFT along the dates, so the Ljung-Box
+Q statistics for any set of lags are cheap once it is known. The rolling mode tracks the tests over
+a moving window from prefix sums of the lagged products, in O(n x lags) per ticker.
+
+Author: kangwijen
+
+Example:
+    tests = batch_ljung_box(log_returns_matrix, lags=[5, 10, 20])
+    statistic, p_value = rolling_ljung_box(log_returns_matrix, window=252, lags=10)
+"""
+
+import numpy as np
+import pandas as pd
+
+from analytics import cumulative_sums, _like
+
+
+def _as_matrix(returns):
+    """
+    Return the returns as a 2-D float array with the dates along axis 0.
+    """
+    values = np.asarray(returns, dtype='float64')
+    return values[:, None] if values.ndim == 1 else values
+
+
+def _shaped(result, returns):
+    """
+    Wrap a 2-D result in the type and shape of the input returns.
+    """
+    return _like(result[:, 0] if np.ndim(returns) == 1 else result, returns)
+
+
+def _lag_list(lags):
+    """
+    Return the lags to test, 1 to `lags` for an int or the sorted given lags.
+    """
+    if np.isscalar(lags):
+        return np.arange(1, int(lags) + 1)
+    return np.unique(np.asarray(lags, dtype='int64'))
+
+
+def batch_acf(returns, nlags=10):
+    """
+    Calculate the autocorrelation function up to `nlags` of every column with one FFT.
+    NaN are left out of the mean and count as zero in the products, so columns that start
+    later than others give the same result as their trimmed series.
+    Returns a (nlags + 1 x tickers) array and the number of observations of every column.
+    """
+    values = _as_matrix(returns)
+    present = ~np.isnan(values)
+    count = present.sum(axis=0)
+    mean = np.where(present, values, 0.0).sum(axis=0) / count
+    centered = np.where(present, values - mean, 0.0)
+
+    # Zero-pad to a power of two at least twice the length so the correlation is not circular
+    length = values.shape[0]
+    size = 1 << int(np.ceil(np.log2(2 * length - 1)))
+    spectrum = np.fft.rfft(centered, n=size, axis=0)
+    autocovariance = np.fft.irfft(spectrum * np.conj(spectrum), n=size, axis=0)[:nlags + 1]
+    return autocovariance / autocovariance[0], count
+
+
+def batch_ljung_box(returns, lags=10):
+    """
+    Run the Ljung-Box test for every lag in `lags` (an int means 1 to `lags`) on every column.
+    Returns a frame with the 'lb_stat' and 'lb_pvalue' columns indexed by (symbol, lag), like
+    statsmodels' `acorr_ljungbox` per ticker.
+    """
+    from scipy.stats import chi2
+
+    frame = returns.to_frame() if isinstance(returns, pd.Series) else pd.DataFrame(returns)
+    lag_list = _lag_list(lags)
+    acf, count = batch_acf(frame, lag_list[-1])
+
+    # Accumulate rho_k^2 / (n - k) over the lags and scale by n (n + 2)
+    all_lags = np.arange(1, lag_list[-1] + 1)[:, None]
+    terms = np.cumsum(acf[1:] ** 2 / (count - all_lags), axis=0)
+    statistic = (count * (count + 2) * terms)[lag_list - 1]
+    p_value = chi2.sf(statistic, lag_list[:, None])
+
+    index = pd.MultiIndex.from_product([frame.columns, lag_list], names=['symbol', 'lag'])
+    return pd.DataFrame({
+        'lb_stat': statistic.T.ravel(),
+        'lb_pvalue': p_value.T.ravel(),
+    }, index=index)
+
+
+def batch_durbin_watson(returns):
+    """
+    Calculate the Durbin-Watson statistic of every column, ignoring NaN.
+    """
+    values = _as_matrix(returns)
+    differences = np.nansum(np.diff(values, axis=0) ** 2, axis=0)
+    statistic = differences / np.nansum(values ** 2, axis=0)
+    if isinstance(returns, pd.DataFrame):
+        return pd.Series(statistic, index=returns.columns, name='durbin_watson')
+    return statistic[0] if np.ndim(returns) == 1 else statistic
+
+
+def batch_autocorrelation(returns, lags=10, significance=0.05):
+    """
+    Summarize the Ljung-Box and Durbin-Watson tests per ticker, with the same columns as the
+    universe runner: the Ljung-Box test at the largest lag, the smallest p-value over the lags,
+    whether any lag is significant and the Durbin-Watson statistic.
+    """
+    frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+    tests = batch_ljung_box(frame, lags)
+    grouped = tests.groupby(level='symbol', sort=False)
+    last = grouped.last()
+    results = pd.DataFrame({
+        'ljung_box_stat': last['lb_stat'],
+        'ljung_box_pvalue': last['lb_pvalue'],
+        'ljung_box_min_pvalue': grouped['lb_pvalue'].min(),
+    })
+    results['significant'] = results['ljung_box_min_pvalue'] < significance
+    results['durbin_watson'] = batch_durbin_watson(frame)
+    return results.reindex(frame.columns)
+
+
+def _trailing_sums(cumulative, end, length):
+    """
+    Return the sums of the `length` rows ending at every row in `end` from prefix sums.
+    """
+    return cumulative[end + 1] - cumulative[end + 1 - length]
+
+
+def rolling_ljung_box(returns, window=252, lags=10):
+    """
+    Run the Ljung-Box test with lags 1 to `lags` over a rolling window of every column.
+    Every window is demeaned on its own, like running `acorr_ljungbox` on each window, but the
+    lagged products come from prefix sums, so the cost does not grow with the window.
+    Windows that contain a NaN are NaN.
+    Returns the statistic and the p-value, shaped like the input.
+    """
+    from scipy.stats import chi2
+
+    values = _as_matrix(returns)
+    length = values.shape[0]
+    statistic = np.full(values.shape, np.nan)
+    if length < window:
+        return _shaped(statistic, returns), _shaped(statistic.copy(), returns)
+
+    # Centre the data first to keep the prefix sums precise
+    values = values - np.nanmean(values, axis=0)
+    x_sums, missing_count = cumulative_sums(values)
+    square_sums, _ = cumulative_sums(values * values)
+    end = np.arange(window - 1, length)
+    complete = (missing_count[end + 1] - missing_count[end + 1 - window]) == 0
+
+    # Sum and sum of squares of every window, demeaned with the window mean
+    mean = _trailing_sums(x_sums, end, window) / window
+    variance = _trailing_sums(square_sums, end, window) - window * mean * mean
+
+    terms = np.zeros((len(end), values.shape[1]))
+    filled = np.where(np.isnan(values), 0.0, values)
+    product_sums = np.zeros((length + 1, values.shape[1]))
+    for lag in range(1, lags + 1):
+        pairs = window - lag
+        # Prefix sums of the products x[t] * x[t - lag], aligned with t
+        product_sums[lag] = 0.0
+        np.cumsum(filled[lag:] * filled[:-lag], axis=0, out=product_sums[lag + 1:])
+        covariance = (
+            _trailing_sums(product_sums, end, pairs)
+            - mean * (_trailing_sums(x_sums, end - lag, pairs) + _trailing_sums(x_sums, end, pairs))
+            + pairs * mean * mean
+        )
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terms += (covariance / variance) ** 2 / pairs
+
+    statistic[window - 1:] = np.where(complete, window * (window + 2) * terms, np.nan)
+    p_value = chi2.sf(statistic, lags)
+    return _shaped(statistic, returns), _shaped(p_value, returns)
+
+
+def rolling_durbin_watson(returns, window=252):
+    """
+    Calculate the Durbin-Watson statistic over a rolling window of every column from prefix sums.
+    Windows that contain a NaN are NaN.
+    """
+    values = _as_matrix(returns)
+    length = values.shape[0]
+    statistic = np.full(values.shape, np.nan)
+    if length < window:
+        return _shaped(statistic, returns)
+
+    square_sums, missing_count = cumulative_sums(values * values)
+    differences = np.concatenate([np.zeros((1, values.shape[1])), np.diff(values, axis=0)])
+    difference_sums, _ = cumulative_sums(differences * differences)
+    end = np.arange(window - 1, length)
+    complete = (missing_count[end + 1] - missing_count[end + 1 - window]) == 0
+
+    # The window holds window - 1 differences, the first one reaches into the previous window
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = (_trailing_sums(difference_sums, end, window - 1)
+                 / _trailing_sums(square_sums, end, window))
+    statistic[window - 1:] = np.where(complete, ratio, np.nan)
+    return _shaped(statistic, returns)
@@ -0,0 +1,173 @@
+"""
+This script computes the rolling Sharpe, Sortino, Treynor and Alpha ratios for many stocks at once.
+It loads the closes of every symbol, builds one aligned (dates x tickers) return matrix and computes
+each rolling ratio as a single column-wise pass, then writes one tidy result table.
+
+Author: kangwijen
+
+Parameters: symbols on the command line or a file with one symbol per line
+Returns: None
+Example: python batch.py --file idx.txt --latest --output screen.csv
+"""
+
+import argparse
+import sys
+
+import pandas as pd
+
+from analytics import (
+    fill_missing, fill_listed, log_returns, risk_adjust, align_returns, rolling_sharpe, rolling_sortino,
+    iqr_bounds
+)
+from beta_engine import BetaEngine, engine_for
+from kernels import rolling_iqr_bounds
+from pricestore import PriceStore
+from symbols import read_symbols
+
+# Ratios computed by the batch
+METRICS = ['sharpe', 'sortino', 'treynor', 'alpha']
+
+
+def load_closes(symbols, store=None):
+    """
+    Load the closes of many symbols into one (dates x tickers) frame.
+    Returns the frame and a dict of the symbols that failed to load with their error.
+    """
+    store = store or PriceStore()
+    closes = {}
+    errors = {}
+    for symbol in symbols:
+        try:
+            closes[symbol] = store.update(symbol)['Close']
+        except Exception as error:
+            errors[symbol] = str(error)
+    if not closes:
+        return pd.DataFrame(), errors
+    return pd.DataFrame(closes).sort_index(), errors
+
+
+def build_returns_matrix(closes):
+    """
+    Turn a (dates x tickers) close frame into aligned log returns.
+    Gaps are forward filled, dates before a ticker's first close stay missing.
+    """
+    return log_returns(closes.ffill())
+
+
+def rolling_ratios(returns, benchmark_returns, period=252, window=21, risk_free_rate=0.05,
+                   minimum_acceptable_return=0.0, benchmark=None):
+    """
+    Compute the rolling Sharpe, Sortino, Treynor and Alpha of every column of a return matrix.
+    The benchmark moments are reused across calls when the benchmark symbol is given.
+    Every column is filled from its own first return on; the dates before a ticker was listed
+    stay missing.
+    Returns a dict of (dates x tickers) frames keyed by metric name.
+    """
+    # Align the stocks and the benchmark by index (date)
+    returns, benchmark_returns = align_returns(returns, benchmark_returns)
+
+    # Calculate the risk-adjusted returns
+    risk_adjusted_returns = risk_adjust(returns, risk_free_rate, period)
+
+    # Calculate the rolling beta of the stocks against the shared benchmark moments
+    if benchmark is None:
+        engine = BetaEngine(benchmark_returns, window)
+    else:
+        engine = engine_for(benchmark, benchmark_returns, window)
+    beta = engine.beta(risk_adjusted_returns)
+
+    return {
+        'sharpe': fill_listed(rolling_sharpe(risk_adjusted_returns, window), risk_adjusted_returns),
+        'sortino': fill_listed(
+            rolling_sortino(risk_adjusted_returns, window, minimum_acceptable_return), risk_adjusted_returns
+        ),
+        'treynor': fill_listed(engine.treynor(risk_adjusted_returns, beta), risk_adjusted_returns),
+        'alpha': engine.alpha(risk_adjusted_returns, beta, risk_free_rate, period),
+    }
+
+
+def tidy_results(ratios, latest=False, bounds_window=None):
+    """
+    Stack the ratio frames into one (date, symbol) table with an outlier flag per metric.
+    The outlier flags use the 1.5 IQR rule over each symbol's full history, or over the last
+    `bounds_window` days when given. Dates before a ticker was listed are left out.
+    """
+    columns = {}
+    for metric, frame in ratios.items():
+        listed = frame.notna()
+        if bounds_window is None:
+            lower_bound, upper_bound = iqr_bounds(frame)
+            outliers = frame.lt(lower_bound, axis=1) | frame.gt(upper_bound, axis=1)
+        else:
+            lower_bound, upper_bound = rolling_iqr_bounds(frame, bounds_window)
+            outliers = frame.lt(lower_bound) | frame.gt(upper_bound)
+        if latest:
+            frame = frame.iloc[[-1]]
+            outliers = outliers.iloc[[-1]]
+            listed = listed.iloc[[-1]]
+        listed = listed.stack()
+        columns[metric] = frame.stack()[listed]
+        columns[f'{metric}_outlier'] = outliers.stack()[listed]
+    table = pd.DataFrame(columns)
+    table.index.names = ['date', 'symbol']
+    return table.reset_index()
+
+
+def run_batch(symbols, benchmark='^JKSE', period=252, window=21, risk_free_rate=0.05,
+              minimum_acceptable_return=0.0, latest=False, store=None, bounds_window=None):
+    """
+    Load the symbols and the benchmark and return the tidy result table and the load errors.
+    """
+    store = store or PriceStore()
+    closes, errors = load_closes(symbols, store)
+    if closes.empty:
+        return pd.DataFrame(), errors
+    benchmark_closes = fill_missing(store.update(benchmark)['Close'])
+    ratios = rolling_ratios(
+        build_returns_matrix(closes), log_returns(benchmark_closes), period, window, risk_free_rate,
+        minimum_acceptable_return, benchmark
+    )
+    return tidy_results(ratios, latest, bounds_window), errors
+
+
+def main(argv=None):
+    """
+    Parse the command line, run the batch and write the result table.
+    """
+    parser = argparse.ArgumentParser(description='Rolling ratios for many stocks at once.')
+    parser.add_argument('symbols', nargs='*', help='stock symbols')
+    parser.add_argument('--file', help='file with one symbol per line')
+    parser.add_argument('--benchmark', default='^JKSE', help='benchmark symbol (default is ^JKSE)')
+    parser.add_argument('--period', type=int, default=252, help='period in days (default is 252)')
+    parser.add_argument('--window', type=int, default=21, help='window size in days (default is 21)')
+    parser.add_argument('--risk-free-rate', type=float, default=0.05,
+                        help='risk-free rate (default is 0.05)')
+    parser.add_argument('--minimum-acceptable-return', type=float, default=0.0,
+                        help='minimum acceptable return of the Sortino ratio (default is 0)')
+    parser.add_argument('--latest', action='store_true', help='only keep the last date per symbol')
+    parser.add_argument('--bounds-window', type=int,
+                        help='rolling window of the outlier bounds in days (default is the full history)')
+    parser.add_argument('--output', help='output .csv or .parquet file (default is stdout)')
+    args = parser.parse_args(argv)
+
+    symbols = read_symbols(args.symbols, args.file)
+    if not symbols:
+        parser.error('no symbols given')
+
+    table, errors = run_batch(
+        symbols, args.benchmark.upper(), args.period, args.window, args.risk_free_rate,
+        args.minimum_acceptable_return, args.latest, bounds_window=args.bounds_window
+    )
+    for symbol, error in errors.items():
+        print(f'Skipped {symbol}: {error}', file=sys.stderr)
+
+    if args.output is None:
+        table.to_csv(sys.stdout, index=False)
+    elif args.output.endswith('.parquet'):
+        table.to_parquet(args.output, index=False)
+    else:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
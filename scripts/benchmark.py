@@ -0,0 +1,326 @@
+"""
+This script times every stage of the analytics pipeline on synthetic prices, so performance
+regressions are caught before a dependency upgrade. The closes are geometric Brownian motions of
+a configurable length and universe width driven by a common market factor, generated offline
+without the price store or any download. Every stage is run the way the scripts run it, and
+the matrix engines next to them, and is reported with its best time, its throughput in series
+per second and its peak traced memory. Results can be saved and compared with an earlier run.
+
+Author: kangwijen
+
+Parameters: None
+Returns: exit code 1 when a stage is slower than the baseline by more than the tolerance
+Example: python benchmark.py --length 2520 --tickers 50 --save baseline.json
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from prettytable import PrettyTable
+from colorama import Fore
+
+from analytics import (
+    fill_missing, log_returns, risk_adjust, align_returns, rolling_sharpe, rolling_sortino,
+    rolling_beta, rolling_treynor, rolling_alpha, iqr_bounds, summary_statistics, normality_tests,
+    unit_root_tests, seasonal_decomposition, ljung_box, durbin_watson
+)
+from autocorr_engine import batch_ljung_box, batch_durbin_watson
+from batch import rolling_ratios
+from decomposition_engine import decompose
+from kernels import fused_ratios, rolling_iqr_bounds
+from normality_engine import batch_normality
+from report import ratio_data, build_ratio_figure
+
+
+def synthetic_prices(length=2520, tickers=50, seed=0, drift=0.08, volatility=0.25, period=252):
+    """
+    Generate daily closes of `tickers` stocks and a benchmark as geometric Brownian motions.
+    Every stock loads on the benchmark with a random beta and adds its own noise, so the
+    ratios against the benchmark are meaningful.
+    Returns a (dates x tickers) close frame and the benchmark close series.
+    """
+    generator = np.random.default_rng(seed)
+    dates = pd.bdate_range('2000-01-03', periods=length)
+    step = 1.0 / period
+
+    # Log returns of the market and of the stocks
+    market = generator.normal((drift - volatility ** 2 / 2) * step, volatility * np.sqrt(step), length)
+    betas = generator.uniform(0.5, 1.5, tickers)
+    noise = generator.normal(0.0, volatility * np.sqrt(step), (length, tickers))
+    returns = market[:, None] * betas + noise
+
+    closes = pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), index=dates,
+                          columns=[f'SYN{ticker:04d}' for ticker in range(tickers)])
+    benchmark_closes = pd.Series(1000 * np.exp(np.cumsum(market)), index=dates, name='BENCHMARK')
+    return closes, benchmark_closes
+
+
+def prepare(closes, benchmark_closes, args):
+    """
+    Compute the inputs every stage starts from once, outside the timed runs.
+    """
+    returns = {symbol: log_returns(fill_missing(closes[symbol])) for symbol in closes.columns}
+    benchmark_returns = log_returns(fill_missing(benchmark_closes))
+    sharpe = pd.DataFrame({
+        symbol: fill_missing(rolling_sharpe(risk_adjust(series, args.risk_free_rate, args.period), args.window))
+        for symbol, series in returns.items()
+    })
+    return {
+        'closes': closes,
+        'benchmark_closes': benchmark_closes,
+        'returns': returns,
+        'returns_matrix': pd.DataFrame(returns),
+        'benchmark_returns': benchmark_returns,
+        'sharpe': sharpe,
+    }
+
+
+def stage_alignment(data, args):
+    """
+    Fill, take the risk-adjusted log returns and align them with the benchmark, like `alpha.py`.
+    """
+    benchmark_returns = log_returns(fill_missing(data['benchmark_closes']))
+    for symbol in data['closes'].columns:
+        returns = risk_adjust(log_returns(fill_missing(data['closes'][symbol])), args.risk_free_rate, args.period)
+        align_returns(returns, benchmark_returns)
+
+
+def stage_rolling_metrics(data, args):
+    """
+    Calculate the rolling Sharpe, Sortino, Treynor and Alpha of every ticker like the ratio scripts.
+    """
+    for returns in data['returns'].values():
+        returns = risk_adjust(returns, args.risk_free_rate, args.period)
+        fill_missing(rolling_sharpe(returns, args.window))
+        fill_missing(rolling_sortino(returns, args.window))
+        returns, benchmark_returns = align_returns(returns, data['benchmark_returns'])
+        beta = rolling_beta(returns, benchmark_returns, args.window)
+        fill_missing(rolling_treynor(returns, beta, args.window))
+        rolling_alpha(returns, benchmark_returns, beta, args.window, args.risk_free_rate, args.period)
+
+
+def stage_batch_metrics(data, args):
+    """
+    Calculate the rolling ratios of the whole return matrix like `batch.py`.
+    """
+    rolling_ratios(data['returns_matrix'], data['benchmark_returns'], args.period, args.window,
+                   args.risk_free_rate)
+
+
+def stage_fused_metrics(data, args):
+    """
+    Calculate the rolling ratios of the whole close matrix with the fused kernels.
+    """
+    fused_ratios(data['closes'], data['benchmark_closes'], args.window, args.risk_free_rate, args.period)
+
+
+def stage_bounds(data, args):
+    """
+    Calculate the IQR bounds of the Sharpe ratio of every ticker and collect its outliers like
+    the ratio scripts.
+    """
+    for symbol in data['sharpe'].columns:
+        ratio = data['sharpe'][symbol]
+        ratio_data(ratio, *iqr_bounds(ratio))
+
+
+def stage_rolling_bounds(data, args):
+    """
+    Calculate the rolling IQR bounds of the Sharpe ratio of every ticker like `--bounds-window`.
+    """
+    rolling_iqr_bounds(data['sharpe'], args.bounds_window)
+
+
+def stage_normality(data, args):
+    """
+    Calculate the summary statistics and run the normality tests of every ticker like `normality.py`.
+    """
+    for returns in data['returns'].values():
+        summary_statistics(returns)
+        normality_tests(returns)
+
+
+def stage_batch_normality(data, args):
+    """
+    Run the normality tests on the whole return matrix at once.
+    """
+    batch_normality(data['returns_matrix'])
+
+
+def stage_autocorrelation(data, args):
+    """
+    Run the Ljung-Box and Durbin-Watson tests of every ticker like `autocorrelation.py`.
+    """
+    for returns in data['returns'].values():
+        ljung_box(returns, lags=10)
+        durbin_watson(returns)
+
+
+def stage_batch_autocorrelation(data, args):
+    """
+    Run the Ljung-Box and Durbin-Watson tests on the whole return matrix at once.
+    """
+    batch_ljung_box(data['returns_matrix'], lags=10)
+    batch_durbin_watson(data['returns_matrix'])
+
+
+def stage_unit_root(data, args):
+    """
+    Run the unit root tests of every ticker like `unitroot.py`.
+    """
+    for returns in data['returns'].values():
+        unit_root_tests(returns)
+
+
+def stage_decomposition(data, args):
+    """
+    Decompose the closes of every ticker and bound the residuals like `decomposition.py`.
+    """
+    for symbol in data['closes'].columns:
+        result = seasonal_decomposition(fill_missing(data['closes'][symbol]), args.seasonal_period)
+        iqr_bounds(fill_missing(result.resid))
+
+
+def stage_fast_decomposition(data, args):
+    """
+    Decompose the whole close matrix at once.
+    """
+    decompose(data['closes'], args.seasonal_period)
+
+
+def stage_figures(data, args):
+    """
+    Build the rolling ratio figure of every ticker without showing or writing it.
+    """
+    for symbol in data['sharpe'].columns:
+        ratio = data['sharpe'][symbol]
+        results = ratio_data(ratio, *iqr_bounds(ratio))
+        build_ratio_figure(results, 'Rolling Sharpe Ratio', f'Rolling Sharpe Ratio for {symbol}', 'Sharpe Ratio')
+
+
+# Stages by name, with the script they stand for
+STAGES = {
+    'alignment': ('alpha.py', stage_alignment),
+    'rolling_metrics': ('sharpe/sortino/treynor/alpha.py', stage_rolling_metrics),
+    'batch_metrics': ('batch.py', stage_batch_metrics),
+    'fused_metrics': ('kernels.py', stage_fused_metrics),
+    'bounds': ('sharpe/sortino/treynor/alpha.py', stage_bounds),
+    'rolling_bounds': ('pyquant.py --bounds-window', stage_rolling_bounds),
+    'normality': ('normality.py', stage_normality),
+    'batch_normality': ('normality_engine.py', stage_batch_normality),
+    'autocorrelation': ('autocorrelation.py', stage_autocorrelation),
+    'batch_autocorrelation': ('autocorr_engine.py', stage_batch_autocorrelation),
+    'unit_root': ('unitroot.py', stage_unit_root),
+    'decomposition': ('decomposition.py', stage_decomposition),
+    'fast_decomposition': ('decomposition_engine.py', stage_fast_decomposition),
+    'figures': ('report.py', stage_figures),
+}
+
+# Parameters that change the work of the stages, which must match for a baseline to be comparable
+PARAMETERS = ('length', 'tickers', 'period', 'window', 'bounds_window', 'seasonal_period')
+
+
+def measure(stage, data, args):
+    """
+    Run a stage `args.repeat` times and once more under tracemalloc.
+    Returns the best time in seconds and the peak traced memory in bytes.
+    """
+    # Warm up the lazy imports and caches so they do not count against the first run
+    stage(data, args)
+    best = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        stage(data, args)
+        best = min(best, time.perf_counter() - start)
+
+    # Measure the memory in a separate run since tracing slows the allocations down
+    tracemalloc.start()
+    try:
+        stage(data, args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def main(argv=None):
+    """
+    Time the selected stages on synthetic prices, print a table and compare with a baseline.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark of the analytics pipeline on synthetic prices.')
+    parser.add_argument('--length', type=int, default=2520, help='number of dates (default is 2520)')
+    parser.add_argument('--tickers', type=int, default=50, help='number of tickers (default is 50)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default is 0)')
+    parser.add_argument('--period', type=int, default=252, help='period in days (default is 252)')
+    parser.add_argument('--window', type=int, default=21, help='window size in days (default is 21)')
+    parser.add_argument('--risk-free-rate', type=float, default=0.05,
+                        help='risk-free rate (default is 0.05)')
+    parser.add_argument('--bounds-window', type=int, default=252,
+                        help='window of the rolling IQR bounds in days (default is 252)')
+    parser.add_argument('--seasonal-period', type=int, default=30,
+                        help='period of the seasonal decomposition in days (default is 30)')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='stages to run (default is all)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs per stage, the fastest one is kept (default is 3)')
+    parser.add_argument('--save', help='write the results to a JSON file')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='slowdown against the baseline that fails a stage (default is 1.25)')
+    args = parser.parse_args(argv)
+
+    parameters = {name: getattr(args, name) for name in PARAMETERS}
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            saved = json.load(file)
+        # Timings of a different workload say nothing about a regression
+        different = [
+            f"--{name.replace('_', '-')} {saved.get(name, 'unknown')} (now {value})"
+            for name, value in parameters.items() if saved.get(name) != value
+        ]
+        if different:
+            parser.error(f'baseline {args.baseline} was run with ' + ', '.join(different))
+        baseline = saved['stages']
+
+    closes, benchmark_closes = synthetic_prices(args.length, args.tickers, args.seed, period=args.period)
+    data = prepare(closes, benchmark_closes, args)
+
+    table = PrettyTable()
+    table.field_names = ['Stage', 'Script', 'Time (ms)', 'Series/s', 'Peak Memory (MB)', 'Baseline (ms)', 'Status']
+    results = {}
+    failed = False
+    for name in args.stages:
+        script, stage = STAGES[name]
+        seconds, peak = measure(stage, data, args)
+        results[name] = {'seconds': seconds, 'series_per_second': args.tickers / seconds, 'peak_bytes': peak}
+
+        # Compare with the baseline run, if any
+        previous = baseline.get(name)
+        ok = previous is None or seconds <= previous['seconds'] * args.tolerance
+        failed = failed or not ok
+        table.add_row([
+            name,
+            script,
+            f'{seconds * 1000:.1f}',
+            f'{args.tickers / seconds:,.0f}',
+            f'{peak / 1024 ** 2:.1f}',
+            '-' if previous is None else f"{previous['seconds'] * 1000:.1f}",
+            Fore.GREEN + 'OK' + Fore.RESET if ok else Fore.RED + 'SLOWER' + Fore.RESET
+        ])
+
+    print(f'{args.tickers} series of {args.length} dates')
+    print(table)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump({**parameters, 'stages': results}, file, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
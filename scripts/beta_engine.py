@@ -0,0 +1,160 @@
+"""
+This module computes rolling betas of many stocks against one benchmark.
+The benchmark's rolling mean and variance are computed once per (benchmark, window) and the
+rolling covariances of every stock come from cumulative sums of cross-products, so scoring a
+universe does not recompute the benchmark moments for each stock.
+The Treynor ratio and the Alpha are derived from the same betas.
+
+Author: kangwijen
+
+Example:
+    engine = engine_for('^JKSE', benchmark_returns, window=21)
+    beta = engine.beta(returns)
+    treynor = engine.treynor(returns, beta)
+    alpha = engine.alpha(returns, beta, risk_free_rate=0.05, period=252)
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from analytics import rolling_sum, fill_listed
+
+# Most engines kept by `engine_for`, the least recently used ones are dropped first
+MAX_ENGINES = 16
+
+# Engines already built, keyed by benchmark name, window and a digest of the benchmark returns
+_ENGINES = OrderedDict()
+_ENGINES_LOCK = threading.Lock()
+
+
+class BetaEngine:
+    """
+    Rolling moments of a benchmark and rolling betas of return matrices against it.
+    The returns passed to the engine must share the benchmark's date index.
+    """
+
+    def __init__(self, benchmark_returns, window=21):
+        self.window = window
+        self.index = benchmark_returns.index
+        values = np.asarray(benchmark_returns, dtype='float64')
+
+        # Center the benchmark so the cumulative sums keep their precision over long histories
+        self.benchmark_center = _center(values)
+        self.benchmark_centered = values - self.benchmark_center
+        self.benchmark_sum = rolling_sum(self.benchmark_centered, window)
+
+        # Calculate the rolling mean and variance of the benchmark
+        self.benchmark_mean = self.benchmark_sum / window + self.benchmark_center
+        squares = rolling_sum(self.benchmark_centered ** 2, window)
+        self.benchmark_variance = (squares - self.benchmark_sum ** 2 / window) / (window - 1)
+
+    def _matrix(self, returns):
+        """
+        Return the returns as a 2-D array checked against the benchmark dates.
+        """
+        if not returns.index.equals(self.index):
+            raise ValueError('returns must share the benchmark date index, align them first')
+        if isinstance(returns, pd.Series):
+            return returns.to_frame()
+        return returns
+
+    def covariance(self, returns):
+        """
+        Calculate the rolling covariance of every column with the benchmark.
+        """
+        frame = self._matrix(returns)
+        values = frame.to_numpy(dtype='float64')
+        centered = values - _center(values)
+        sums = rolling_sum(centered, self.window)
+        cross_products = rolling_sum(centered * self.benchmark_centered[:, None], self.window)
+        covariance = cross_products - sums * self.benchmark_sum[:, None] / self.window
+        covariance /= self.window - 1
+        return self._wrap(covariance, returns)
+
+    def beta(self, returns):
+        """
+        Calculate the rolling beta of every column against the benchmark.
+        """
+        variance = np.where(self.benchmark_variance > 0, self.benchmark_variance, np.nan)
+        return self.covariance(returns).div(variance, axis=0)
+
+    def rolling_mean(self, returns):
+        """
+        Calculate the rolling mean of every column.
+        """
+        frame = self._matrix(returns)
+        values = frame.to_numpy(dtype='float64')
+        center = _center(values)
+        return self._wrap(rolling_sum(values - center, self.window) / self.window + center, returns)
+
+    def treynor(self, returns, beta):
+        """
+        Calculate the rolling Treynor ratio of risk-adjusted returns from their rolling beta.
+        """
+        return self.rolling_mean(returns) / beta
+
+    def alpha(self, returns, beta, risk_free_rate=0.05, period=252):
+        """
+        Calculate the smoothed rolling Alpha of risk-adjusted returns from their rolling beta.
+        Each column is filled and smoothed from its first return on, like `alpha.py` on that ticker alone.
+        """
+        daily_risk_free_rate = risk_free_rate / period
+
+        # Calculate the expected return from the benchmark's rolling mean
+        expected_return = daily_risk_free_rate + beta.mul(
+            self.benchmark_mean - daily_risk_free_rate, axis=0
+        )
+
+        # Calculate the rolling Alpha, fill missing values and smooth it
+        alpha = fill_listed(returns - expected_return, returns)
+        return alpha.ewm(span=self.window).mean()
+
+    def _wrap(self, values, returns):
+        """
+        Wrap a 2-D result like the returns it was computed from.
+        """
+        if isinstance(returns, pd.Series):
+            return pd.Series(values[:, 0], index=self.index, name=returns.name)
+        return pd.DataFrame(values, index=self.index, columns=returns.columns)
+
+
+def _center(values):
+    """
+    Return the mean of every column ignoring NaN, or 0 for columns without any value.
+    """
+    present = ~np.isnan(values)
+    return np.where(present, values, 0.0).sum(axis=0) / np.maximum(present.sum(axis=0), 1)
+
+
+def returns_digest(returns):
+    """
+    Return a digest of the dates and values of a return series, which changes whenever a bar is
+    added or revised, such as a partial last session that was fetched again.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.asarray(returns.index, dtype='datetime64[ns]').tobytes())
+    digest.update(np.ascontiguousarray(returns, dtype='float64').tobytes())
+    return digest.hexdigest()
+
+
+def engine_for(name, benchmark_returns, window=21):
+    """
+    Return the engine of a benchmark and window, building it only the first time for the same
+    benchmark returns. At most MAX_ENGINES engines are kept, the least recently used go first.
+    """
+    key = (name, window, returns_digest(benchmark_returns))
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(key)
+        if engine is not None:
+            _ENGINES.move_to_end(key)
+            return engine
+    engine = BetaEngine(benchmark_returns, window)
+    with _ENGINES_LOCK:
+        _ENGINES[key] = engine
+        while len(_ENGINES) > MAX_ENGINES:
+            _ENGINES.popitem(last=False)
+    return engine
@@ -0,0 +1,280 @@
+"""
+This module memoizes the series derived from the price store in process.
+Closes, log returns, rolling moments and ratios are kept in an LRU cache bounded by bytes and keyed
+by (symbol, data version, transform, window), so a long-running service that answers several
+metrics for the same names computes every series once. Queries never fetch bars for a cached
+symbol; `refresh` does, and the entries of a symbol are dropped as soon as the price store writes
+new bars for it.
+
+Author: kangwijen
+
+Example:
+    series = DerivedSeries(PriceStore())
+    sharpe = series.sharpe('BBCA.JK', window=21)
+    alpha = series.alpha('BBCA.JK', '^JKSE', window=21)
+    series.refresh('BBCA.JK')
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from analytics import log_returns, risk_adjust, rolling_sortino, rolling_alpha, fill_missing, align_returns
+from pricestore import PriceStore
+
+# Default size of the cache in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def series_nbytes(value):
+    """
+    Return the memory used by a cached Series, DataFrame or array, including its index.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True))
+    return int(np.asarray(value).nbytes)
+
+
+class SeriesCache:
+    """
+    Thread-safe LRU cache of derived series bounded by their total size in bytes.
+    Keys are (symbol, version, transform, window) tuples, where the symbol may be a
+    (symbol, benchmark) pair.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached value of a key and mark it as recently used, or None.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Cache a value and evict the least recently used entries until the cache fits.
+        Values larger than the whole cache are not kept.
+        """
+        size = series_nbytes(value)
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            self.entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.nbytes -= evicted_size
+        return value
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value of a key, computing and caching it on a miss.
+        """
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def invalidate(self, symbol):
+        """
+        Drop every entry of a symbol, including the (symbol, benchmark) pair entries it is part of.
+        """
+        with self.lock:
+            for key in list(self.entries):
+                if key[0] == symbol or (isinstance(key[0], tuple) and symbol in key[0]):
+                    self.nbytes -= self.entries.pop(key)[1]
+
+    def clear(self):
+        """
+        Drop every entry.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+class DerivedSeries:
+    """
+    Closes, log returns, rolling moments and ratios of the symbols in a price store, memoized in a
+    SeriesCache that is invalidated when the store appends new bars.
+    """
+
+    def __init__(self, store=None, cache=None):
+        self.store = store or PriceStore()
+        self.cache = cache or SeriesCache()
+        self.store.subscribe(self.cache.invalidate)
+
+    def _key(self, symbol, transform, window=None, benchmark=None):
+        """
+        Build the cache key of a transform of a symbol, or of a (symbol, benchmark) pair, at the
+        current data version.
+        """
+        if benchmark is None:
+            return (symbol, self.store.version(symbol), transform, window)
+        version = (self.store.version(symbol), self.store.version(benchmark))
+        return ((symbol, benchmark), version, transform, window)
+
+    def closes(self, symbol):
+        """
+        Return the filled closes of a symbol.
+        Cached closes are served from memory, the store is only asked for bars on a miss. Call
+        `refresh` to fetch new bars, which drops the entries of the symbol if there are any.
+        """
+        cached = self.cache.get(self._key(symbol, 'close'))
+        if cached is not None:
+            return cached
+        return self._closes(symbol, self.store.update(symbol))
+
+    def refresh(self, symbol):
+        """
+        Ask the store for new bars of a symbol and return its filled closes.
+        """
+        return self._closes(symbol, self.store.update(symbol))
+
+    def _closes(self, symbol, data):
+        """
+        Return the cached filled closes of already loaded bars, at the version they were loaded at.
+        """
+        return self.cache.get_or_compute(self._key(symbol, 'close'), lambda: fill_missing(data['Close']))
+
+    def log_returns(self, symbol):
+        """
+        Return the log returns of a symbol.
+        """
+        closes = self.closes(symbol)
+        return self.cache.get_or_compute(
+            self._key(symbol, 'log_returns'), lambda: log_returns(closes)
+        )
+
+    def rolling_mean(self, symbol, window=21):
+        """
+        Return the rolling mean of the log returns of a symbol.
+        """
+        return self._rolling_mean(symbol, self.log_returns(symbol), window)
+
+    def rolling_var(self, symbol, window=21):
+        """
+        Return the rolling variance of the log returns of a symbol.
+        """
+        return self._rolling_var(symbol, self.log_returns(symbol), window)
+
+    def aligned_returns(self, symbol, benchmark):
+        """
+        Return a frame of the log returns of a symbol ('stock') and a benchmark ('benchmark') on
+        their common dates.
+        """
+        returns = self.log_returns(symbol)
+        benchmark_returns = self.log_returns(benchmark)
+        return self.cache.get_or_compute(
+            self._key(symbol, 'aligned_returns', benchmark=benchmark),
+            lambda: pd.concat(align_returns(returns, benchmark_returns), axis=1, keys=['stock', 'benchmark'])
+        )
+
+    def rolling_cov(self, symbol, benchmark, window=21):
+        """
+        Return the rolling covariance of the log returns of a symbol with a benchmark.
+        """
+        return self._rolling_cov(symbol, benchmark, self.aligned_returns(symbol, benchmark), window)
+
+    def rolling_beta(self, symbol, benchmark, window=21):
+        """
+        Return the rolling beta of a symbol against a benchmark.
+        """
+        return self._rolling_beta(symbol, benchmark, self.aligned_returns(symbol, benchmark), window)
+
+    def sharpe(self, symbol, window=21, risk_free_rate=0.05, period=252):
+        """
+        Return the filled rolling Sharpe ratio of a symbol from its cached rolling moments, like sharpe.py.
+        The risk-free rate only shifts the mean, so the moments are shared across rates.
+        """
+        returns = self.log_returns(symbol)
+
+        def compute():
+            mean = self._rolling_mean(symbol, returns, window)
+            variance = self._rolling_var(symbol, returns, window)
+            return fill_missing((mean - risk_free_rate / period) / np.sqrt(variance))
+
+        return self.cache.get_or_compute(
+            self._key(symbol, ('sharpe', risk_free_rate, period), window), compute
+        )
+
+    def sortino(self, symbol, window=21, risk_free_rate=0.05, period=252, minimum_acceptable_return=0.0):
+        """
+        Return the filled rolling Sortino ratio of a symbol from its cached log returns, like sortino.py.
+        """
+        returns = self.log_returns(symbol)
+        return self.cache.get_or_compute(
+            self._key(symbol, ('sortino', risk_free_rate, period, minimum_acceptable_return), window),
+            lambda: fill_missing(rolling_sortino(risk_adjust(returns, risk_free_rate, period), window,
+                                                 minimum_acceptable_return))
+        )
+
+    def alpha(self, symbol, benchmark, window=21, risk_free_rate=0.05, period=252):
+        """
+        Return the smoothed rolling Alpha of a symbol against a benchmark from its cached beta, like alpha.py.
+        """
+        aligned = self.aligned_returns(symbol, benchmark)
+
+        def compute():
+            # The risk-free rate only shifts the stock returns, so the cached beta still applies
+            beta = self._rolling_beta(symbol, benchmark, aligned, window)
+            returns = risk_adjust(aligned['stock'], risk_free_rate, period)
+            return rolling_alpha(returns, aligned['benchmark'], beta, window, risk_free_rate, period)
+
+        return self.cache.get_or_compute(
+            self._key(symbol, ('alpha', risk_free_rate, period), window, benchmark), compute
+        )
+
+    def _rolling_mean(self, symbol, returns, window):
+        """
+        Return the cached rolling mean of the already loaded log returns of a symbol.
+        """
+        return self.cache.get_or_compute(
+            self._key(symbol, 'rolling_mean', window), lambda: returns.rolling(window).mean()
+        )
+
+    def _rolling_var(self, symbol, returns, window):
+        """
+        Return the cached rolling variance of the already loaded log returns of a symbol.
+        """
+        return self.cache.get_or_compute(
+            self._key(symbol, 'rolling_var', window), lambda: returns.rolling(window).var()
+        )
+
+    def _rolling_cov(self, symbol, benchmark, aligned, window):
+        """
+        Return the cached rolling covariance of already aligned log returns.
+        """
+        return self.cache.get_or_compute(
+            self._key(symbol, 'rolling_cov', window, benchmark),
+            lambda: aligned['stock'].rolling(window).cov(aligned['benchmark'])
+        )
+
+    def _rolling_beta(self, symbol, benchmark, aligned, window):
+        """
+        Return the cached rolling beta of already aligned log returns.
+        """
+        covariance = self._rolling_cov(symbol, benchmark, aligned, window)
+        return self.cache.get_or_compute(
+            self._key(symbol, 'rolling_beta', window, benchmark),
+            lambda: covariance / aligned['benchmark'].rolling(window).var()
+        )
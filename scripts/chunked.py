@@ -0,0 +1,379 @@
+"""
+This script computes the rolling Sharpe, Sortino, Treynor and Alpha of a tall close series, such as
+years of minute bars, out of core. The series is read in blocks and every block is processed with
+the running sums of the last WINDOW rows of the previous one, so each window is complete, and the
+finished rows are appended to a Parquet or CSV file. Memory scales with the block size instead of
+the history.
+
+The window sums come from running sums that restart every SEGMENT_ROWS rows of the history, not of
+the block, and the fills and the EWM carry their state exactly from block to block, so the output
+is bit-identical whatever the block size. It equals the pandas pipeline of the ratio scripts up to
+rounding.
+
+Author: kangwijen
+
+Parameters: a Parquet or CSV file of closes, and optionally an aligned benchmark close column
+Returns: None
+Example: python chunked.py bars.parquet --output ratios.parquet --window 390 --period 98280
+         python chunked.py bars.parquet --output ratios.parquet --frequency 1min --window 5D
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from frequency import Session, periods_per_year, window_bars
+
+# Default number of rows per block
+DEFAULT_BLOCK_ROWS = 1_000_000
+
+# Rows after which the running sums start again from zero, which bounds their rounding error
+SEGMENT_ROWS = 65_536
+
+
+def frame_blocks(data, block_rows=DEFAULT_BLOCK_ROWS):
+    """
+    Yield an in-memory Series or frame in blocks of `block_rows` rows.
+    """
+    for start in range(0, len(data), block_rows):
+        yield data.iloc[start:start + block_rows]
+
+
+def parquet_blocks(path, columns=None, block_rows=DEFAULT_BLOCK_ROWS):
+    """
+    Yield a Parquet file as frames of `block_rows` rows, with the date index restored.
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.schema_arrow.pandas_metadata or {}
+    index_columns = [column for column in metadata.get('index_columns', []) if isinstance(column, str)]
+    if columns is not None:
+        columns = list(columns) + index_columns
+    for batch in parquet_file.iter_batches(batch_size=block_rows, columns=columns):
+        yield batch.to_pandas()
+
+
+def csv_blocks(path, columns=None, block_rows=DEFAULT_BLOCK_ROWS):
+    """
+    Yield a CSV file with the dates in its first column as frames of `block_rows` rows.
+    """
+    for block in pd.read_csv(path, index_col=0, parse_dates=True, chunksize=block_rows):
+        yield block if columns is None else block[list(columns)]
+
+
+class BlockFill:
+    """
+    Forward fill, and backward fill before the first value, like `fill_missing`, over consecutive
+    blocks. The last row is carried into the next block; rows before the first value of every
+    column are held back until it is known.
+    """
+
+    def __init__(self):
+        self.last = None
+        self.pending = []
+
+    def fill(self, block):
+        """
+        Return the rows of a block, and of the held-back blocks, that can be filled now.
+        """
+        if self.last is None:
+            self.pending.append(block)
+            data = pd.concat(self.pending)
+            if data.notna().any().all():
+                self.pending = []
+                data = data.ffill().bfill()
+                self.last = data.iloc[[-1]]
+                return data
+            return data.iloc[:0]
+
+        # Fill the block from the carried row
+        data = pd.concat([self.last, block]).ffill().iloc[1:]
+        if len(data):
+            self.last = data.iloc[[-1]]
+        return data
+
+    def flush(self):
+        """
+        Return the held-back rows at the end of the input, forward and backward filled as far as possible.
+        """
+        data = pd.concat(self.pending).ffill().bfill() if self.pending else None
+        self.pending = []
+        return data
+
+
+class ChunkedRatios:
+    """
+    Rolling Sharpe, Sortino, beta, Treynor and smoothed Alpha of a close series, and optionally an
+    aligned benchmark close series, computed block by block with the same steps as the scripts:
+    fill the closes, take the log returns, subtract the risk-free rate, calculate the window
+    statistics, fill the ratios and smooth the Alpha with `ewm(span=window)`.
+    """
+
+    def __init__(self, window=21, risk_free_rate=0.05, period=252, minimum_acceptable_return=0.0,
+                 benchmark=False, segment_rows=SEGMENT_ROWS):
+        self.window = window
+        self.daily_risk_free_rate = risk_free_rate / period
+        self.minimum_acceptable_return = minimum_acceptable_return
+        self.benchmark = benchmark
+        self.close_fill = BlockFill()
+        self.ratio_fill = BlockFill()
+        self.previous_close = None
+        self.segment_rows = max(segment_rows, window)
+        self.rows_seen = 0
+        self.prefix_tail = np.empty((0, 6 if benchmark else 3))
+        self.alpha_weight = 1.0 - 2.0 / (window + 1.0)
+        self.alpha_state = None
+
+    def process(self, closes):
+        """
+        Add a block of closes, a Series or a frame of the close and benchmark close columns.
+        Returns the ratios of the rows that are finished, which may be none.
+        """
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame()
+        return self._ratios(self.close_fill.fill(closes))
+
+    def finish(self):
+        """
+        Return the remaining ratios at the end of the input.
+        """
+        closes = self.close_fill.flush()
+        ratios = self._ratios(closes) if closes is not None else None
+        pending = self.ratio_fill.flush()
+        if pending is None:
+            return ratios
+        return self._smooth(pending) if ratios is None or ratios.empty else pd.concat([ratios, self._smooth(pending)])
+
+    def _ratios(self, closes):
+        """
+        Calculate the ratios of a block of filled closes.
+        """
+        # Take the log returns from the last close of the previous block
+        values = closes.to_numpy(dtype='float64')
+        if self.previous_close is None:
+            if len(values) == 0:
+                return self._empty()
+            self.previous_close = values[0]
+            values, index = values[1:], closes.index[1:]
+        else:
+            index = closes.index
+        returns = np.log(values / np.vstack([self.previous_close, values[:-1]])) if len(values) else values
+        if len(values):
+            self.previous_close = values[-1]
+        returns[:, 0] -= self.daily_risk_free_rate
+
+        raw = self._window_ratios(returns)
+        return self._smooth(self.ratio_fill.fill(pd.DataFrame(raw, index=index, columns=self._columns())))
+
+    def _prefix_sums(self, terms):
+        """
+        Return the running sums of the terms of every row since the start of its segment of
+        `segment_rows` rows, continuing the segment of the previous block. Cumulative sums add one
+        row at a time, so the sums do not depend on where the blocks start.
+        """
+        prefix = np.empty_like(terms)
+        position = 0
+        while position < len(terms):
+            row = self.rows_seen + position
+            stop = min(len(terms), position + self.segment_rows - row % self.segment_rows)
+            if row % self.segment_rows == 0:
+                prefix[position:stop] = np.cumsum(terms[position:stop], axis=0)
+            else:
+                carry = prefix[position - 1] if position else self.prefix_tail[-1]
+                prefix[position:stop] = np.cumsum(np.vstack([carry, terms[position:stop]]), axis=0)[1:]
+            position = stop
+        return prefix
+
+    def _window_ratios(self, returns):
+        """
+        Calculate the raw ratios of a block of returns, NaN without a full window.
+        The window sums are differences of the segment prefix sums of the last `window` rows and
+        of the block; a window spans at most two segments, so it adds the total of the first one.
+        """
+        stock = returns[:, 0]
+        shortfalls = np.minimum(stock - self.minimum_acceptable_return, 0.0)
+        columns = [stock, stock * stock, shortfalls * shortfalls]
+        if self.benchmark:
+            benchmark = returns[:, 1]
+            columns += [benchmark, benchmark * benchmark, stock * benchmark]
+        prefix = self._prefix_sums(np.column_stack(columns))
+
+        # Global row numbers of the carried rows and of the block
+        extended = np.vstack([self.prefix_tail, prefix])
+        first = self.rows_seen - len(self.prefix_tail)
+        rows = np.arange(self.rows_seen, self.rows_seen + len(returns))
+        self.rows_seen += len(returns)
+        self.prefix_tail = extended[max(len(extended) - self.window, 0):]
+
+        raw = np.full((len(returns), len(self._columns())), np.nan)
+        complete = rows >= self.window - 1
+        end = rows[complete]
+        if len(end) == 0:
+            return raw
+        start = end - self.window + 1
+        before = end - self.window
+        segment = self.segment_rows
+        sums = extended[end - first]
+        crossing = start // segment != end // segment
+        sums[crossing] += extended[(end[crossing] // segment) * segment - 1 - first]
+        dropped = (before >= 0) & (before // segment == start // segment)
+        sums[dropped] -= extended[before[dropped] - first]
+
+        window = self.window
+        mean = sums[:, 0] / window
+        variance = np.maximum(sums[:, 1] - sums[:, 0] * sums[:, 0] / window, 0.0) / (window - 1)
+        downside_deviation = np.sqrt(np.maximum(sums[:, 2], 0.0) / window)
+        output = raw[complete]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            output[:, 0] = mean / np.sqrt(variance)
+            output[:, 1] = (mean - self.minimum_acceptable_return) / np.where(
+                downside_deviation > 0, downside_deviation, np.nan
+            )
+            if self.benchmark:
+                benchmark_mean = sums[:, 3] / window
+                benchmark_variance = sums[:, 4] - sums[:, 3] * sums[:, 3] / window
+                covariance = sums[:, 5] - sums[:, 0] * sums[:, 3] / window
+                beta = covariance / np.where(benchmark_variance > 0, benchmark_variance, np.nan)
+                expected_return = self.daily_risk_free_rate + beta * (benchmark_mean - self.daily_risk_free_rate)
+                output[:, 2] = beta
+                output[:, 3] = mean / beta
+                output[:, 4] = stock[complete] - expected_return
+        raw[complete] = output
+        return raw
+
+    def _smooth(self, ratios):
+        """
+        Smooth the filled Alpha with span `window`, carrying the EWM sums from block to block.
+        """
+        if not self.benchmark or ratios.empty:
+            return ratios
+        from scipy.signal import lfilter
+
+        # numerator_t = alpha_t + w numerator_{t-1}, and the same for the weights in the denominator
+        weights = np.ones(len(ratios))
+        state = self.alpha_state or (0.0, 0.0)
+        coefficients = [1.0, -self.alpha_weight]
+        numerator = lfilter([1.0], coefficients, ratios['alpha'].to_numpy(), zi=[self.alpha_weight * state[0]])[0]
+        denominator = lfilter([1.0], coefficients, weights, zi=[self.alpha_weight * state[1]])[0]
+        self.alpha_state = (numerator[-1], denominator[-1])
+        ratios = ratios.copy()
+        ratios['alpha'] = numerator / denominator
+        return ratios
+
+    def _columns(self):
+        """
+        Return the output columns.
+        """
+        return ['sharpe', 'sortino', 'beta', 'treynor', 'alpha'] if self.benchmark else ['sharpe', 'sortino']
+
+    def _empty(self):
+        """
+        Return an empty ratio frame.
+        """
+        return pd.DataFrame(columns=self._columns(), dtype='float64')
+
+
+class BlockWriter:
+    """
+    Append frames to a Parquet file, one row group per frame, or to a CSV file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+        self.rows = 0
+
+    def write(self, frame):
+        """
+        Append a frame with its date index.
+        """
+        if frame is None or frame.empty:
+            return
+        if self.path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(frame)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0)
+        self.rows += len(frame)
+
+    def close(self):
+        """
+        Finish the file.
+        """
+        if self.writer is not None:
+            self.writer.close()
+
+
+def run_chunked(blocks, path, window=21, risk_free_rate=0.05, period=252, minimum_acceptable_return=0.0,
+                benchmark=False):
+    """
+    Compute the rolling ratios of blocks of closes and stream them to a Parquet or CSV file.
+    The blocks are Series of closes, or frames of the close and the aligned benchmark close columns
+    when `benchmark` is True.
+    Returns the number of rows written.
+    """
+    ratios = ChunkedRatios(window, risk_free_rate, period, minimum_acceptable_return, benchmark)
+    writer = BlockWriter(path)
+    try:
+        for block in blocks:
+            writer.write(ratios.process(block))
+        writer.write(ratios.finish())
+    finally:
+        writer.close()
+    return writer.rows
+
+
+def main(argv=None):
+    """
+    Parse the command line and stream the rolling ratios of a close file to the output file.
+    """
+    parser = argparse.ArgumentParser(description='Out-of-core rolling ratios of a tall close series.')
+    parser.add_argument('input', help='Parquet or CSV file of closes with the dates as index')
+    parser.add_argument('--output', required=True, help='output .parquet or .csv file')
+    parser.add_argument('--close-column', default='Close', help='column of the closes (default is Close)')
+    parser.add_argument('--benchmark-column',
+                        help='column of the aligned benchmark closes, for the beta, Treynor and Alpha')
+    parser.add_argument('--frequency', help='bar frequency of the closes, such as 1min, which sets the period')
+    parser.add_argument('--session', help='trading periods of a session, such as 09:00-12:00,13:30-16:00')
+    parser.add_argument('--period', type=float,
+                        help='periods per year (default is 252, or the bars per year of the frequency)')
+    parser.add_argument('--window', default='21',
+                        help='window size in rows, or trading time such as 30min or 5D with --frequency (default is 21)')
+    parser.add_argument('--risk-free-rate', type=float, default=0.05,
+                        help='risk-free rate (default is 0.05)')
+    parser.add_argument('--minimum-acceptable-return', type=float, default=0.0,
+                        help='minimum acceptable return of the Sortino ratio (default is 0)')
+    parser.add_argument('--block-rows', type=int, default=DEFAULT_BLOCK_ROWS,
+                        help=f'rows per block (default is {DEFAULT_BLOCK_ROWS})')
+    args = parser.parse_args(argv)
+
+    # Count the window in bars and the period in bars per year of the frequency
+    session = Session.parse(args.session) if args.session else None
+    args.window = int(args.window) if args.window.isdigit() else args.window
+    if args.frequency:
+        args.window = window_bars(args.window, args.frequency, session)
+        args.period = args.period or periods_per_year(args.frequency, session)
+    elif isinstance(args.window, str):
+        parser.error('a window in trading time needs --frequency')
+    args.period = args.period or 252
+    if args.block_rows < args.window:
+        parser.error('the block must hold at least one window')
+
+    columns = [args.close_column] + ([args.benchmark_column] if args.benchmark_column else [])
+    reader = parquet_blocks if args.input.endswith('.parquet') else csv_blocks
+    rows = run_chunked(
+        reader(args.input, columns, args.block_rows), args.output, args.window, args.risk_free_rate,
+        args.period, args.minimum_acceptable_return, benchmark=args.benchmark_column is not None
+    )
+    print(f'Wrote {rows} rows to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
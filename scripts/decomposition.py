@@ -9,112 +9,57 @@ Returns: None
 Example: python decomposition.py
 """
 
-import yfinance as yf
-import numpy as np
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
-from statsmodels.tsa.seasonal import seasonal_decompose
-
-# Define the stock symbol
-STOCK = input("Enter the stock symbol: ")
-
-# Define the period for seasonal decomposition (in days)
-PERIOD = input("Enter the period for seasonal decomposition (in days) (default is 30): ") or 30
-
-# Convert inputs to uppercase and integer
-STOCK = str(STOCK).upper()
-PERIOD = int(PERIOD)
-
-# Download the stock data
-data = yf.download(STOCK, progress=False)
-
-# Use the 'Close' price and fill missing values
-data = data['Close'].ffill().bfill()
-
-# Perform seasonal decomposition
-result = seasonal_decompose(data, model='multiplicative', period=PERIOD)
-
-# Calculate the Q1 and Q3 for the residual component
-residual = result.resid.ffill().bfill()
-q1 = np.percentile(residual, 25)
-q3 = np.percentile(residual, 75)
-iqr = q3 - q1
-
-# Calculate bounds for significant residuals
-lower_bound = q1 - 1.5 * iqr
-upper_bound = q3 + 1.5 * iqr
-
-# Create a plot
-fig = make_subplots(
-    rows=4, cols=1,
-    shared_xaxes=True,
-    vertical_spacing=0.1,
-    subplot_titles=('Original Data', 'Trend', 'Seasonal', 'Residual')
-)
-
-# Add the original data
-fig.add_trace(
-    go.Scatter(
-        x=data.index,
-        y=data,
-        name='Original Data'),
-    row=1, col=1
-)
-
-# Add the trend component
-fig.add_trace(
-    go.Scatter(
-        x=result.trend.index,
-        y=result.trend,
-        name='Trend'),
-    row=2, col=1
-)
-
-# Add the seasonal component
-fig.add_trace(
-    go.Scatter(
-        x=result.seasonal.index,
-        y=result.seasonal,
-        name='Seasonal'),
-    row=3, col=1
-)
-
-# Add the residual component
-fig.add_trace(
-    go.Scatter(
-        x=result.resid.index,
-        y=result.resid,
-        name='Residual'
-    ),
-    row=4, col=1
-)
-
-# Add lower and upper bounds to the residual plot
-fig.add_trace(
-    go.Scatter(
-        x=result.resid.index,
-        y=[lower_bound]*len(result.resid.index),
-        name='Lower Bound',
-        line={"color": 'green', "dash": 'dash'}
-    ),
-    row=4, col=1
-)
-
-fig.add_trace(
-    go.Scatter(
-        x=result.resid.index,
-        y=[upper_bound]*len(result.resid.index),
-         name='Upper Bound',
-         line={"color": 'red', "dash": 'dash'}
-    ),
-    row=4, col=1
-)
-
-# Update the layout
-fig.update_layout(
-    title=f'Seasonal Decomposition of {STOCK} with {PERIOD}-day Period',
-    showlegend=False
-)
-
-# Show the plot
-fig.show()
+import pandas as pd
+
+from analytics import fill_missing, seasonal_decomposition, iqr_bounds
+from pricestore import get_prices
+from report import render, build_decomposition_figure
+
+
+def main():
+    """
+    Ask for the inputs, decompose the closing price and plot the components.
+    """
+    # Define the stock symbol
+    STOCK = input("Enter the stock symbol: ")
+
+    # Define the period for seasonal decomposition (in days)
+    PERIOD = input("Enter the period for seasonal decomposition (in days) (default is 30): ") or 30
+
+    # Convert inputs to uppercase and integer
+    STOCK = str(STOCK).upper()
+    PERIOD = int(PERIOD)
+
+    # Load the stock data from the local price store
+    data = get_prices(STOCK)
+
+    # Use the 'Close' price and fill missing values
+    data = fill_missing(data['Close'])
+
+    # Perform seasonal decomposition
+    result = seasonal_decomposition(data, PERIOD)
+
+    # Calculate bounds for significant residuals
+    lower_bound, upper_bound = iqr_bounds(fill_missing(result.resid))
+
+    # Collect the components and the residual bounds
+    results = pd.DataFrame({
+        'original': data,
+        'trend': result.trend,
+        'seasonal': result.seasonal,
+        'residual': result.resid,
+        'lower_bound': lower_bound,
+        'upper_bound': upper_bound,
+    })
+
+    # Plot the components, or write them out for batch jobs
+    render(
+        lambda: build_decomposition_figure(
+            results, f'Seasonal Decomposition of {STOCK} with {PERIOD}-day Period'
+        ),
+        results, f'decomposition_{STOCK}'
+    )
+
+
+if __name__ == '__main__':
+    main()
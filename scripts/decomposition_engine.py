@@ -0,0 +1,240 @@
+"""
+This module decomposes close series into trend, seasonal and residual components without statsmodels.
+The centred moving-average trend comes from cumulative sums and the seasonal indices from a
+vectorized group-by on the phase, so a whole (dates x tickers) matrix is decomposed in one pass.
+The incremental decomposition keeps the per-phase sums and the last trend window, so new bars
+update the trend and the seasonal factors without redoing the history.
+
+The components match statsmodels' `seasonal_decompose(data, model=model, period=period)`.
+
+Author: kangwijen
+
+Example:
+    result = decompose(closes_matrix, period=30)
+    decomposition = IncrementalDecomposition.from_history(closes, period=30)
+    values = decomposition.update(new_close)
+"""
+
+from collections import deque, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from analytics import _like
+
+# Components of a decomposition, with the same attribute names as statsmodels' DecomposeResult
+Decomposition = namedtuple('Decomposition', ['observed', 'trend', 'seasonal', 'resid'])
+
+MODELS = ['multiplicative', 'additive']
+
+
+def _check_model(model):
+    """
+    Raise an error for an unknown decomposition model.
+    """
+    if model not in MODELS:
+        raise ValueError(f'Unknown model {model}, expected one of {", ".join(MODELS)}')
+
+
+def trend_weights(period):
+    """
+    Return the weights of the centred moving average of a period, with half weights at both
+    ends of the window for an even period.
+    """
+    if period % 2 == 0:
+        return np.array([0.5] + [1.0] * (period - 1) + [0.5]) / period
+    return np.repeat(1.0 / period, period)
+
+
+def centered_moving_average(values, period):
+    """
+    Calculate the centred moving-average trend of a 1-D or 2-D array with cumulative sums in O(n).
+    The first and last period // 2 rows, and windows that contain a NaN, are NaN.
+    """
+    values = np.asarray(values, dtype='float64')
+    half = period // 2
+    span = 2 * half + 1
+    trend = np.full(values.shape, np.nan)
+    if len(values) < span:
+        return trend
+
+    # Centre the data first to keep the cumulative sums precise
+    missing = np.isnan(values)
+    offset = np.nanmean(values, axis=0)
+    centered = values - offset
+    cumulative = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.cumsum(np.where(missing, 0.0, centered), axis=0, out=cumulative[1:])
+
+    sums = cumulative[span:] - cumulative[:-span]
+    if period % 2 == 0:
+        # The two ends of the window only count half
+        sums -= 0.5 * (centered[:len(sums)] + centered[span - 1:])
+    averages = sums / period + offset
+    if missing.any():
+        counts = np.zeros(cumulative.shape)
+        np.cumsum(missing, axis=0, out=counts[1:])
+        averages[(counts[span:] - counts[:-span]) > 0] = np.nan
+    trend[half:len(values) - half] = averages
+    return trend
+
+
+def fold_phases(detrended, period):
+    """
+    Group the rows by phase, counted from the first row, by padding the dates axis to whole
+    periods with NaN and folding it into (cycles x period) rows.
+    """
+    length = len(detrended)
+    rows = -(-length // period) * period
+    padded = np.full((rows,) + detrended.shape[1:], np.nan)
+    padded[:length] = detrended
+    return padded.reshape((rows // period, period) + detrended.shape[1:])
+
+
+def seasonal_indices(detrended, period, model='multiplicative'):
+    """
+    Calculate the normalized seasonal index of every phase from detrended values, with the phase
+    counted from the first row. NaN are ignored.
+    Returns a (period x tickers) array, or (period,) for 1-D input.
+    """
+    _check_model(model)
+    folded = fold_phases(np.asarray(detrended, dtype='float64'), period)
+    with np.errstate(invalid='ignore'):
+        averages = np.nanmean(folded, axis=0)
+
+    if model == 'multiplicative':
+        return averages / np.nanmean(averages, axis=0)
+    return averages - np.nanmean(averages, axis=0)
+
+
+def decompose(data, period=30, model='multiplicative'):
+    """
+    Decompose a close series or a (dates x tickers) matrix into trend, seasonal and residual
+    components in one pass.
+    Returns a Decomposition of the observed, trend, seasonal and resid components, shaped like the input.
+    """
+    _check_model(model)
+    values = np.asarray(data, dtype='float64')
+    trend = centered_moving_average(values, period)
+    detrended = values / trend if model == 'multiplicative' else values - trend
+    indices = seasonal_indices(detrended, period, model)
+
+    # Repeat the seasonal index of every phase along the dates
+    seasonal = indices[np.arange(len(values)) % period]
+    resid = values / seasonal / trend if model == 'multiplicative' else detrended - seasonal
+    return Decomposition(
+        _like(values, data), _like(trend, data), _like(seasonal, data), _like(resid, data)
+    )
+
+
+class IncrementalDecomposition:
+    """
+    Decomposition that is updated one bar at a time.
+    The trend of a bar is only known `period // 2` bars later, when its centred window is full, so
+    every update returns the components of that earlier bar. The seasonal factors are the ones
+    known at the time; after the same bars they equal the factors of `decompose`.
+    A bar may be a scalar or an array with one value per ticker.
+    """
+
+    def __init__(self, period=30, model='multiplicative'):
+        _check_model(model)
+        self.period = period
+        self.model = model
+        self.weights = trend_weights(period)
+        self.values = deque(maxlen=len(self.weights))
+        self.count = 0
+        self.sums = None
+        self.counts = None
+
+    @classmethod
+    def from_history(cls, data, period=30, model='multiplicative'):
+        """
+        Start a decomposition from the history of a series or a (dates x tickers) matrix.
+        """
+        decomposition = cls(period, model)
+        values = np.asarray(data, dtype='float64')
+        trend = centered_moving_average(values, period)
+        detrended = values / trend if model == 'multiplicative' else values - trend
+        decomposition._ensure_state(values[0])
+
+        # Sum the detrended values per phase
+        folded = fold_phases(detrended, period)
+        decomposition.sums = np.nansum(folded, axis=0)
+        decomposition.counts = np.sum(~np.isnan(folded), axis=0)
+        decomposition.values.extend(values[-len(decomposition.weights):])
+        decomposition.count = len(values)
+        return decomposition
+
+    def _ensure_state(self, value):
+        """
+        Allocate the per-phase sums once the shape of a bar is known.
+        """
+        if self.sums is None:
+            shape = (self.period,) + np.shape(value)
+            self.sums = np.zeros(shape)
+            self.counts = np.zeros(shape, dtype='int64')
+
+    def seasonal_factors(self):
+        """
+        Return the current normalized seasonal index of every phase.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            averages = self.sums / self.counts
+            if self.model == 'multiplicative':
+                return averages / np.nanmean(averages, axis=0)
+            return averages - np.nanmean(averages, axis=0)
+
+    def update(self, value):
+        """
+        Add a bar and return the trend, seasonal and residual components of the bar `period // 2`
+        bars back, which are NaN until its centred window is full.
+        """
+        value = np.asarray(value, dtype='float64')
+        self._ensure_state(value)
+        self.values.append(value)
+        self.count += 1
+        nan = np.full(np.shape(value), np.nan)
+        if len(self.values) < len(self.weights):
+            return {'trend': nan, 'seasonal': nan, 'resid': nan}
+
+        # Calculate the trend of the bar in the centre of the window
+        window = np.asarray(self.values)
+        trend = np.tensordot(self.weights, window, axes=1)
+        observed = window[self.period // 2]
+        phase = (self.count - 1 - self.period // 2) % self.period
+        detrended = observed / trend if self.model == 'multiplicative' else observed - trend
+
+        # Add the detrended value to its phase
+        present = ~np.isnan(detrended)
+        self.sums[phase] += np.where(present, detrended, 0.0)
+        self.counts[phase] += present
+
+        seasonal = self.seasonal_factors()[phase]
+        if self.model == 'multiplicative':
+            resid = observed / seasonal / trend
+        else:
+            resid = detrended - seasonal
+        return {'trend': trend, 'seasonal': seasonal, 'resid': resid}
+
+    def to_dict(self):
+        """
+        Return the state as a JSON-serializable dict.
+        """
+        return {
+            'period': self.period, 'model': self.model, 'count': self.count,
+            'values': [np.asarray(value).tolist() for value in self.values],
+            'sums': None if self.sums is None else self.sums.tolist(),
+            'counts': None if self.counts is None else self.counts.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restore a decomposition from `to_dict()` output.
+        """
+        decomposition = cls(state['period'], state['model'])
+        decomposition.count = state['count']
+        decomposition.values.extend(np.asarray(value, dtype='float64') for value in state['values'])
+        if state['sums'] is not None:
+            decomposition.sums = np.asarray(state['sums'], dtype='float64')
+            decomposition.counts = np.asarray(state['counts'], dtype='int64')
+        return decomposition
@@ -0,0 +1,377 @@
+"""
+This script gives the metrics an explicit bar frequency, so they run on minute bars as well as on
+daily closes. Ticks are resampled to OHLCV bars with one pass over the sorted timestamps, keeping
+only the bars that have trades instead of a bin for every minute of every night. The number of
+bars per year comes from the trading session, which sets the annualization and the per-bar
+risk-free rate, and rolling windows are a number of bars (21) or a span of trading time ('30min',
+or '5D' for five sessions) that skips nights, breaks and holidays, computed from cumulative sums
+in O(n log n) for multi-million-row series.
+
+Author: kangwijen
+
+Parameters: a Parquet or CSV file of ticks or bars with the timestamps as index
+Returns: None
+Example: python frequency.py ticks.parquet --frequency 5min --session 09:00-12:00,13:30-16:00 --output bars.parquet
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from analytics import fill_missing, cumulative_sums, _like
+from pricestore import COLUMNS
+
+# Trading days per year of the default session
+TRADING_DAYS = 252
+
+# Bars per year of the calendar frequencies that are not a fixed duration, by offset name
+CALENDAR_PERIODS = {'W': 52, 'ME': 12, 'MS': 12, 'M': 12, 'QE': 4, 'QS': 4, 'Q': 4, 'YE': 1, 'YS': 1, 'Y': 1}
+
+
+def _time_of_day(text):
+    """
+    Parse a 'HH:MM' time into a Timedelta since midnight.
+    """
+    hours, minutes = text.strip().split(':')
+    return pd.Timedelta(hours=int(hours), minutes=int(minutes))
+
+
+class Session:
+    """
+    Trading hours of an exchange: the open and close times, the breaks in between and the number
+    of trading days per year.
+    """
+
+    def __init__(self, open='09:00', close='16:00', breaks=None, trading_days=TRADING_DAYS):
+        self.open = _time_of_day(open)
+        self.close = _time_of_day(close)
+        self.breaks = [(_time_of_day(start), _time_of_day(end)) for start, end in breaks or []]
+        self.trading_days = trading_days
+
+    @classmethod
+    def parse(cls, text, trading_days=TRADING_DAYS):
+        """
+        Build a session from trading periods such as '09:00-12:00,13:30-16:00'.
+        """
+        periods = [period.split('-') for period in text.split(',')]
+        breaks = [(periods[i][1], periods[i + 1][0]) for i in range(len(periods) - 1)]
+        return cls(periods[0][0], periods[-1][1], breaks, trading_days)
+
+    @property
+    def length(self):
+        """
+        Trading time of one session.
+        """
+        return self.close - self.open - sum((end - start for start, end in self.breaks), pd.Timedelta(0))
+
+    def contains(self, index):
+        """
+        Return whether every timestamp of an index falls within the trading hours.
+        """
+        time = np.asarray(index - index.normalize())
+        inside = (time >= self.open.to_timedelta64()) & (time < self.close.to_timedelta64())
+        for start, end in self.breaks:
+            inside &= (time < start.to_timedelta64()) | (time >= end.to_timedelta64())
+        return inside
+
+    def bars(self, frequency):
+        """
+        Return the number of bars of an intraday frequency in one session, counting a last partial bar.
+        """
+        return int(np.ceil(self.length / fixed_bar_length(frequency)))
+
+    def clock(self, index):
+        """
+        Return the trading time of every timestamp as int64 nanoseconds: the sessions before its
+        date times the session length plus the trading time since the open. Only the dates of the
+        index count as sessions, so nights, weekends, holidays and breaks take no time.
+        """
+        values = np.asarray(index, dtype='datetime64[ns]')
+        days = values.astype('datetime64[D]')
+        time = (values - days).astype('int64')
+        elapsed = np.clip(time - self.open.value, 0, (self.close - self.open).value)
+        for start, end in self.breaks:
+            elapsed -= np.clip(time - start.value, 0, end.value - start.value)
+        _, sessions = np.unique(days, return_inverse=True)
+        return sessions.astype('int64') * self.length.value + elapsed
+
+    def span(self, window):
+        """
+        Return the trading time of a window such as '30min', or '5D' for five sessions.
+        """
+        duration = pd.Timedelta(window)
+        if duration >= pd.Timedelta(days=1):
+            return duration / pd.Timedelta(days=1) * self.length
+        return duration
+
+
+def bar_length(frequency):
+    """
+    Return the duration of a fixed bar frequency such as '5min' or '1D', None for calendar
+    frequencies such as 'W' or 'ME'.
+    """
+    offset = pd.tseries.frequencies.to_offset(frequency)
+    try:
+        return pd.Timedelta(offset.nanos)
+    except ValueError:
+        return None
+
+
+def fixed_bar_length(frequency):
+    """
+    Return the duration of a fixed bar frequency, raising a ValueError for calendar frequencies,
+    which only have a number of periods per year.
+    """
+    length = bar_length(frequency)
+    if length is None:
+        raise ValueError(f'{frequency} is not a fixed bar frequency, use one such as 5min or 1D')
+    return length
+
+
+def periods_per_year(frequency='1D', session=None):
+    """
+    Return the number of bars per year of a frequency, the PERIOD of the scripts.
+    Intraday bars count the bars of a session times the trading days, daily and longer fixed bars
+    count the trading days, and calendar frequencies count the weeks, months, quarters or years.
+    """
+    session = session or Session()
+    length = bar_length(frequency)
+    if length is None:
+        offset = pd.tseries.frequencies.to_offset(frequency)
+        return CALENDAR_PERIODS[offset.name.split('-')[0]] / offset.n
+    if length < pd.Timedelta(days=1):
+        return session.bars(frequency) * session.trading_days
+    return session.trading_days / (length / pd.Timedelta(days=1))
+
+
+def infer_frequency(index):
+    """
+    Return the bar frequency of a date index as the most common step between timestamps, which
+    ignores the gaps over nights, weekends and holidays.
+    """
+    steps = np.diff(np.asarray(index, dtype='datetime64[ns]').astype('int64'))
+    values, counts = np.unique(steps[steps > 0], return_counts=True)
+    return pd.tseries.frequencies.to_offset(pd.Timedelta(int(values[counts.argmax()]))).freqstr
+
+
+def window_bars(window, frequency, session=None):
+    """
+    Return the number of bars in a window given as a number of bars or as trading time, with
+    durations of a day or more counting sessions ('5D' is five sessions), like `window_starts`.
+    """
+    if not isinstance(window, str):
+        return int(window)
+    session = session or Session()
+    length = fixed_bar_length(frequency)
+    if length >= pd.Timedelta(days=1):
+        # Daily and longer bars are one per session
+        return int(np.ceil(pd.Timedelta(window) / length))
+    return int(np.ceil(session.span(window) / length))
+
+
+def bar_labels(index, frequency):
+    """
+    Return the start of the bar of every timestamp as int64 nanoseconds, with the bars counted from
+    midnight of the first day like pandas' `resample`.
+    """
+    values = np.asarray(index, dtype='datetime64[ns]').astype('int64')
+    step = fixed_bar_length(frequency).value
+    origin = values[0] - values[0] % pd.Timedelta(days=1).value if len(values) else 0
+    return origin + (values - origin) // step * step
+
+
+def _bar_bounds(labels):
+    """
+    Return the first and last row of every run of equal labels.
+    """
+    starts = np.flatnonzero(np.concatenate([[True], labels[1:] != labels[:-1]])) if len(labels) else labels
+    ends = np.concatenate([starts[1:], [len(labels)]]) - 1 if len(labels) else labels
+    return starts, ends
+
+
+def _sorted(data, session):
+    """
+    Sort by timestamp and keep the rows within the session, if any.
+    """
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index(kind='stable')
+    if session is not None:
+        data = data[session.contains(data.index)]
+    return data
+
+
+def resample_ticks(ticks, frequency, price='price', volume='volume', session=None):
+    """
+    Resample ticks to OHLCV bars of a fixed frequency, like
+    `resample(frequency).agg({'price': 'ohlc', 'volume': 'sum'})` without the empty bars.
+    Ticks are a Series of prices or a frame of the price and volume columns; ticks without a
+    price and, when a session is given, outside the trading hours are left out.
+    Returns a frame with the price store columns indexed by the start of every bar.
+    """
+    ticks = ticks.to_frame(price) if isinstance(ticks, pd.Series) else ticks
+    ticks = _sorted(ticks[ticks[price].notna()], session)
+    labels = bar_labels(ticks.index, frequency)
+    starts, ends = _bar_bounds(labels)
+    prices = ticks[price].to_numpy(dtype='float64')
+
+    bars = {
+        'Open': prices[starts],
+        'High': np.maximum.reduceat(prices, starts) if len(starts) else prices[:0],
+        'Low': np.minimum.reduceat(prices, starts) if len(starts) else prices[:0],
+        'Close': prices[ends],
+    }
+    if volume in ticks.columns:
+        volumes = np.nan_to_num(ticks[volume].to_numpy(dtype='float64'))
+        bars['Volume'] = np.add.reduceat(volumes, starts) if len(starts) else volumes[:0]
+    index = pd.DatetimeIndex(labels[starts].astype('datetime64[ns]'), name='Date')
+    return pd.DataFrame(bars, index=index)
+
+
+def resample_bars(bars, frequency, session=None):
+    """
+    Resample OHLCV bars to a longer fixed frequency, such as 1-minute bars to 5-minute bars, with
+    the first open, the highest high, the lowest low, the last close and the total volume.
+    """
+    bars = _sorted(bars.dropna(subset=['Close']), session)
+    labels = bar_labels(bars.index, frequency)
+    starts, ends = _bar_bounds(labels)
+    aggregated = {}
+    for column in [column for column in COLUMNS if column in bars.columns]:
+        values = bars[column].to_numpy(dtype='float64')
+        if not len(starts):
+            aggregated[column] = values[:0]
+        elif column == 'Open':
+            aggregated[column] = values[starts]
+        elif column == 'High':
+            aggregated[column] = np.fmax.reduceat(values, starts)
+        elif column == 'Low':
+            aggregated[column] = np.fmin.reduceat(values, starts)
+        elif column == 'Close':
+            aggregated[column] = values[ends]
+        else:
+            aggregated[column] = np.add.reduceat(np.nan_to_num(values), starts)
+    index = pd.DatetimeIndex(labels[starts].astype('datetime64[ns]'), name='Date')
+    return pd.DataFrame(aggregated, index=index)
+
+
+def window_starts(index, window, session=None):
+    """
+    Return the first row of the window that ends at every row, and the number of rows a window
+    needs. A number of bars needs a full window, like `rolling(21)`. A duration covers the
+    timestamps within that much trading time of the session, see `Session.span`, and needs one
+    row; on regular bars it holds the `window_bars` bars that chunked.py uses.
+    """
+    length = len(index)
+    if not isinstance(window, str):
+        return np.arange(length) - int(window) + 1, int(window)
+    session = session or Session()
+    clock = session.clock(index)
+    return np.searchsorted(clock, clock - session.span(window).value, side='right'), 1
+
+
+def bounded_window_sums(values, starts, min_periods):
+    """
+    Return the sums and the numbers of values of a 1-D or 2-D array over the windows that start at
+    `starts` and end at every row, from `analytics.cumulative_sums`. NaN are left out; windows
+    with fewer than `min_periods` values are NaN.
+    """
+    values = np.asarray(values, dtype='float64')
+    cumulative, missing_count = cumulative_sums(values)
+    ends = np.arange(1, len(values) + 1)
+    first = np.maximum(starts, 0)
+    sums = cumulative[ends] - cumulative[first]
+    counts = (ends - first).reshape((-1,) + (1,) * (values.ndim - 1)) - (missing_count[ends] - missing_count[first])
+    short = (counts < min_periods) | (starts < 0).reshape((-1,) + (1,) * (values.ndim - 1))
+    sums[short] = np.nan
+    return sums, counts
+
+
+def rolling_ratios(returns, window=21, benchmark_returns=None, risk_free_rate=0.05, period=252,
+                   minimum_acceptable_return=0.0, session=None):
+    """
+    Calculate the rolling Sharpe and Sortino ratios of log returns at any bar frequency, and the
+    rolling beta, Treynor and smoothed Alpha against the benchmark returns when given, over a
+    window of bars or of trading time in the session. `period` is the number of bars per year, see
+    `periods_per_year`.
+    With a number of bars the ratios are those of the ratio scripts; the Alpha of a time window is
+    smoothed over the median number of bars per window.
+    Returns a dict of Series keyed by metric name, filled like the scripts.
+    """
+    daily_risk_free_rate = risk_free_rate / period
+    if benchmark_returns is not None:
+        returns, benchmark_returns = returns.align(benchmark_returns, join='inner')
+    starts, min_periods = window_starts(returns.index, window, session)
+    stock = returns.to_numpy(dtype='float64') - daily_risk_free_rate
+
+    # Centre the returns first to keep the cumulative sums precise
+    offset = np.nanmean(stock) if len(stock) else 0.0
+    centered = stock - offset
+    sums, counts = bounded_window_sums(centered, starts, min_periods)
+    squares, _ = bounded_window_sums(centered * centered, starts, min_periods)
+    shortfalls = np.minimum(stock - minimum_acceptable_return, 0.0)
+    downside, _ = bounded_window_sums(shortfalls * shortfalls, starts, min_periods)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = sums / counts + offset
+        variance = np.maximum(squares - sums * sums / counts, 0.0) / (counts - 1)
+        downside_deviation = np.sqrt(downside / counts)
+        ratios = {
+            'sharpe': mean / np.sqrt(variance),
+            'sortino': (mean - minimum_acceptable_return) / np.where(downside_deviation > 0, downside_deviation, np.nan),
+        }
+        if benchmark_returns is not None:
+            benchmark = benchmark_returns.to_numpy(dtype='float64')
+            benchmark_offset = np.nanmean(benchmark) if len(benchmark) else 0.0
+            benchmark_centered = benchmark - benchmark_offset
+            benchmark_sums, _ = bounded_window_sums(benchmark_centered, starts, min_periods)
+            benchmark_squares, _ = bounded_window_sums(benchmark_centered * benchmark_centered, starts, min_periods)
+            products, _ = bounded_window_sums(centered * benchmark_centered, starts, min_periods)
+            benchmark_variance = benchmark_squares - benchmark_sums * benchmark_sums / counts
+            beta = (products - sums * benchmark_sums / counts) / np.where(benchmark_variance > 0, benchmark_variance, np.nan)
+            benchmark_mean = benchmark_sums / counts + benchmark_offset
+            expected_return = daily_risk_free_rate + beta * (benchmark_mean - daily_risk_free_rate)
+            ratios['beta'] = beta
+            ratios['treynor'] = mean / beta
+            ratios['alpha'] = stock - expected_return
+
+    results = {name: fill_missing(_like(values, returns)) for name, values in ratios.items()}
+    if 'alpha' in results:
+        span = window if not isinstance(window, str) else max(float(np.median(counts)), 1.0)
+        results['alpha'] = results['alpha'].ewm(span=span).mean()
+        results['beta'] = _like(ratios['beta'], returns)
+    return results
+
+
+def main(argv=None):
+    """
+    Parse the command line and resample a file of ticks or bars to bars of a fixed frequency.
+    """
+    parser = argparse.ArgumentParser(description='Resample ticks or bars to bars of a fixed frequency.')
+    parser.add_argument('input', help='Parquet or CSV file of ticks or bars with the timestamps as index')
+    parser.add_argument('--output', required=True, help='output .parquet or .csv file of bars')
+    parser.add_argument('--frequency', default='1min', help='bar frequency (default is 1min)')
+    parser.add_argument('--session', help='trading periods to keep, such as 09:00-12:00,13:30-16:00')
+    parser.add_argument('--price-column', default='price', help='price column of ticks (default is price)')
+    parser.add_argument('--volume-column', default='volume', help='volume column of ticks (default is volume)')
+    args = parser.parse_args(argv)
+
+    if args.input.endswith('.parquet'):
+        data = pd.read_parquet(args.input)
+    else:
+        data = pd.read_csv(args.input, index_col=0, parse_dates=True)
+    session = Session.parse(args.session) if args.session else None
+    if 'Close' in data.columns:
+        bars = resample_bars(data, args.frequency, session)
+    else:
+        bars = resample_ticks(data, args.frequency, args.price_column, args.volume_column, session)
+
+    if args.output.endswith('.parquet'):
+        bars.to_parquet(args.output)
+    else:
+        bars.to_csv(args.output)
+    print(f'Wrote {len(bars)} {args.frequency} bars, {periods_per_year(args.frequency, session):g} per year, to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
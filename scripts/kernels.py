@@ -0,0 +1,525 @@
+"""
+This module computes the rolling ratios of a whole (dates x tickers) close matrix with fused kernels.
+The pandas pipeline of the ratio scripts (fill, log returns, risk adjustment, rolling moments,
+divide, fill again and the EWM smoothing of the Alpha) allocates a new Series at every step. The
+loop kernel does all of it in one pass per column with the running moments of the streaming
+estimators, writing into preallocated output arrays, and is compiled with numba when it is
+installed. Without numba the NumPy engine computes the same ratios from cumulative sums across all
+the columns at once. The sorted-window quantiles of the rolling IQR bounds get a compiled kernel too.
+
+Run `python kernels.py` to check every engine against the pandas reference.
+
+Author: kangwijen
+
+Example:
+    ratios = fused_ratios(closes_matrix, benchmark_closes, window=21)
+    lower_bound, upper_bound = rolling_iqr_bounds(ratios['sharpe'], window=252)
+"""
+
+import argparse
+import importlib.util
+import math
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analytics import (
+    fill_missing, log_returns, risk_adjust, align_returns, rolling_sum, rolling_sharpe, rolling_sortino,
+    rolling_beta, rolling_treynor, rolling_alpha, rolling_quantiles as sorted_window_quantiles, _like
+)
+
+# Ratios computed by the kernels
+METRICS = ['sharpe', 'sortino', 'treynor', 'alpha']
+
+# 'numba' runs the compiled loop kernel, 'python' the same kernel uncompiled (slow, for checking it)
+ENGINES = ['numba', 'numpy', 'python']
+
+# Kernels compiled so far, by name
+_COMPILED = {}
+
+
+def has_numba():
+    """
+    Whether numba is installed, without importing it.
+    """
+    return importlib.util.find_spec('numba') is not None
+
+
+def default_engine():
+    """
+    Return the fastest engine available, the compiled kernel when numba is installed.
+    """
+    return 'numba' if has_numba() else 'numpy'
+
+
+def compiled(kernel):
+    """
+    Return the numba-compiled version of a loop kernel, compiling it on first use.
+    Division by zero gives inf or NaN like NumPy instead of raising.
+    """
+    if kernel.__name__ not in _COMPILED:
+        try:
+            import numba
+        except ImportError:
+            raise ImportError('The numba engine needs numba, install it or use the numpy engine')
+        _COMPILED[kernel.__name__] = numba.njit(cache=True, nogil=True, error_model='numpy')(kernel)
+    return _COMPILED[kernel.__name__]
+
+
+def _check_engine(engine):
+    """
+    Resolve the default engine and raise an error for an unknown one.
+    """
+    engine = engine or default_engine()
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown engine {engine}, expected one of {", ".join(ENGINES)}')
+    return engine
+
+
+def _ratio_kernel(closes, benchmark_returns, common, window, daily_risk_free_rate,
+                  minimum_acceptable_return, sharpe, sortino, treynor, alpha):
+    """
+    Fill the rolling Sharpe and Sortino of every column of a (dates x tickers) close matrix into
+    the preallocated (dates - 1 x tickers) outputs, and its rolling Treynor and smoothed Alpha
+    into the (common rows x tickers) outputs. `benchmark_returns` holds the benchmark log return
+    of every return row, NaN where the benchmark has none, and `common` the rows where it has one,
+    like `align_returns`.
+    Every column is filled and turned into risk-adjusted log returns on the fly, the moments of
+    its last `window` returns and its co-moments with the benchmark over the last `window` common
+    rows are updated in O(1) per row like the streaming estimators, and the ratios are filled and
+    smoothed in place.
+    Only uses loops and arrays, so it compiles with numba in nopython mode.
+    """
+    length, tickers = closes.shape
+    rows = length - 1
+    weight = 1.0 - 2.0 / (window + 1.0)
+
+    returns = np.empty(rows)
+    for column in range(tickers):
+        # Fill the closes forward, and backward before the first one, while taking the log returns
+        previous = np.nan
+        for row in range(length):
+            if closes[row, column] == closes[row, column]:
+                previous = closes[row, column]
+                break
+        for row in range(1, length):
+            value = closes[row, column]
+            if value != value:
+                value = previous
+            returns[row - 1] = math.log(value / previous) - daily_risk_free_rate
+            previous = value
+
+        mean = m2 = 0.0
+        downside_total = 0.0
+        shortfalls = 0
+        mean_x = mean_y = m2_y = c_xy = 0.0
+        aligned = 0
+        for row in range(rows):
+            x = returns[row]
+
+            # Drop the return that leaves the window
+            if row >= window:
+                old_x = returns[row - window]
+                delta = old_x - mean
+                mean -= delta / (window - 1)
+                m2 -= delta * (old_x - mean)
+                shortfall = min(old_x - minimum_acceptable_return, 0.0)
+                downside_total -= shortfall * shortfall
+                if shortfall < 0.0:
+                    shortfalls -= 1
+
+            # Add the new return
+            count = min(row + 1, window)
+            delta = x - mean
+            mean += delta / count
+            m2 += delta * (x - mean)
+            shortfall = min(x - minimum_acceptable_return, 0.0)
+            downside_total += shortfall * shortfall
+            if shortfall < 0.0:
+                shortfalls += 1
+
+            if row < window - 1:
+                sharpe[row, column] = np.nan
+                sortino[row, column] = np.nan
+            else:
+                sharpe[row, column] = mean / math.sqrt(max(m2, 0.0) / (window - 1))
+                # Reset the rounding error left by removals once the window has no shortfall
+                if shortfalls == 0:
+                    downside_total = 0.0
+                downside_deviation = math.sqrt(max(downside_total, 0.0) / window)
+                if downside_deviation > 0.0:
+                    sortino[row, column] = (mean - minimum_acceptable_return) / downside_deviation
+                else:
+                    sortino[row, column] = np.nan
+
+            # The Treynor ratio and the Alpha only see the rows the benchmark has a return on
+            y = benchmark_returns[row]
+            if y != y:
+                continue
+            if aligned >= window:
+                old_row = common[aligned - window]
+                old_x = returns[old_row]
+                old_y = benchmark_returns[old_row]
+                delta_x = old_x - mean_x
+                delta_y = old_y - mean_y
+                mean_x -= delta_x / (window - 1)
+                mean_y -= delta_y / (window - 1)
+                m2_y -= delta_y * (old_y - mean_y)
+                c_xy -= (old_x - mean_x) * delta_y
+            count = min(aligned + 1, window)
+            delta_x = x - mean_x
+            delta_y = y - mean_y
+            mean_x += delta_x / count
+            mean_y += delta_y / count
+            m2_y += delta_y * (y - mean_y)
+            c_xy += delta_x * (y - mean_y)
+
+            if aligned < window - 1:
+                treynor[aligned, column] = np.nan
+                alpha[aligned, column] = np.nan
+            else:
+                beta = c_xy / m2_y if m2_y > 0.0 else np.nan
+                treynor[aligned, column] = mean_x / beta
+                expected_return = daily_risk_free_rate + beta * (mean_y - daily_risk_free_rate)
+                alpha[aligned, column] = x - expected_return
+            aligned += 1
+
+        # Forward fill the ratios and backward fill the rows before the first value
+        for output in (sharpe, sortino, treynor, alpha):
+            size = output.shape[0]
+            last = np.nan
+            first = np.nan
+            for row in range(size):
+                value = output[row, column]
+                if value == value:
+                    last = value
+                    if first != first:
+                        first = value
+                else:
+                    output[row, column] = last
+            for row in range(size):
+                if output[row, column] == output[row, column]:
+                    break
+                output[row, column] = first
+
+        # Smooth the Alpha with span `window`, like `ewm(span=window).mean()`
+        numerator = 0.0
+        denominator = 0.0
+        for row in range(alpha.shape[0]):
+            numerator = alpha[row, column] + weight * numerator
+            denominator = 1.0 + weight * denominator
+            alpha[row, column] = numerator / denominator
+
+
+def _fill_matrix(values):
+    """
+    Forward fill and then backward fill the NaN of every column of a 2-D array, like `fill_missing`.
+    """
+    missing = np.isnan(values)
+    if not missing.any():
+        return values
+    columns = np.arange(values.shape[1])
+    # Index of the last value at or before every row, 0 before the first one
+    last = np.where(missing, 0, np.arange(len(values))[:, None])
+    np.maximum.accumulate(last, axis=0, out=last)
+    filled = values[last, columns]
+    first = values[(~missing).argmax(axis=0), columns]
+    return np.where(np.isnan(filled), first, filled)
+
+
+def _centered(values):
+    """
+    Subtract the mean of every column, ignoring NaN, to keep the cumulative sums precise.
+    """
+    present = ~np.isnan(values)
+    offset = np.where(present, values, 0.0).sum(axis=0) / np.maximum(present.sum(axis=0), 1)
+    return values - offset, offset
+
+
+def _window_moments(x, window):
+    """
+    Calculate the window means and sums of squared deviations of every column from cumulative
+    sums of the centred values, which keeps them precise.
+    Returns the means, the sums of squared deviations and the centred window sums.
+    """
+    centred, offset = _centered(x)
+    sums = rolling_sum(centred, window)
+    return sums / window + offset, rolling_sum(centred * centred, window) - sums * sums / window, centred, sums
+
+
+def _numpy_ratios(closes, benchmark_returns, common, window, daily_risk_free_rate, minimum_acceptable_return):
+    """
+    Calculate the rolling Sharpe and Sortino of every column of a (dates x tickers) close matrix,
+    and its rolling Treynor and smoothed Alpha over the `common` rows the benchmark has a return
+    on, from cumulative sums, all the columns at once.
+    """
+    filled = _fill_matrix(closes)
+    returns = np.log(filled[1:] / filled[:-1]) - daily_risk_free_rate
+
+    mean, m2, x, x_sums = _window_moments(returns, window)
+    shortfalls = np.minimum(returns - minimum_acceptable_return, 0.0)
+    downside_deviation = np.sqrt(rolling_sum(shortfalls * shortfalls, window) / window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = mean / np.sqrt(np.maximum(m2, 0.0) / (window - 1))
+        sortino = (mean - minimum_acceptable_return) / np.where(downside_deviation > 0, downside_deviation, np.nan)
+
+    # Window sums of the centred common returns, the benchmark's and their products
+    if len(common) < window:
+        treynor = alpha = np.full((len(common), returns.shape[1]), np.nan)
+        return [_fill_matrix(sharpe), _fill_matrix(sortino), treynor, alpha]
+    aligned = returns
+    mean_x = mean
+    if len(common) < len(returns):
+        aligned = returns[common]
+        mean_x, _, x, x_sums = _window_moments(aligned, window)
+    mean_y, m2_y, y, y_sums = _window_moments(benchmark_returns[common][:, None], window)
+    c_xy = rolling_sum(x * y, window) - x_sums * y_sums / window
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = c_xy / np.where(m2_y > 0, m2_y, np.nan)
+        treynor = mean_x / beta
+    alpha = _fill_matrix(aligned - (daily_risk_free_rate + beta * (mean_y - daily_risk_free_rate)))
+
+    # Smooth the Alpha with span `window` one row at a time across the columns
+    weight = 1.0 - 2.0 / (window + 1.0)
+    numerator = np.zeros(alpha.shape[1])
+    denominator = 0.0
+    for row in range(len(alpha)):
+        numerator = alpha[row] + weight * numerator
+        denominator = 1.0 + weight * denominator
+        alpha[row] = numerator / denominator
+    return [_fill_matrix(sharpe), _fill_matrix(sortino), _fill_matrix(treynor), alpha]
+
+
+def _kernel_ratios(matrix, benchmark_returns, window, daily_risk_free_rate, minimum_acceptable_return, engine):
+    """
+    Run the selected engine on a (dates x tickers) close array and the benchmark log return of
+    every return row, NaN on the rows the benchmark has none.
+    Returns the (returns x tickers) Sharpe and Sortino arrays and the (common returns x tickers)
+    Treynor and Alpha arrays.
+    """
+    rows = max(len(matrix) - 1, 0)
+    common = np.flatnonzero(~np.isnan(benchmark_returns))
+    if rows < window:
+        return [np.full((size, matrix.shape[1]), np.nan) for size in (rows, rows, len(common), len(common))]
+    if engine == 'numpy':
+        return _numpy_ratios(matrix, benchmark_returns, common, window, daily_risk_free_rate,
+                             minimum_acceptable_return)
+
+    # Column-major buffers so every column is contiguous for the loop kernel
+    kernel = compiled(_ratio_kernel) if engine == 'numba' else _ratio_kernel
+    results = [np.empty((size, matrix.shape[1]), order='F') for size in (rows, rows, len(common), len(common))]
+    kernel(np.asfortranarray(matrix), benchmark_returns, common, window, daily_risk_free_rate,
+           minimum_acceptable_return, *results)
+    return results
+
+
+def fused_ratios(closes, benchmark_closes, window=21, risk_free_rate=0.05, period=252,
+                 minimum_acceptable_return=0.0, engine=None):
+    """
+    Calculate the rolling Sharpe, Sortino, Treynor and smoothed Alpha of a close series or a
+    (dates x tickers) close matrix against a benchmark, like the ratio scripts up to rounding
+    (see `reference_ratios`).
+    The Sharpe and Sortino ratios cover every log return date of the closes, like sharpe.py and
+    sortino.py, which never look at the benchmark. The Treynor ratio and the Alpha cover the dates
+    on which both the closes and the benchmark have a log return, like treynor.py and alpha.py;
+    the benchmark's log returns are taken on its own dates and aligned once, so every metric comes
+    from one pass of the kernel. Plain arrays must already share their dates.
+    Returns a dict of results keyed by metric name, shaped like those log returns.
+    """
+    engine = _check_engine(engine)
+    if window < 2:
+        raise ValueError('The window must hold at least 2 returns')
+    daily_risk_free_rate = risk_free_rate / period
+
+    values = np.asarray(closes, dtype='float64')
+    matrix = values[:, None] if values.ndim == 1 else values
+    if isinstance(closes, (pd.Series, pd.DataFrame)):
+        benchmark_returns = log_returns(fill_missing(benchmark_closes)).reindex(closes.index[1:])
+        benchmark_returns = benchmark_returns.to_numpy(dtype='float64')
+    else:
+        benchmark_filled = _fill_matrix(np.asarray(benchmark_closes, dtype='float64')[:, None])[:, 0]
+        benchmark_returns = np.log(benchmark_filled[1:] / benchmark_filled[:-1])
+    results = dict(zip(METRICS, _kernel_ratios(matrix, benchmark_returns, window, daily_risk_free_rate,
+                                               minimum_acceptable_return, engine)))
+    if not isinstance(closes, (pd.Series, pd.DataFrame)):
+        return {metric: result[:, 0] if values.ndim == 1 else result for metric, result in results.items()}
+
+    dates = closes.index[1:]
+    aligned_dates = dates[~np.isnan(benchmark_returns)]
+    wrapped = {}
+    for metric, result in results.items():
+        index = aligned_dates if metric in ('treynor', 'alpha') else dates
+        if isinstance(closes, pd.Series):
+            wrapped[metric] = pd.Series(result[:, 0], index=index, name=closes.name)
+        else:
+            wrapped[metric] = pd.DataFrame(result, index=index, columns=closes.columns)
+    return wrapped
+
+
+def reference_ratios(closes, benchmark_closes, window=21, risk_free_rate=0.05, period=252,
+                     minimum_acceptable_return=0.0):
+    """
+    Calculate the ratios of a (dates x tickers) close frame with the pandas pipeline of the ratio
+    scripts, one column at a time: the Sharpe and Sortino ratios from the column's own log returns
+    like sharpe.py and sortino.py, the Treynor ratio and the Alpha from those log returns on the
+    dates they share with the benchmark's like treynor.py and alpha.py.
+    Returns a dict of frames keyed by metric name.
+    """
+    benchmark_returns = log_returns(fill_missing(benchmark_closes))
+    results = {metric: {} for metric in METRICS}
+    for symbol in closes.columns:
+        returns = risk_adjust(log_returns(fill_missing(closes[symbol])), risk_free_rate, period)
+        results['sharpe'][symbol] = fill_missing(rolling_sharpe(returns, window))
+        results['sortino'][symbol] = fill_missing(
+            rolling_sortino(returns, window, minimum_acceptable_return)
+        )
+
+        returns, aligned_benchmark = align_returns(returns, benchmark_returns)
+        beta = rolling_beta(returns, aligned_benchmark, window)
+        results['treynor'][symbol] = fill_missing(rolling_treynor(returns, beta, window))
+        results['alpha'][symbol] = rolling_alpha(
+            returns, aligned_benchmark, beta, window, risk_free_rate, period
+        )
+    return {metric: pd.DataFrame(columns) for metric, columns in results.items()}
+
+
+def _quantile_kernel(values, window, lower, fractions, output):
+    """
+    Fill the rolling quantiles of every column of a (dates x tickers) array into the preallocated
+    (probabilities x dates x tickers) output, keeping the window sorted in a buffer of `window`
+    values. `lower` and `fractions` give the order statistic below each quantile and the
+    interpolation towards the next one, like pandas. Windows that contain a NaN are NaN.
+    """
+    length, tickers = values.shape
+    ordered = np.empty(window)
+    for column in range(tickers):
+        size = 0
+        missing = 0
+        for index in range(length):
+            # Drop the value that leaves the window, shifting the larger ones down
+            if index >= window:
+                old = values[index - window, column]
+                if old != old:
+                    missing -= 1
+                else:
+                    position = np.searchsorted(ordered[:size], old)
+                    for shift in range(position, size - 1):
+                        ordered[shift] = ordered[shift + 1]
+                    size -= 1
+
+            # Insert the new value, shifting the larger ones up
+            value = values[index, column]
+            if value != value:
+                missing += 1
+            else:
+                position = size
+                while position > 0 and ordered[position - 1] > value:
+                    ordered[position] = ordered[position - 1]
+                    position -= 1
+                ordered[position] = value
+                size += 1
+
+            for quantile in range(len(lower)):
+                if index < window - 1 or missing:
+                    output[quantile, index, column] = np.nan
+                elif fractions[quantile] > 0.0:
+                    below = ordered[lower[quantile]]
+                    above = ordered[lower[quantile] + 1]
+                    output[quantile, index, column] = below + (above - below) * fractions[quantile]
+                else:
+                    output[quantile, index, column] = ordered[lower[quantile]]
+
+
+def rolling_quantiles(data, window, probabilities, engine=None):
+    """
+    Calculate rolling quantiles over the rows of a Series or (dates x tickers) frame like
+    `analytics.rolling_quantiles`, with the compiled kernel when numba is installed.
+    Returns one result per probability, shaped like the input.
+    """
+    engine = _check_engine(engine)
+    if engine == 'numpy':
+        return sorted_window_quantiles(data, window, probabilities)
+
+    values = np.asarray(data, dtype='float64')
+    matrix = np.asfortranarray(values[:, None] if values.ndim == 1 else values)
+    positions = (window - 1) * np.asarray(probabilities, dtype='float64')
+    lower = positions.astype('int64')
+    output = np.empty((len(positions),) + matrix.shape, order='F')
+    kernel = compiled(_quantile_kernel) if engine == 'numba' else _quantile_kernel
+    kernel(matrix, window, lower, positions - lower, output)
+    return [_like(result[:, 0] if values.ndim == 1 else result, data) for result in output]
+
+
+def rolling_iqr_bounds(data, window=252, scale=1.5, engine=None):
+    """
+    Calculate time-varying lower and upper outlier bounds with the IQR rule over a rolling window,
+    like `analytics.rolling_iqr_bounds`, with the compiled kernel when numba is installed.
+    Returns bounds shaped like the input.
+    """
+    q1, q3 = rolling_quantiles(data, window, [0.25, 0.75], engine)
+    iqr = q3 - q1
+    return q1 - scale * iqr, q3 + scale * iqr
+
+
+def parity(closes, benchmark_closes, window=21, risk_free_rate=0.05, period=252,
+           minimum_acceptable_return=0.0, engines=None, bounds_window=63):
+    """
+    Compare the ratios and the rolling IQR bounds of the Sharpe ratio of every engine with the
+    pandas reference.
+    Returns a frame indexed by (engine, metric) with the largest absolute difference and whether
+    all the values match within the tolerance of `np.allclose`.
+    """
+    reference = reference_ratios(closes, benchmark_closes, window, risk_free_rate, period,
+                                 minimum_acceptable_return)
+    reference['bounds'] = pd.concat(
+        sorted_window_quantiles(reference['sharpe'], bounds_window, [0.25, 0.75])
+    )
+    rows = []
+    for engine in engines or [default_engine()]:
+        results = fused_ratios(closes, benchmark_closes, window, risk_free_rate, period,
+                               minimum_acceptable_return, engine)
+        results['bounds'] = pd.concat(
+            rolling_quantiles(reference['sharpe'], bounds_window, [0.25, 0.75], engine)
+        )
+        for metric, expected in reference.items():
+            actual = results[metric].to_numpy()
+            expected = expected.to_numpy()
+            with np.errstate(invalid='ignore'):
+                difference = np.nanmax(np.abs(actual - expected), initial=0.0)
+            rows.append({
+                'engine': engine, 'metric': metric, 'max_abs_diff': difference,
+                'match': bool(np.allclose(actual, expected, rtol=1e-7, atol=1e-10, equal_nan=True)),
+            })
+    return pd.DataFrame(rows).set_index(['engine', 'metric'])
+
+
+def main(argv=None):
+    """
+    Check every available engine against the pandas reference on synthetic random-walk closes.
+    """
+    parser = argparse.ArgumentParser(description='Check the fused kernels against pandas.')
+    parser.add_argument('--length', type=int, default=1000, help='number of dates (default is 1000)')
+    parser.add_argument('--tickers', type=int, default=5, help='number of tickers (default is 5)')
+    parser.add_argument('--window', type=int, default=21, help='window size in days (default is 21)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default is 0)')
+    args = parser.parse_args(argv)
+
+    # Random-walk closes with a few gaps, and a benchmark with a missing date
+    generator = np.random.default_rng(args.seed)
+    dates = pd.bdate_range('2000-01-03', periods=args.length)
+    steps = generator.normal(0.0003, 0.02, (args.length, args.tickers))
+    closes = pd.DataFrame(100 * np.exp(np.cumsum(steps, axis=0)), index=dates,
+                          columns=[f'T{ticker}' for ticker in range(args.tickers)])
+    closes = closes.mask(generator.random(closes.shape) < 0.01)
+    benchmark_closes = pd.Series(1000 * np.exp(np.cumsum(steps.mean(axis=1))), index=dates)
+    benchmark_closes = benchmark_closes.drop(dates[args.length // 2])
+
+    engines = ['numpy', 'python'] + (['numba'] if has_numba() else [])
+    result = parity(closes, benchmark_closes, args.window, engines=engines)
+    print(result.to_string())
+    return 0 if result['match'].all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
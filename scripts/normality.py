@@ -9,46 +9,12 @@ Returns: None
 Example: python normality.py
 """
 
-import yfinance as yf
-import numpy as np
-from scipy.stats import shapiro, anderson, kstest, jarque_bera
 from prettytable import PrettyTable
 from colorama import Fore
 
-# Define the stock symbol
-STOCK = input("Enter the stock symbol: ")
+from analytics import fill_missing, log_returns, summary_statistics, normality_tests
+from pricestore import get_prices
 
-# Convert inputs to uppercase
-STOCK = str(STOCK).upper()
-
-# Download the stock data
-data = yf.download(STOCK, progress=False)
-
-# Use the 'Close' price and fill missing values
-data = data['Close'].ffill().bfill()
-
-# Calculate the log returns
-log_returns = np.log(data / data.shift(1))
-
-# Calculate the mean and standard deviation of the log returns
-mean = log_returns.mean()
-std_dev = log_returns.std()
-
-# Calculate the skewness and kurtosis of the log returns
-skewness = log_returns.skew()
-kurtosis = log_returns.kurtosis()
-
-# Perform the Jarque-Bera test
-jarque_bera_stat, jarque_p_value = jarque_bera(log_returns.dropna())
-
-# Perform the Shapiro-Wilk test
-shapiro_wilk_stat, shapiro_p_value = shapiro(log_returns.dropna())
-
-# Perform the Anderson-Darling test
-anderson_result = anderson(log_returns.dropna())
-
-# Perform the Kolmogorov-Smirnov test
-kolmogorov_smirnov_stat, kolmogorov_p_value = kstest(log_returns.dropna(), 'norm')
 
 # Function to generate conclusion string based on p-value
 def get_normality_conclusion(p_value):
@@ -61,50 +27,84 @@ def get_normality_conclusion(p_value):
         else Fore.GREEN + 'The returns are normally distributed' + Fore.RESET
     )
 
-# Make summary statistics table
-summary_table = PrettyTable()
-summary_table.field_names = ["Statistic", "Value"]
-summary_table.add_row(["Mean", f"{mean:.4f}"])
-summary_table.add_row(["Standard Deviation", f"{std_dev:.4f}"])
-summary_table.add_row(["Skewness", f"{skewness:.4f}"])
-summary_table.add_row(["Kurtosis", f"{kurtosis:.4f}"])
-
-# Make normality tests table
-normality_table = PrettyTable()
-normality_table.field_names = ["Test", "Statistic", "P-Value", "Conclusion"]
-normality_table.add_row([
-    "Jarque-Bera",
-    f"{jarque_bera_stat:.4f}", f"{jarque_p_value:.4f}",
-    get_normality_conclusion(jarque_p_value)
-])
-normality_table.add_row([
-    "Shapiro-Wilk",
-    f"{shapiro_wilk_stat:.4f}", f"{shapiro_p_value:.4f}",
-    get_normality_conclusion(shapiro_p_value)
-])
-normality_table.add_row([
-    "Kolmogorov-Smirnov", 
-    f"{kolmogorov_smirnov_stat:.4f}", f"{kolmogorov_p_value:.4f}",
-    get_normality_conclusion(kolmogorov_p_value)
-])
-
-# Make Anderson-Darling test table
-anderson_table = PrettyTable()
-anderson_table.field_names = ["Significance Level", "Critical Value"]
-for i, level in enumerate(anderson_result.significance_level):
-    anderson_table.add_row([f"{level:.0f}%", f"{anderson_result.critical_values[i]:.4f}"])
-anderson_conclusion = (
-    Fore.RED + 'The returns are not normally distributed' + Fore.RESET
-    if anderson_result.statistic > anderson_result.critical_values[2]
-    else Fore.GREEN + 'The returns are normally distributed' + Fore.RESET
-)
-
-# Print results
-print(f'Summary Statistics for {STOCK}')
-print(summary_table)
-print("\nNormality Tests")
-print(normality_table)
-print("\nAnderson-Darling Test")
-print(f"Statistic: {anderson_result.statistic:.4f}")
-print(anderson_table)
-print(f"Conclusion: {anderson_conclusion}")
+
+def main():
+    """
+    Ask for the stock symbol, run the normality tests and print the results.
+    """
+    # Define the stock symbol
+    STOCK = input("Enter the stock symbol: ")
+
+    # Convert inputs to uppercase
+    STOCK = str(STOCK).upper()
+
+    # Load the stock data from the local price store
+    data = get_prices(STOCK)
+
+    # Use the 'Close' price and fill missing values
+    data = fill_missing(data['Close'])
+
+    # Calculate the log returns
+    returns = log_returns(data)
+
+    # Calculate the mean, standard deviation, skewness and kurtosis of the log returns
+    summary = summary_statistics(returns)
+
+    # Perform the Jarque-Bera, Shapiro-Wilk, Kolmogorov-Smirnov and Anderson-Darling tests
+    tests, anderson_result = normality_tests(returns)
+    jarque_bera_stat, jarque_p_value = tests['jarque_bera']
+    shapiro_wilk_stat, shapiro_p_value = tests['shapiro_wilk']
+    kolmogorov_smirnov_stat, kolmogorov_p_value = tests['kolmogorov_smirnov']
+
+    # Make summary statistics table
+    summary_table = PrettyTable()
+    summary_table.field_names = ["Statistic", "Value"]
+    summary_table.add_row(["Mean", f"{summary['mean']:.4f}"])
+    summary_table.add_row(["Standard Deviation", f"{summary['std_dev']:.4f}"])
+    summary_table.add_row(["Skewness", f"{summary['skewness']:.4f}"])
+    summary_table.add_row(["Kurtosis", f"{summary['kurtosis']:.4f}"])
+
+    # Make normality tests table
+    normality_table = PrettyTable()
+    normality_table.field_names = ["Test", "Statistic", "P-Value", "Conclusion"]
+    normality_table.add_row([
+        "Jarque-Bera",
+        f"{jarque_bera_stat:.4f}", f"{jarque_p_value:.4f}",
+        get_normality_conclusion(jarque_p_value)
+    ])
+    normality_table.add_row([
+        "Shapiro-Wilk",
+        f"{shapiro_wilk_stat:.4f}", f"{shapiro_p_value:.4f}",
+        get_normality_conclusion(shapiro_p_value)
+    ])
+    normality_table.add_row([
+        "Kolmogorov-Smirnov",
+        f"{kolmogorov_smirnov_stat:.4f}", f"{kolmogorov_p_value:.4f}",
+        get_normality_conclusion(kolmogorov_p_value)
+    ])
+
+    # Make Anderson-Darling test table
+    anderson_table = PrettyTable()
+    anderson_table.field_names = ["Significance Level", "Critical Value"]
+    for i, level in enumerate(anderson_result.significance_level):
+        anderson_table.add_row([f"{level:.0f}%", f"{anderson_result.critical_values[i]:.4f}"])
+    anderson_conclusion = (
+        Fore.RED + 'The returns are not normally distributed' + Fore.RESET
+        if anderson_result.statistic > anderson_result.critical_values[2]
+        else Fore.GREEN + 'The returns are normally distributed' + Fore.RESET
+    )
+
+    # Print results
+    print(f'Summary Statistics for {STOCK}')
+    print(summary_table)
+    print("\nNormality Tests")
+    print(normality_table)
+    print("\nAnderson-Darling Test")
+    print(f"Statistic: {anderson_result.statistic:.4f}")
+    print(f"P-Value: {anderson_result.pvalue:.4f}")
+    print(anderson_table)
+    print(f"Conclusion: {anderson_conclusion}")
+
+
+if __name__ == '__main__':
+    main()
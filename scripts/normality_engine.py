@@ -0,0 +1,150 @@
+"""
+This module runs the normality tests on a whole (dates x tickers) return matrix at once.
+The moments, skewness, kurtosis and Jarque-Bera test come from one vectorized pass along the
+dates, the Kolmogorov-Smirnov and Anderson-Darling tests from the sorted columns in one go, and
+only the Shapiro-Wilk test falls back to a loop over the columns that still need it.
+
+Author: kangwijen
+
+Example:
+    results = batch_normality(log_returns_matrix)
+    print(results.loc[results['jarque_bera_pvalue'] < 0.05].index)
+"""
+
+import numpy as np
+import pandas as pd
+
+from analytics import anderson_critical_values
+
+
+def batch_moments(values):
+    """
+    Calculate the count, mean, standard deviation, skewness and excess kurtosis of every column.
+    NaN are ignored, so columns may have different lengths. Skewness and kurtosis are the
+    bias-adjusted estimates that pandas reports, the biased ones are returned for the tests.
+    """
+    present = ~np.isnan(values)
+    count = present.sum(axis=0).astype('float64')
+    mean = np.where(present, values, 0.0).sum(axis=0) / count
+    centered = np.where(present, values - mean, 0.0)
+    squares = centered * centered
+    m2 = squares.sum(axis=0) / count
+    m3 = (squares * centered).sum(axis=0) / count
+    m4 = (squares * squares).sum(axis=0) / count
+
+    # Biased skewness and excess kurtosis, as used by the Jarque-Bera test
+    skewness = m3 / m2 ** 1.5
+    kurtosis = m4 / m2 ** 2 - 3.0
+
+    return {
+        'count': count,
+        'mean': mean,
+        'std_dev': np.sqrt(m2 * count / (count - 1)),
+        'skewness': skewness * np.sqrt(count * (count - 1)) / (count - 2),
+        'kurtosis': ((count + 1) * kurtosis + 6) * (count - 1) / ((count - 2) * (count - 3)),
+        'biased_skewness': skewness,
+        'biased_kurtosis': kurtosis,
+    }
+
+
+def sorted_standardized(values, mean, std_dev):
+    """
+    Sort every column and standardize it, NaN are sorted to the end of the column.
+    """
+    return (np.sort(values, axis=0) - mean) / std_dev
+
+
+def batch_kolmogorov_smirnov(standardized, count, method='asymptotic'):
+    """
+    Calculate the Kolmogorov-Smirnov test of every sorted standardized column against the normal.
+    The 'exact' p-values match scipy's kstest but cost milliseconds per column, the 'asymptotic'
+    ones use the limiting Kolmogorov distribution.
+    """
+    from scipy.special import ndtr
+    from scipy.stats import kstwo, kstwobign
+
+    rank = np.arange(1, standardized.shape[0] + 1)[:, None]
+    valid = rank <= count
+    cdf = ndtr(standardized)
+    upper = np.where(valid, rank / count - cdf, -np.inf).max(axis=0)
+    lower = np.where(valid, cdf - (rank - 1) / count, -np.inf).max(axis=0)
+    statistic = np.maximum(upper, lower)
+    if method == 'exact':
+        return statistic, kstwo.sf(statistic, count.astype('int64'))
+    return statistic, kstwobign.sf(statistic * np.sqrt(count))
+
+
+def batch_anderson_darling(standardized, count):
+    """
+    Calculate the Anderson-Darling statistic of every sorted standardized column against the normal,
+    with the critical values at `analytics.ANDERSON_SIGNIFICANCE_LEVELS`.
+    """
+    from scipy.special import log_ndtr
+
+    length = standardized.shape[0]
+    rank = np.arange(1, length + 1)[:, None]
+    valid = rank <= count
+
+    # Pair the i-th smallest value with the i-th largest one of the same column
+    reverse = (count.astype('int64') - rank) % length
+    mirrored = np.take_along_axis(standardized, np.where(valid, reverse, 0), axis=0)
+    terms = (2 * rank - 1) * (log_ndtr(standardized) + log_ndtr(-mirrored))
+    statistic = -count - np.where(valid, terms, 0.0).sum(axis=0) / count
+    return statistic, anderson_critical_values(count)
+
+
+def batch_normality(returns, exact_tests='all', significance=0.05, ks_method='asymptotic'):
+    """
+    Run the normality tests on every column of a (dates x tickers) return matrix.
+    The Kolmogorov-Smirnov test is against the normal fitted to each column, so its columns are
+    `kolmogorov_smirnov_fitted_*`, apart from the runner's `kolmogorov_smirnov_*` columns of
+    scipy's `kstest(returns, 'norm')` against the standard normal. The Shapiro-Wilk test
+    runs column by column on 'all' columns, on the 'undecided' ones the Jarque-Bera test does not
+    reject at `significance`, or on 'none'.
+    Returns one row per ticker.
+    """
+    if exact_tests not in ('all', 'undecided', 'none'):
+        raise ValueError("exact_tests must be 'all', 'undecided' or 'none'")
+    frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+    values = frame.to_numpy(dtype='float64')
+
+    # Calculate the moments in one pass along the dates
+    moments = batch_moments(values)
+    count = moments['count']
+    skewness = moments.pop('biased_skewness')
+    kurtosis = moments.pop('biased_kurtosis')
+    results = pd.DataFrame(moments, index=frame.columns)
+
+    # Perform the Jarque-Bera test, its chi-squared(2) p-value is exp(-JB / 2)
+    jarque_bera = count / 6.0 * (skewness ** 2 + kurtosis ** 2 / 4.0)
+    results['jarque_bera_stat'] = jarque_bera
+    results['jarque_bera_pvalue'] = np.exp(-jarque_bera / 2.0)
+
+    # Perform the Kolmogorov-Smirnov and Anderson-Darling tests on the sorted columns
+    standardized = sorted_standardized(values, moments['mean'], moments['std_dev'])
+    results['kolmogorov_smirnov_fitted_stat'], results['kolmogorov_smirnov_fitted_pvalue'] = (
+        batch_kolmogorov_smirnov(standardized, count, ks_method)
+    )
+    anderson_statistic, critical_values = batch_anderson_darling(standardized, count)
+    results['anderson_darling_stat'] = anderson_statistic
+    results['anderson_darling_critical_5'] = critical_values[:, 2]
+
+    # Perform the Shapiro-Wilk test only on the columns that need it
+    results['shapiro_wilk_stat'] = np.nan
+    results['shapiro_wilk_pvalue'] = np.nan
+    if exact_tests != 'none':
+        from scipy.stats import shapiro
+
+        needed = results.index
+        if exact_tests == 'undecided':
+            needed = results.index[results['jarque_bera_pvalue'] >= significance]
+        for position, column in enumerate(frame.columns):
+            if column not in needed or count[position] < 3:
+                continue
+            column_values = values[:, position]
+            statistic, p_value = shapiro(column_values[~np.isnan(column_values)])
+            results.iloc[position, results.columns.get_loc('shapiro_wilk_stat')] = statistic
+            results.iloc[position, results.columns.get_loc('shapiro_wilk_pvalue')] = p_value
+
+    results.index.name = 'symbol'
+    return results
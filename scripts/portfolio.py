@@ -0,0 +1,294 @@
+"""
+This script computes the rolling Sharpe, Sortino, Treynor and Alpha of a portfolio of stocks.
+The portfolio holds fixed weights or weights that change at rebalance dates. The ratios on a date
+are those of the portfolio held on that date over the window, so with time-varying weights they
+describe the current holdings rather than the traded history. Its rolling mean, variance and beta
+come from the covariance matrix of the stocks and the benchmark, which is kept up to date with
+rank-two updates as the window slides. Memory stays at one window of returns plus
+one (tickers x tickers) matrix, instead of a (dates x tickers x tickers) `rolling().cov()` panel.
+
+Author: kangwijen
+
+Parameters: symbols on the command line or a file with one symbol per line, and their weights
+Returns: None
+Example: python portfolio.py BBCA.JK BBRI.JK TLKM.JK --weights 0.5 0.3 0.2 --latest
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analytics import fill_missing, log_returns, risk_adjust, align_returns
+from batch import load_closes, build_returns_matrix
+from pricestore import PriceStore
+from symbols import read_symbols
+
+
+class RollingCovarianceMatrix:
+    """
+    Running mean vector and sample covariance matrix of the last `window` observations of `size`
+    variables. Every update adds the new observation and drops the oldest one with a rank-two
+    update of the co-moment matrix in O(size^2), like `streaming.RollingCovariance` for one pair.
+    """
+
+    def __init__(self, window, size):
+        if window < 2:
+            raise ValueError('The window must hold at least 2 observations')
+        self.window = window
+        self.size = size
+        self.buffer = np.zeros((window, size))
+        self.position = 0
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.comoment = np.zeros((size, size))
+
+    def update(self, values):
+        """
+        Add an observation and drop the oldest one once the window is full.
+        """
+        values = np.asarray(values, dtype='float64')
+        if self.count < self.window:
+            # Grow the window with a rank-one update
+            self.count += 1
+            delta = values - self.mean
+            self.mean += delta / self.count
+            self.comoment += np.outer(delta, values - self.mean)
+        else:
+            # Drop the oldest observation and add the new one with a single rank-two update
+            old = self.buffer[self.position]
+            old_delta = old - self.mean
+            self.mean -= old_delta / (self.count - 1)
+            old_residual = old - self.mean
+            delta = values - self.mean
+            self.mean += delta / self.count
+            self.comoment += np.stack([-old_delta, delta], axis=1) @ np.stack([old_residual, values - self.mean])
+        self.buffer[self.position] = values
+        self.position = (self.position + 1) % self.window
+
+    @property
+    def ready(self):
+        """
+        Whether the window is full.
+        """
+        return self.count == self.window
+
+    @property
+    def covariance(self):
+        """
+        Sample covariance matrix of the window.
+        """
+        if self.count < 2:
+            return np.full((self.size, self.size), np.nan)
+        return self.comoment / (self.count - 1)
+
+    def to_dict(self):
+        """
+        Return the state as a JSON-serializable dict.
+        """
+        return {
+            'window': self.window, 'size': self.size, 'buffer': self.buffer.tolist(),
+            'position': self.position, 'count': self.count, 'mean': self.mean.tolist(),
+            'comoment': self.comoment.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restore an estimator from `to_dict()` output.
+        """
+        estimator = cls(state['window'], state['size'])
+        estimator.buffer = np.asarray(state['buffer'], dtype='float64')
+        estimator.position = state['position']
+        estimator.count = state['count']
+        estimator.mean = np.asarray(state['mean'], dtype='float64')
+        estimator.comoment = np.asarray(state['comoment'], dtype='float64')
+        return estimator
+
+
+def portfolio_weights(weights, returns):
+    """
+    Return the (dates x tickers) weights in effect on every date of a return matrix.
+    Fixed weights may be a list in column order, or a dict or Series keyed by symbol. Time-varying
+    weights are a (rebalance dates x symbols) frame; the weights set at the close of a rebalance
+    date earn the returns from the next date on, and are zero before the first rebalance date.
+    Symbols without a weight have a weight of zero.
+    """
+    if isinstance(weights, pd.DataFrame):
+        weights = weights.reindex(columns=returns.columns, fill_value=0.0)
+        combined = weights.index.union(returns.index)
+        held = weights.reindex(combined).ffill().shift(1).reindex(returns.index)
+        return held.fillna(0.0).to_numpy(dtype='float64')
+    if isinstance(weights, (dict, pd.Series)):
+        weights = pd.Series(weights, dtype='float64').reindex(returns.columns, fill_value=0.0)
+    weights = np.asarray(weights, dtype='float64')
+    if len(weights) != returns.shape[1]:
+        raise ValueError(f'Expected {returns.shape[1]} weights, got {len(weights)}')
+    return np.broadcast_to(weights, returns.shape)
+
+
+def portfolio_returns(returns, weights):
+    """
+    Calculate the log returns of the portfolio as the weighted sum of the log returns of the stocks.
+    Missing returns, before a stock's first close, count as zero.
+    """
+    held = portfolio_weights(weights, returns)
+    values = np.nan_to_num(returns.to_numpy(dtype='float64'))
+    return pd.Series(np.einsum('ij,ij->i', values, held), index=returns.index, name='portfolio')
+
+
+def rolling_portfolio_moments(returns, weights, benchmark_returns, window=21, threshold=0.0):
+    """
+    Calculate the rolling mean, variance and downside deviation below `threshold` of the portfolio,
+    its beta and the rolling mean of the benchmark from the rolling covariance matrix of the stocks
+    and the benchmark.
+    The moments are those of the weights in effect on each date applied to the whole window, which
+    for fixed weights equals the moments of the portfolio's return series.
+    Returns a frame with the 'mean', 'variance', 'downside_deviation', 'beta' and 'benchmark_mean'
+    columns, NaN until the first full window.
+    """
+    returns, benchmark_returns = align_returns(returns, benchmark_returns)
+    held = portfolio_weights(weights, returns)
+    values = np.column_stack([np.nan_to_num(returns.to_numpy(dtype='float64')),
+                              benchmark_returns.to_numpy(dtype='float64')])
+
+    moments = np.full((len(values), 5), np.nan)
+    estimator = RollingCovarianceMatrix(window, values.shape[1])
+    for row, observation in enumerate(values):
+        estimator.update(observation)
+        if not estimator.ready:
+            continue
+
+        # Project the co-moments on the weights instead of forming the covariance matrix
+        weight = held[row]
+        comoment = estimator.comoment
+        stock_comoment = comoment[:-1, :-1] @ weight
+        benchmark_comoment = comoment[-1, -1]
+        moments[row, 0] = weight @ estimator.mean[:-1]
+        moments[row, 1] = weight @ stock_comoment / (window - 1)
+        # The shortfalls need the window's returns of the held portfolio, O(window x tickers)
+        shortfalls = np.minimum(estimator.buffer[:, :-1] @ weight - threshold, 0.0)
+        moments[row, 2] = np.sqrt(shortfalls @ shortfalls / window)
+        moments[row, 3] = weight @ comoment[:-1, -1] / benchmark_comoment if benchmark_comoment > 0 else np.nan
+        moments[row, 4] = estimator.mean[-1]
+    return pd.DataFrame(
+        moments, index=returns.index, columns=['mean', 'variance', 'downside_deviation', 'beta', 'benchmark_mean']
+    )
+
+
+def portfolio_ratios(returns, weights, benchmark_returns, window=21, risk_free_rate=0.05, period=252,
+                     minimum_acceptable_return=0.0):
+    """
+    Compute the rolling Sharpe, Sortino, Treynor and Alpha of a portfolio of the columns of a
+    return matrix, treating its risk-adjusted returns like those of a single stock in the scripts.
+    Every ratio on a date measures the portfolio held on that date: the Sharpe, Sortino and Treynor
+    ratios over the window's returns of those weights, and the Alpha's daily excess over the CAPM
+    from that day's return and beta of those weights, smoothed like alpha.py. With fixed weights
+    they equal the ratios of the portfolio's return series.
+    Returns a dict of Series keyed by metric name, plus the rolling 'beta' of the portfolio.
+    """
+    daily_risk_free_rate = risk_free_rate / period
+    returns, benchmark_returns = align_returns(returns, benchmark_returns)
+    moments = rolling_portfolio_moments(returns, weights, benchmark_returns, window,
+                                        daily_risk_free_rate + minimum_acceptable_return)
+    risk_adjusted_returns = risk_adjust(portfolio_returns(returns, weights), risk_free_rate, period)
+
+    # The risk-free rate only shifts the mean, the variance and the beta stay the same
+    mean = moments['mean'] - daily_risk_free_rate
+    beta = moments['beta']
+    # A window without risk, like the dates before the first rebalance, has no Sharpe ratio
+    sharpe = mean / np.sqrt(moments['variance'].where(moments['variance'] > 0))
+    downside_deviation = moments['downside_deviation']
+    sortino = (mean - minimum_acceptable_return) / downside_deviation.where(downside_deviation > 0)
+    treynor = mean / beta.where(beta != 0)
+
+    # Calculate the expected return of the portfolio from the CAPM and smooth the Alpha
+    expected_return = daily_risk_free_rate + beta * (moments['benchmark_mean'] - daily_risk_free_rate)
+    alpha = fill_missing(risk_adjusted_returns - expected_return).ewm(span=window).mean()
+
+    return {
+        'sharpe': fill_missing(sharpe),
+        'sortino': fill_missing(sortino),
+        'treynor': fill_missing(treynor),
+        'alpha': alpha,
+        'beta': beta,
+    }
+
+
+def run_portfolio(symbols, weights=None, benchmark='^JKSE', period=252, window=21, risk_free_rate=0.05,
+                  minimum_acceptable_return=0.0, latest=False, store=None):
+    """
+    Load the symbols and the benchmark and return the portfolio's ratio table and the load errors.
+    Equal weights are used when no weights are given.
+    """
+    store = store or PriceStore()
+    closes, errors = load_closes(symbols, store)
+    if closes.empty:
+        return pd.DataFrame(), errors
+    if weights is None:
+        weights = pd.Series(1.0 / len(closes.columns), index=closes.columns)
+    elif not isinstance(weights, pd.DataFrame):
+        weights = pd.Series(weights, index=symbols, dtype='float64')
+    benchmark_returns = log_returns(fill_missing(store.update(benchmark)['Close']))
+    ratios = portfolio_ratios(
+        build_returns_matrix(closes), weights, benchmark_returns, window, risk_free_rate,
+        period, minimum_acceptable_return
+    )
+    table = pd.DataFrame(ratios)
+    if latest:
+        table = table.iloc[[-1]]
+    table.index.name = 'date'
+    return table.reset_index(), errors
+
+
+def main(argv=None):
+    """
+    Parse the command line, compute the portfolio ratios and write the result table.
+    """
+    parser = argparse.ArgumentParser(description='Rolling ratios of a portfolio of stocks.')
+    parser.add_argument('symbols', nargs='*', help='stock symbols')
+    parser.add_argument('--file', help='file with one symbol per line')
+    parser.add_argument('--weights', type=float, nargs='+',
+                        help='weight of every symbol, in the same order (default is equal weights)')
+    parser.add_argument('--weights-file',
+                        help='CSV of time-varying weights, one row per rebalance date and one column per symbol')
+    parser.add_argument('--benchmark', default='^JKSE', help='benchmark symbol (default is ^JKSE)')
+    parser.add_argument('--period', type=int, default=252, help='period in days (default is 252)')
+    parser.add_argument('--window', type=int, default=21, help='window size in days (default is 21)')
+    parser.add_argument('--risk-free-rate', type=float, default=0.05,
+                        help='risk-free rate (default is 0.05)')
+    parser.add_argument('--minimum-acceptable-return', type=float, default=0.0,
+                        help='minimum acceptable return of the Sortino ratio (default is 0)')
+    parser.add_argument('--latest', action='store_true', help='only keep the last date')
+    parser.add_argument('--output', help='output .csv or .parquet file (default is stdout)')
+    args = parser.parse_args(argv)
+
+    symbols = read_symbols(args.symbols, args.file)
+    weights = args.weights
+    if args.weights_file:
+        weights = pd.read_csv(args.weights_file, index_col=0, parse_dates=True)
+        weights.columns = [str(column).upper() for column in weights.columns]
+        symbols = symbols or list(weights.columns)
+    if not symbols:
+        parser.error('no symbols given')
+    if args.weights and len(args.weights) != len(symbols):
+        parser.error(f'expected {len(symbols)} weights, got {len(args.weights)}')
+
+    table, errors = run_portfolio(
+        symbols, weights, args.benchmark.upper(), args.period, args.window, args.risk_free_rate,
+        args.minimum_acceptable_return, args.latest
+    )
+    for symbol, error in errors.items():
+        print(f'Skipped {symbol}: {error}', file=sys.stderr)
+
+    if args.output is None:
+        table.to_csv(sys.stdout, index=False)
+    elif args.output.endswith('.parquet'):
+        table.to_parquet(args.output, index=False)
+    else:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+This module keeps a local Parquet store of daily OHLCV bars per symbol.
+The first request for a symbol downloads its full history, later requests only fetch
+the bars after the last cached date and append them to the store.
+
+Author: kangwijen
+
+Example:
+    from pricestore import get_prices
+    data = get_prices('BBCA.JK')
+"""
+
+import os
+import time
+
+import pandas as pd
+
+# Columns kept in the store
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Default location of the store (override with PYQUANT_STORE)
+DEFAULT_ROOT = os.path.join(os.path.expanduser('~'), '.pyquant', 'prices')
+
+# Seconds during which a checked symbol is served from the store without fetching
+# (override with PYQUANT_STORE_MAX_AGE)
+DEFAULT_MAX_AGE = 0
+
+
+def normalize_bars(data):
+    """
+    Flatten a downloaded OHLCV frame to the store columns with a sorted date index.
+    """
+    # yfinance returns (field, ticker) columns for single symbols
+    if isinstance(data.columns, pd.MultiIndex):
+        data = data.droplevel(1, axis=1)
+    data = data.loc[:, [column for column in COLUMNS if column in data.columns]]
+    data.index = pd.DatetimeIndex(data.index).tz_localize(None)
+    data.index.name = 'Date'
+    data = data[~data.index.duplicated(keep='last')]
+    return data.sort_index().astype('float64')
+
+
+class Provider:
+    """
+    Interface for anything that can fetch daily OHLCV bars for a symbol.
+    """
+
+    def fetch(self, symbol, start=None):
+        """
+        Return the bars of a symbol from `start` (inclusive) onwards, or the full history.
+        """
+        raise NotImplementedError
+
+
+class YahooProvider(Provider):
+    """
+    Fetch bars from Yahoo Finance through yfinance.
+    """
+
+    def fetch(self, symbol, start=None):
+        import yfinance as yf
+
+        data = yf.download(symbol, start=start, progress=False, auto_adjust=False)
+        if data is None or data.empty:
+            return pd.DataFrame(columns=COLUMNS, dtype='float64')
+        return normalize_bars(data)
+
+
+class CSVProvider(Provider):
+    """
+    Fetch bars from local `<SYMBOL>.csv` files, mainly for tests and offline runs.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, symbol, start=None):
+        path = os.path.join(self.directory, f'{symbol}.csv')
+        data = pd.read_csv(path, index_col=0, parse_dates=True)
+        data = normalize_bars(data)
+        if start is not None:
+            data = data.loc[pd.Timestamp(start):]
+        return data
+
+
+class PriceStore:
+    """
+    Local Parquet store of OHLCV bars, one file per symbol.
+    """
+
+    def __init__(self, root=None, provider=None, max_age=None):
+        self.root = root or os.environ.get('PYQUANT_STORE', DEFAULT_ROOT)
+        self.provider = provider or YahooProvider()
+        if max_age is None:
+            max_age = float(os.environ.get('PYQUANT_STORE_MAX_AGE', DEFAULT_MAX_AGE))
+        self.max_age = max_age
+        self.versions = {}
+        self.listeners = []
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, symbol):
+        """
+        Return the Parquet file that holds the bars of a symbol.
+        """
+        return os.path.join(self.root, f"{symbol.replace('/', '_')}.parquet")
+
+    def load(self, symbol):
+        """
+        Return the cached bars of a symbol without fetching, or None if not cached.
+        """
+        path = self.path(symbol)
+        if not os.path.exists(path):
+            return None
+        return pd.read_parquet(path)
+
+    def version(self, symbol):
+        """
+        Return the data version of a symbol, which goes up every time this store writes new bars.
+        """
+        return self.versions.get(symbol, 0)
+
+    def subscribe(self, listener):
+        """
+        Call `listener(symbol)` every time new bars of a symbol are written.
+        """
+        self.listeners.append(listener)
+
+    def is_fresh(self, symbol):
+        """
+        Whether the symbol was checked less than `max_age` seconds ago.
+        """
+        path = self.path(symbol)
+        if self.max_age <= 0 or not os.path.exists(path):
+            return False
+        return time.time() - os.path.getmtime(path) < self.max_age
+
+    def update(self, symbol):
+        """
+        Fetch the bars after the last cached date, append them and return the full history.
+        Symbols checked less than `max_age` seconds ago are returned without fetching, which also
+        skips importing the provider's client library.
+        """
+        if self.is_fresh(symbol):
+            return self.load(symbol)
+
+        cached = self.load(symbol)
+        if cached is None or cached.empty:
+            data = self.provider.fetch(symbol)
+        else:
+            # Re-fetch the last cached bar as well, it may have been a partial session
+            fresh = self.provider.fetch(symbol, start=cached.index[-1])
+            if not fresh.empty:
+                data = pd.concat([cached, fresh])
+                data = data[~data.index.duplicated(keep='last')].sort_index()
+            if fresh.empty or data.equals(cached):
+                # Record the check so the symbol counts as fresh
+                os.utime(self.path(symbol))
+                return cached
+        if data.empty:
+            raise ValueError(f'No data found for {symbol}')
+        self._write(symbol, data)
+        return data
+
+    def _write(self, symbol, data):
+        """
+        Write the bars of a symbol atomically and notify the listeners.
+        """
+        path = self.path(symbol)
+        tmp_path = f'{path}.tmp'
+        data.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        self.versions[symbol] = self.version(symbol) + 1
+        for listener in self.listeners:
+            listener(symbol)
+
+
+def get_prices(symbol, store=None):
+    """
+    Return the up-to-date OHLCV history of a symbol from the local store.
+    """
+    store = store or PriceStore()
+    return store.update(symbol)
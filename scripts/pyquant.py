@@ -0,0 +1,247 @@
+"""
+This script is the non-interactive command line of pyquant.
+Every analysis of the interactive scripts is a subcommand that takes its inputs as flags, accepts
+many symbols in one invocation and writes machine-readable JSON Lines or CSV without colours.
+
+Author: kangwijen
+
+Parameters: a subcommand, symbols and flags (see python pyquant.py --help)
+Returns: exit code 1 when no symbol could be analysed
+Example: python pyquant.py sharpe BBCA.JK BBRI.JK --window 63 --latest --format csv
+"""
+
+import argparse
+import sys
+
+import pandas as pd
+
+from analytics import (
+    fill_missing, log_returns, risk_adjust, align_returns, rolling_sharpe, rolling_sortino,
+    rolling_beta, rolling_treynor, rolling_alpha, iqr_bounds, ljung_box,
+    durbin_watson, seasonal_decomposition
+)
+from symbols import read_symbols
+from kernels import rolling_iqr_bounds
+from pricestore import PriceStore
+from report import ratio_data
+from runner import normality_task, unitroot_task
+from unitroot_monitor import rolling_adf
+
+# Ratio subcommands and whether they need a benchmark
+RATIOS = {'sharpe': False, 'sortino': False, 'treynor': True, 'alpha': True}
+
+
+class RowWriter:
+    """
+    Write result frames one after the other as JSON Lines or CSV.
+    """
+
+    def __init__(self, file, fmt='jsonl'):
+        self.file = file
+        self.fmt = fmt
+        self.header = True
+
+    def write(self, frame):
+        """
+        Write the rows of a frame, with the CSV header only before the first frame.
+        """
+        if frame.empty:
+            return
+        if self.fmt == 'csv':
+            frame.to_csv(self.file, index=False, header=self.header, date_format='%Y-%m-%d')
+        else:
+            frame.to_json(self.file, orient='records', lines=True, date_format='iso')
+        self.header = False
+
+
+def ratio_rows(command, closes, args, benchmark_closes=None):
+    """
+    Calculate a rolling ratio of one stock with its bounds and outlier flags.
+    """
+    returns = risk_adjust(log_returns(fill_missing(closes)), args.risk_free_rate, args.period)
+    if command == 'sharpe':
+        ratio = fill_missing(rolling_sharpe(returns, args.window))
+    elif command == 'sortino':
+        ratio = fill_missing(rolling_sortino(returns, args.window, args.minimum_acceptable_return))
+    else:
+        returns, benchmark_returns = align_returns(returns, log_returns(fill_missing(benchmark_closes)))
+        beta = rolling_beta(returns, benchmark_returns, args.window)
+        if command == 'treynor':
+            ratio = fill_missing(rolling_treynor(returns, beta, args.window))
+        else:
+            ratio = rolling_alpha(
+                returns, benchmark_returns, beta, args.window, args.risk_free_rate, args.period
+            )
+    if args.bounds_window is None:
+        lower_bound, upper_bound = iqr_bounds(ratio)
+    else:
+        lower_bound, upper_bound = rolling_iqr_bounds(ratio, args.bounds_window)
+    rows = ratio_data(ratio, lower_bound, upper_bound)
+    if args.latest:
+        rows = rows.iloc[[-1]]
+    rows.index.name = 'date'
+    return rows.reset_index()
+
+
+def normality_rows(closes, args):
+    """
+    Run the normality tests of one stock.
+    """
+    return pd.DataFrame([normality_task(log_returns(fill_missing(closes)))])
+
+
+def unitroot_rows(closes, args):
+    """
+    Run the unit root tests of one stock, or the ADF test over a rolling window.
+    """
+    returns = log_returns(fill_missing(closes))
+    if args.window is None:
+        return pd.DataFrame([unitroot_task(returns)])
+    rows = rolling_adf(returns, args.window, lags=args.lags).dropna()
+    rows.index.name = 'date'
+    return rows.reset_index()
+
+
+def autocorr_rows(closes, args):
+    """
+    Run the Ljung-Box test for every lag and the Durbin-Watson test of one stock.
+    """
+    returns = log_returns(fill_missing(closes))
+    rows = ljung_box(returns, lags=args.lags)
+    rows.index.name = 'lag'
+    rows = rows.reset_index()
+    rows['significant'] = rows['lb_pvalue'] < args.significance
+    rows['durbin_watson'] = durbin_watson(returns)
+    return rows
+
+
+def decompose_rows(closes, args):
+    """
+    Decompose the closing price of one stock with the residual bounds.
+    """
+    data = fill_missing(closes)
+    result = seasonal_decomposition(data, args.period)
+    lower_bound, upper_bound = iqr_bounds(fill_missing(result.resid))
+    rows = pd.DataFrame({
+        'original': data,
+        'trend': result.trend,
+        'seasonal': result.seasonal,
+        'residual': result.resid,
+        'lower_bound': lower_bound,
+        'upper_bound': upper_bound,
+    })
+    rows.index.name = 'date'
+    return rows.reset_index()
+
+
+# Row builders of the test subcommands
+TESTS = {
+    'normality': normality_rows,
+    'unitroot': unitroot_rows,
+    'autocorr': autocorr_rows,
+    'decompose': decompose_rows,
+}
+
+
+def build_parser():
+    """
+    Build the argument parser with one subparser per analysis.
+    """
+    parser = argparse.ArgumentParser(prog='pyquant', description='Quantitative analysis of stocks.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('symbols', nargs='*', help='stock symbols')
+    common.add_argument('--file', help='file with one symbol per line')
+    common.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl',
+                        help='output format (default is jsonl)')
+    common.add_argument('--output', help='output file (default is stdout)')
+
+    for command, needs_benchmark in RATIOS.items():
+        subparser = subparsers.add_parser(command, parents=[common], help=f'rolling {command} ratio')
+        if needs_benchmark:
+            subparser.add_argument('--benchmark', default='^JKSE',
+                                   help='benchmark symbol (default is ^JKSE)')
+        subparser.add_argument('--period', type=int, default=252,
+                               help='period in days (default is 252)')
+        subparser.add_argument('--window', type=int, default=21,
+                               help='window size in days (default is 21)')
+        subparser.add_argument('--risk-free-rate', type=float, default=0.05,
+                               help='risk-free rate (default is 0.05)')
+        if command == 'sortino':
+            subparser.add_argument('--minimum-acceptable-return', type=float, default=0.0,
+                                   help='minimum acceptable return (default is 0)')
+        subparser.add_argument('--latest', action='store_true',
+                               help='only output the last date per symbol')
+        subparser.add_argument('--bounds-window', type=int,
+                               help='rolling window of the outlier bounds in days (default is the full history)')
+
+    subparsers.add_parser('normality', parents=[common], help='normality tests')
+    unitroot = subparsers.add_parser('unitroot', parents=[common], help='unit root tests')
+    unitroot.add_argument('--window', type=int,
+                          help='run the ADF test over a rolling window of this many days instead')
+    unitroot.add_argument('--lags', type=int,
+                          help='fixed number of ADF lags in rolling mode (default is picked by AIC)')
+
+    autocorr = subparsers.add_parser('autocorr', parents=[common], help='autocorrelation tests')
+    autocorr.add_argument('--lags', type=int, default=10, help='number of lags (default is 10)')
+    autocorr.add_argument('--significance', type=float, default=0.05,
+                          help='significance level (default is 0.05)')
+
+    decompose = subparsers.add_parser('decompose', parents=[common], help='seasonal decomposition')
+    decompose.add_argument('--period', type=int, default=30,
+                           help='period for seasonal decomposition in days (default is 30)')
+    return parser
+
+
+def run(args, file, store=None):
+    """
+    Run a subcommand on every symbol and write the rows to a file.
+    Returns a dict of the symbols that failed with their error.
+    """
+    store = store or PriceStore()
+    writer = RowWriter(file, args.format)
+    errors = {}
+
+    benchmark_closes = None
+    if RATIOS.get(args.command):
+        benchmark_closes = store.update(args.benchmark.upper())['Close']
+
+    for symbol in read_symbols(args.symbols, args.file):
+        try:
+            closes = store.update(symbol)['Close']
+            if args.command in RATIOS:
+                rows = ratio_rows(args.command, closes, args, benchmark_closes)
+            else:
+                rows = TESTS[args.command](closes, args)
+        except Exception as error:
+            errors[symbol] = f'{type(error).__name__}: {error}'
+            continue
+        rows.insert(0, 'symbol', symbol)
+        writer.write(rows)
+    return errors
+
+
+def main(argv=None):
+    """
+    Parse the command line and run the subcommand.
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    symbols = read_symbols(args.symbols, args.file)
+    if not symbols:
+        parser.error('no symbols given')
+
+    if args.output is None:
+        errors = run(args, sys.stdout)
+    else:
+        with open(args.output, 'w', encoding='utf-8', newline='') as file:
+            errors = run(args, file)
+
+    for symbol, error in errors.items():
+        print(f'Skipped {symbol}: {error}', file=sys.stderr)
+    sys.exit(1 if len(errors) == len(symbols) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+This module builds the figures of the scripts and decides where they go.
+By default figures are shown in the browser like before. Batch jobs can write them to HTML or
+static image files instead, or skip building figures entirely and write only the numeric series.
+
+Output modes (PYQUANT_OUTPUT environment variable):
+    show      open the figure in the browser (default)
+    html      write the figure to an HTML file
+    png, svg, pdf, jpeg, webp
+              write the figure to a static image file (requires kaleido)
+    json, parquet
+              skip the figure and write the numeric series only
+
+Files are written to PYQUANT_OUTPUT_DIR (default is the current directory).
+
+Author: kangwijen
+
+Example:
+    PYQUANT_OUTPUT=parquet PYQUANT_OUTPUT_DIR=out python sharpe.py
+"""
+
+import os
+
+import pandas as pd
+
+# Output modes that write a figure file and the ones that only write the data
+FIGURE_MODES = ['show', 'html', 'png', 'svg', 'pdf', 'jpeg', 'webp']
+DATA_MODES = ['json', 'parquet']
+
+
+def output_mode(mode=None):
+    """
+    Return the requested output mode, from the argument or the PYQUANT_OUTPUT environment variable.
+    """
+    mode = (mode or os.environ.get('PYQUANT_OUTPUT') or 'show').lower()
+    if mode not in FIGURE_MODES + DATA_MODES:
+        raise ValueError(f'Unknown output mode {mode}, expected one of {", ".join(FIGURE_MODES + DATA_MODES)}')
+    return mode
+
+
+def render(build_figure, data, name, mode=None, directory=None):
+    """
+    Show or write a figure, or write only its data.
+    `build_figure` is only called when a figure is needed and `data` is a frame or a dict of series.
+    Returns the path of the written file, or None when the figure is shown.
+    """
+    mode = output_mode(mode)
+    directory = directory or os.environ.get('PYQUANT_OUTPUT_DIR') or '.'
+    path = os.path.join(directory, f"{name.replace('/', '_')}.{'html' if mode == 'html' else mode}")
+    if mode != 'show':
+        os.makedirs(directory, exist_ok=True)
+
+    # Write the numeric series without building the figure
+    if mode in DATA_MODES:
+        frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+        if mode == 'parquet':
+            frame.to_parquet(path)
+        else:
+            frame.to_json(path, orient='table', date_format='iso')
+        return path
+
+    fig = build_figure()
+    if mode == 'show':
+        fig.show()
+        return None
+    if mode == 'html':
+        fig.write_html(path, include_plotlyjs='cdn')
+    else:
+        fig.write_image(path)
+    return path
+
+
+def ratio_data(ratio, lower_bound, upper_bound):
+    """
+    Collect a rolling ratio, its bounds and its outlier flags into one frame.
+    """
+    lower_bound = pd.Series(lower_bound, index=ratio.index)
+    upper_bound = pd.Series(upper_bound, index=ratio.index)
+    return pd.DataFrame({
+        'value': ratio,
+        'lower_bound': lower_bound,
+        'upper_bound': upper_bound,
+        'outlier': (ratio < lower_bound) | (ratio > upper_bound),
+    })
+
+
+def build_ratio_figure(data, name, title, yaxis_title):
+    """
+    Plot a rolling ratio with its bounds, outliers and mean from `ratio_data` output.
+    """
+    import plotly.graph_objects as go
+
+    ratio = data['value']
+    fig = go.Figure()
+
+    # Add the rolling ratio
+    fig.add_trace(
+        go.Scatter(
+            x=ratio.index,
+            y=ratio,
+            name=name,
+            mode='lines'
+        )
+    )
+
+    # Add the lower bound
+    fig.add_trace(
+        go.Scatter(
+            x=data.index,
+            y=data['lower_bound'],
+            name='Lower Bound',
+            mode='lines',
+            line={"color": 'red', "dash": 'dash'}
+        )
+    )
+
+    # Add the upper bound
+    fig.add_trace(
+        go.Scatter(
+            x=data.index,
+            y=data['upper_bound'],
+            name='Upper Bound',
+            mode='lines',
+            line={"color": 'green', "dash": 'dash'}
+        )
+    )
+
+    # Add the outliers
+    outliers = ratio[data['outlier']]
+    fig.add_trace(
+        go.Scatter(
+            x=outliers.index,
+            y=outliers,
+            name='Outliers',
+            mode='markers',
+            marker={"color": 'red', "size": 8}
+        )
+    )
+
+    # Add the mean
+    mean = ratio.mean()
+    fig.add_trace(
+        go.Scatter(
+            x=ratio.index,
+            y=pd.Series(mean, index=ratio.index),
+            name='Mean',
+            mode='lines'
+        )
+    )
+
+    # Update the layout
+    fig.update_layout(
+        title=title,
+        xaxis_title='Date',
+        yaxis_title=yaxis_title,
+        showlegend=False
+    )
+    return fig
+
+
+def build_qq_figure(osm, osr, fit, title):
+    """
+    Plot the sample quantiles against the theoretical quantiles with the least-squares fit line.
+    """
+    import plotly.graph_objects as go
+
+    slope, intercept, r = fit
+
+    # Create a trace for the sample data
+    sample_trace = go.Scatter(
+        x=osm,
+        y=osr,
+        mode='markers',
+        name='Sample Data'
+    )
+
+    # Create a trace for the theoretical quantile-quantile line
+    line_trace = go.Scatter(
+        x=osm,
+        y=slope * osm + intercept,
+        mode='lines',
+        name=f'Fit Line (r={r:.2f})'
+    )
+
+    # Combine the traces into a figure
+    fig = go.Figure(data=[sample_trace, line_trace])
+
+    # Add titles and labels
+    fig.update_layout(
+        title=title,
+        xaxis_title='Theoretical Quantiles',
+        yaxis_title='Sample Quantiles',
+        showlegend=False
+    )
+    return fig
+
+
+def build_decomposition_figure(data, title):
+    """
+    Plot the original data, trend, seasonal and residual components with the residual bounds.
+    `data` is a frame with the 'original', 'trend', 'seasonal', 'residual', 'lower_bound' and
+    'upper_bound' columns.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    # Create a plot
+    fig = make_subplots(
+        rows=4, cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.1,
+        subplot_titles=('Original Data', 'Trend', 'Seasonal', 'Residual')
+    )
+
+    # Add the original data, trend, seasonal and residual components
+    components = [('original', 'Original Data'), ('trend', 'Trend'), ('seasonal', 'Seasonal'),
+                  ('residual', 'Residual')]
+    for row, (column, name) in enumerate(components, start=1):
+        fig.add_trace(
+            go.Scatter(
+                x=data.index,
+                y=data[column],
+                name=name),
+            row=row, col=1
+        )
+
+    # Add lower and upper bounds to the residual plot
+    fig.add_trace(
+        go.Scatter(
+            x=data.index,
+            y=data['lower_bound'],
+            name='Lower Bound',
+            line={"color": 'green', "dash": 'dash'}
+        ),
+        row=4, col=1
+    )
+
+    fig.add_trace(
+        go.Scatter(
+            x=data.index,
+            y=data['upper_bound'],
+            name='Upper Bound',
+            line={"color": 'red', "dash": 'dash'}
+        ),
+        row=4, col=1
+    )
+
+    # Update the layout
+    fig.update_layout(
+        title=title,
+        showlegend=False
+    )
+    return fig
@@ -0,0 +1,184 @@
+"""
+This script runs the normality, unit root and autocorrelation tests across a universe of stocks.
+Prices are fetched by a bounded thread pool while the CPU-bound tests run in chunks on a process
+pool, so fetching and testing overlap. A failing symbol is recorded and skipped instead of
+aborting the whole batch.
+
+Author: kangwijen
+
+Parameters: symbols on the command line or a file with one symbol per line
+Returns: None
+Example: python runner.py --file idx.txt --tasks normality unitroot --workers 32 --output tests.csv
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from analytics import (
+    fill_missing, log_returns, summary_statistics, normality_tests, unit_root_tests, ljung_box,
+    durbin_watson
+)
+from symbols import read_symbols
+from pricestore import PriceStore
+
+
+def normality_task(returns):
+    """
+    Run the normality tests and return the results as a flat dict.
+    """
+    result = summary_statistics(returns)
+    tests, anderson_result = normality_tests(returns)
+    for name, (statistic, p_value) in tests.items():
+        result[f'{name}_stat'] = statistic
+        result[f'{name}_pvalue'] = p_value
+    result['anderson_darling_stat'] = anderson_result.statistic
+    result['anderson_darling_pvalue'] = anderson_result.pvalue
+    result['anderson_darling_critical_5'] = anderson_result.critical_values[2]
+    return result
+
+
+def unitroot_task(returns):
+    """
+    Run the unit root tests and return the results as a flat dict.
+    """
+    result = {}
+    for name, (statistic, p_value) in unit_root_tests(returns).items():
+        result[f'{name}_stat'] = statistic
+        result[f'{name}_pvalue'] = p_value
+    return result
+
+
+def autocorrelation_task(returns, lags=10):
+    """
+    Run the Ljung-Box and Durbin-Watson tests and return the results as a flat dict.
+    """
+    ljung_box_result = ljung_box(returns, lags=lags)
+    return {
+        'ljung_box_stat': ljung_box_result['lb_stat'].iloc[-1],
+        'ljung_box_pvalue': ljung_box_result['lb_pvalue'].iloc[-1],
+        'ljung_box_min_pvalue': ljung_box_result['lb_pvalue'].min(),
+        'durbin_watson': durbin_watson(returns),
+    }
+
+
+# Tests that can be run across a universe
+TASKS = {
+    'normality': normality_task,
+    'unitroot': unitroot_task,
+    'autocorrelation': autocorrelation_task,
+}
+
+
+def run_chunk(task_names, items):
+    """
+    Run the tasks on a chunk of (symbol, returns) pairs in a worker process.
+    Returns (symbol, results, error) triples, with either the results or the error set.
+    """
+    outcomes = []
+    for symbol, returns in items:
+        try:
+            results = {}
+            for name in task_names:
+                results.update(TASKS[name](returns))
+            outcomes.append((symbol, results, None))
+        except Exception as error:
+            outcomes.append((symbol, None, f'{type(error).__name__}: {error}'))
+    return outcomes
+
+
+def fetch_returns(symbol, store):
+    """
+    Load the closes of a symbol and return its log returns.
+    """
+    data = fill_missing(store.update(symbol)['Close'])
+    return log_returns(data)
+
+
+def run_universe(symbols, task_names=('normality', 'unitroot', 'autocorrelation'), store=None,
+                 max_workers=None, fetch_workers=8, chunksize=16):
+    """
+    Run the tasks on every symbol with fetching and testing overlapped.
+    Returns a frame of results indexed by symbol and a dict of the symbols that failed with their error.
+    """
+    for name in task_names:
+        if name not in TASKS:
+            raise ValueError(f'Unknown task {name}, expected one of {", ".join(TASKS)}')
+    store = store or PriceStore()
+    rows = {}
+    errors = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as processes, \
+            ThreadPoolExecutor(max_workers=fetch_workers) as threads:
+        fetches = {threads.submit(fetch_returns, symbol, store): symbol for symbol in symbols}
+        chunks = []
+        chunk = []
+
+        # Submit a chunk of tests as soon as enough symbols have been fetched
+        for future in as_completed(fetches):
+            symbol = fetches[future]
+            try:
+                chunk.append((symbol, future.result()))
+            except Exception as error:
+                errors[symbol] = f'{type(error).__name__}: {error}'
+                continue
+            if len(chunk) == chunksize:
+                chunks.append(processes.submit(run_chunk, list(task_names), chunk))
+                chunk = []
+        if chunk:
+            chunks.append(processes.submit(run_chunk, list(task_names), chunk))
+
+        for future in as_completed(chunks):
+            for symbol, results, error in future.result():
+                if error is None:
+                    rows[symbol] = results
+                else:
+                    errors[symbol] = error
+
+    results = pd.DataFrame.from_dict(rows, orient='index')
+    results.index.name = 'symbol'
+    return results.reindex([symbol for symbol in symbols if symbol in rows]), errors
+
+
+def main(argv=None):
+    """
+    Parse the command line, run the tests and write the result table.
+    """
+    parser = argparse.ArgumentParser(description='Statistical tests across a universe of stocks.')
+    parser.add_argument('symbols', nargs='*', help='stock symbols')
+    parser.add_argument('--file', help='file with one symbol per line')
+    parser.add_argument('--tasks', nargs='+', choices=list(TASKS), default=list(TASKS),
+                        help='tests to run (default is all)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of test processes (default is the number of CPUs)')
+    parser.add_argument('--fetch-workers', type=int, default=8,
+                        help='number of concurrent downloads (default is 8)')
+    parser.add_argument('--chunksize', type=int, default=16,
+                        help='symbols per process task (default is 16)')
+    parser.add_argument('--output', help='output .csv or .parquet file (default is stdout)')
+    args = parser.parse_args(argv)
+
+    symbols = read_symbols(args.symbols, args.file)
+    if not symbols:
+        parser.error('no symbols given')
+
+    results, errors = run_universe(
+        symbols, args.tasks, max_workers=args.workers, fetch_workers=args.fetch_workers,
+        chunksize=args.chunksize
+    )
+    for symbol, error in errors.items():
+        print(f'Skipped {symbol}: {error}', file=sys.stderr)
+
+    if args.output is None:
+        results.to_csv(sys.stdout)
+    elif args.output.endswith('.parquet'):
+        results.to_parquet(args.output)
+    else:
+        results.to_csv(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,126 +9,59 @@ Returns: None
 Example: python sharpe.py
 """
 
-import yfinance as yf
-import numpy as np
-import pandas as pd
-import plotly.graph_objects as go
+from analytics import fill_missing, log_returns, risk_adjust, rolling_sharpe, iqr_bounds
+from pricestore import get_prices
+from report import render, ratio_data, build_ratio_figure
 
-# Define the stock symbol
-STOCK = input("Enter the stock symbol: ")
 
-# Define the period (in days)
-PERIOD = input("Enter the period (in days) (default is 252): ") or 252
+def main():
+    """
+    Ask for the inputs, calculate the rolling Sharpe ratio and plot it.
+    """
+    # Define the stock symbol
+    STOCK = input("Enter the stock symbol: ")
 
-# Define the window size (in days)
-WINDOW = input("Enter the window size (in days) (default is 21): ") or 21
+    # Define the period (in days)
+    PERIOD = input("Enter the period (in days) (default is 252): ") or 252
 
-# Define the risk-free rate
-RISK_FREE_RATE = input("Enter the risk-free rate (default is 0.05): ") or 0.05
+    # Define the window size (in days)
+    WINDOW = input("Enter the window size (in days) (default is 21): ") or 21
 
-# Convert inputs to uppercase and integers
-STOCK = str(STOCK).upper()
-PERIOD = int(PERIOD)
-WINDOW = int(WINDOW)
-RISK_FREE_RATE = float(RISK_FREE_RATE)
+    # Define the risk-free rate
+    RISK_FREE_RATE = input("Enter the risk-free rate (default is 0.05): ") or 0.05
 
-# Download the stock data
-data = yf.download(STOCK, progress=False)
+    # Convert inputs to uppercase and integers
+    STOCK = str(STOCK).upper()
+    PERIOD = int(PERIOD)
+    WINDOW = int(WINDOW)
+    RISK_FREE_RATE = float(RISK_FREE_RATE)
 
-# Use the 'Close' price and fill missing values
-data = data['Close'].ffill().bfill()
+    # Load the stock data from the local price store
+    data = get_prices(STOCK)
 
-# Calculate the log returns
-log_returns = np.log(data / data.shift(1)).dropna()
+    # Use the 'Close' price and fill missing values
+    data = fill_missing(data['Close'])
 
-# Calculate the risk-adjusted returns
-log_returns = log_returns - RISK_FREE_RATE / PERIOD
+    # Calculate the risk-adjusted log returns
+    returns = risk_adjust(log_returns(data), RISK_FREE_RATE, PERIOD)
 
-# Calculate the rolling Sharpe ratio
-rolling_sharpe = log_returns.rolling(WINDOW).mean() / log_returns.rolling(WINDOW).std()
+    # Calculate the rolling Sharpe ratio and fill missing values
+    rolling_sharpe_ratio = fill_missing(rolling_sharpe(returns, WINDOW))
 
-# Fill missing values
-rolling_sharpe = rolling_sharpe.ffill().bfill()
+    # Calculate the lower and upper bounds
+    lower_bound, upper_bound = iqr_bounds(rolling_sharpe_ratio)
 
-# Calculate the Q1 and Q3 quantiles
-q1 = rolling_sharpe.quantile(0.25)
-q3 = rolling_sharpe.quantile(0.75)
+    # Collect the rolling Sharpe ratio, its bounds and its outliers
+    results = ratio_data(rolling_sharpe_ratio, lower_bound, upper_bound)
 
-# Calculate the IQR
-iqr = q3 - q1
-
-# Calculate the lower and upper bounds
-lower_bound = q1 - 1.5 * iqr
-upper_bound = q3 + 1.5 * iqr
+    # Plot the rolling Sharpe ratio, or write it out for batch jobs
+    render(
+        lambda: build_ratio_figure(
+            results, 'Rolling Sharpe Ratio', f'Rolling Sharpe Ratio for {STOCK}', 'Sharpe Ratio'
+        ),
+        results, f'sharpe_{STOCK}'
+    )
 
-# Plot the rolling Sharpe ratio
-fig = go.Figure()
 
-# Add the rolling Sharpe ratio
-fig.add_trace(
-    go.Scatter(
-        x=rolling_sharpe.index,
-        y=rolling_sharpe,
-        name='Rolling Sharpe Ratio',
-        mode='lines'
-    )
-)
-
-# Add the lower bound
-lower_bound = pd.Series(lower_bound, index=rolling_sharpe.index)
-upper_bound = pd.Series(upper_bound, index=rolling_sharpe.index)
-
-fig.add_trace(
-    go.Scatter(
-        x=lower_bound.index,
-        y=lower_bound,
-        name='Lower Bound',
-        mode='lines',
-        line={"color": 'red', "dash": 'dash'}
-    )
-)
-
-# Add the upper bound
-fig.add_trace(
-    go.Scatter(
-        x=upper_bound.index,
-        y=upper_bound,
-        name='Upper Bound',
-        mode='lines',
-        line={"color": 'green', "dash": 'dash'}
-    )
-)
-
-# Add the outliers
-outliers = rolling_sharpe[(rolling_sharpe < lower_bound) | (rolling_sharpe > upper_bound)]
-fig.add_trace(
-    go.Scatter(
-        x=outliers.index,
-        y=outliers,
-        name='Outliers',
-        mode='markers',
-        marker={"color": 'red', "size": 8}
-    )
-)
-
-# Add the mean
-mean = rolling_sharpe.mean()
-fig.add_trace(
-    go.Scatter(
-        x=rolling_sharpe.index,
-        y=pd.Series(mean, index=rolling_sharpe.index),
-        name='Mean',
-        mode='lines'
-    )
-)
-
-# Update the layout
-fig.update_layout(
-    title=f'Rolling Sharpe Ratio for {STOCK}',
-    xaxis_title='Date',
-    yaxis_title='Sharpe Ratio',
-    showlegend=False
-)
-
-# Show the plot
-fig.show()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+"""
+This module detects outliers on a live feed with approximate quantiles instead of full sorts.
+The KLL sketch keeps a few hundred weighted samples of everything it has seen, adds an observation
+in amortized O(1) and merges with other sketches, so bounds can be combined across tickers or
+shards. A quantile query sorts the k or so retained samples, O(k log k), so the outlier detector
+caches the quartiles and only queries the sketch again once enough observations arrived to move
+them by a rank error comparable to the sketch's own, or a rolling window dropped a block. Rolling
+windows the sketch would keep whole anyway, of up to 2 k observations, use an exact sorted window.
+
+Author: kangwijen
+
+Example:
+    detector = OutlierDetector(window=252)
+    for sharpe in feed:
+        lower_bound, upper_bound, outlier = detector.update(sharpe)
+"""
+
+import math
+import random
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from itertools import accumulate
+
+NAN = float('nan')
+
+
+def weighted_quantiles(weighted, probabilities):
+    """
+    Return the quantiles of sorted (value, weight) samples, NaN when there are none.
+    """
+    if not weighted:
+        return [NAN for _ in probabilities]
+    cumulative = list(accumulate(weight for _, weight in weighted))
+    return [
+        weighted[min(bisect_left(cumulative, probability * cumulative[-1]), len(weighted) - 1)][0]
+        for probability in probabilities
+    ]
+
+
+def summary(weighted):
+    """
+    Split sorted (value, weight) samples into their values and cumulative weights.
+    """
+    return [value for value, _ in weighted], list(accumulate(weight for _, weight in weighted))
+
+
+def merged_quantiles(summaries, probabilities):
+    """
+    Return the quantiles of several sorted summaries from `summary()`, as `weighted_quantiles` of
+    their merged samples, by binary searches instead of merging them.
+    """
+    total = sum(cumulative[-1] for _, cumulative in summaries if cumulative)
+    if not total:
+        return [NAN for _ in probabilities]
+
+    def rank(value):
+        # Total weight of the samples up to and including the value
+        return sum(
+            cumulative[position - 1]
+            for values, cumulative in summaries
+            for position in [bisect_right(values, value)] if position
+        )
+
+    quantiles = []
+    for probability in probabilities:
+        target = probability * total
+        best = None
+        for values, _ in summaries:
+            # Smallest value of this summary whose rank reaches the target
+            low, high = 0, len(values)
+            while low < high:
+                middle = (low + high) // 2
+                if rank(values[middle]) >= target:
+                    high = middle
+                else:
+                    low = middle + 1
+            if low < len(values) and (best is None or values[low] < best):
+                best = values[low]
+        quantiles.append(best)
+    return quantiles
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang and Liberty, 2016).
+    Level h holds samples that each stand for 2^h observations. A full level is sorted and every
+    other sample, from a random offset, is promoted to the next level. The rank error is about
+    1.7 / k of the count with high probability.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.levels = [[]]
+        self.count = 0
+        self.size = 0
+        self.random = random.Random(seed)
+
+    def capacity(self, level):
+        """
+        Return the number of samples a level may hold, which shrinks by 2/3 per level below the top.
+        """
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2.0 / 3.0) ** depth)), 2)
+
+    def update(self, value):
+        """
+        Add an observation, NaN are ignored.
+        """
+        if value != value:
+            return
+        self.levels[0].append(value)
+        self.count += 1
+        self.size += 1
+        self._compress()
+
+    def _compress(self):
+        """
+        Compact the lowest full level, as long as the sketch holds more samples than its capacity.
+        """
+        while self.size >= sum(self.capacity(level) for level in range(len(self.levels))):
+            for level, samples in enumerate(self.levels):
+                if len(samples) >= self.capacity(level):
+                    if level + 1 == len(self.levels):
+                        self.levels.append([])
+                    samples.sort()
+                    # Keep the odd one out at this level and promote every other sample
+                    kept = [samples.pop()] if len(samples) % 2 else []
+                    promoted = samples[self.random.randint(0, 1)::2]
+                    self.levels[level + 1].extend(promoted)
+                    self.levels[level] = kept
+                    self.size -= len(samples) - len(promoted)
+                    break
+
+    def merge(self, other):
+        """
+        Add the observations of another sketch to this one.
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, samples in enumerate(other.levels):
+            self.levels[level].extend(samples)
+        self.count += other.count
+        self.size += other.size
+        self._compress()
+        return self
+
+    def weighted(self):
+        """
+        Return the samples as sorted (value, weight) pairs.
+        """
+        return sorted(
+            (value, 1 << level) for level, samples in enumerate(self.levels) for value in samples
+        )
+
+    def quantiles(self, probabilities):
+        """
+        Return the approximate quantiles of the observations, NaN for an empty sketch.
+        """
+        return weighted_quantiles(self.weighted(), probabilities)
+
+    def quantile(self, probability):
+        """
+        Return the approximate quantile of the observations.
+        """
+        return self.quantiles([probability])[0]
+
+    def to_dict(self):
+        """
+        Return the state as a JSON-serializable dict.
+        """
+        return {'k': self.k, 'levels': [list(samples) for samples in self.levels], 'count': self.count}
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restore a sketch from `to_dict()` output.
+        """
+        sketch = cls(state['k'])
+        sketch.levels = [list(samples) for samples in state['levels']]
+        sketch.count = state['count']
+        sketch.size = sum(len(samples) for samples in sketch.levels)
+        return sketch
+
+
+class RollingSketch:
+    """
+    Approximate quantiles over roughly the last `window` observations.
+    The window is split into `blocks` sketches; the oldest block is dropped once the newer ones
+    cover the window, so a quantile covers between `window` and `window + window / blocks`
+    observations.
+    """
+
+    def __init__(self, window, k=200, blocks=8, seed=None):
+        self.window = window
+        self.k = k
+        self.block_size = max(int(math.ceil(window / blocks)), 1)
+        self.random = random.Random(seed)
+        self.blocks = deque()
+        self.current = KLLSketch(k, self.random.random())
+        self.merged = None
+        self.rotations = 0
+
+    @property
+    def count(self):
+        """
+        Number of observations covered by the sketch.
+        """
+        return sum(block.count for block in self.blocks) + self.current.count
+
+    def update(self, value):
+        """
+        Add an observation, NaN are ignored.
+        """
+        self.current.update(value)
+        if self.current.count < self.block_size:
+            return
+        self.blocks.append(self.current)
+        self.current = KLLSketch(self.k, self.random.random())
+        while self.blocks and sum(block.count for block in self.blocks) - self.blocks[0].count >= self.window:
+            self.blocks.popleft()
+        self.merged = None
+        self.rotations += 1
+
+    def quantiles(self, probabilities):
+        """
+        Return the approximate quantiles of the observations in the window.
+        """
+        # Sort the samples of the complete blocks once per block rotation and search them together
+        # with the current block's on every query
+        if self.merged is None:
+            self.merged = summary(sorted(sample for block in self.blocks for sample in block.weighted()))
+        return merged_quantiles([self.merged, summary(self.current.weighted())], probabilities)
+
+
+class SortedWindow:
+    """
+    Exact quantiles of the last `window` observations from a sorted copy of the window.
+    An update is a binary search and a list insertion and removal, which beats a sketch for windows
+    small enough that the sketch would keep every sample anyway. The quantiles interpolate
+    linearly, like `pandas.Series.rolling().quantile`.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.sorted = []
+
+    @property
+    def count(self):
+        """
+        Number of observations in the window, NaN excluded.
+        """
+        return len(self.sorted)
+
+    def update(self, value):
+        """
+        Add an observation and drop the oldest one once the window is full. NaN take a place in the
+        window but not in the quantiles.
+        """
+        self.values.append(value)
+        if value == value:
+            insort(self.sorted, value)
+        if len(self.values) > self.window:
+            oldest = self.values.popleft()
+            if oldest == oldest:
+                del self.sorted[bisect_left(self.sorted, oldest)]
+
+    def quantiles(self, probabilities):
+        """
+        Return the quantiles of the observations in the window, NaN for an empty one.
+        """
+        if not self.sorted:
+            return [NAN for _ in probabilities]
+        quantiles = []
+        for probability in probabilities:
+            position = probability * (len(self.sorted) - 1)
+            lower = int(position)
+            upper = min(lower + 1, len(self.sorted) - 1)
+            quantiles.append(self.sorted[lower] + (self.sorted[upper] - self.sorted[lower]) * (position - lower))
+        return quantiles
+
+
+class OutlierDetector:
+    """
+    IQR outlier detector over the whole history, or a rolling window of about `window`
+    observations, backed by KLL sketches.
+    The quartiles are cached and queried again after `count / (2 k)` new observations, which moves
+    them by less than the sketch's rank error of about 1.7 count / k, and after every block
+    rotation of a rolling window. A query costs O(k log k), so an update of a whole-history
+    detector costs O(k^2 log k / count) amortized, falling as the history grows. Rolling windows
+    of up to 2 k observations use an exact `SortedWindow` instead, queried on every observation at
+    the cost of a sorted insertion.
+    """
+
+    def __init__(self, scale=1.5, window=None, k=200, blocks=8, seed=None):
+        self.scale = scale
+        self.window = window
+        self.k = k
+        if window is None:
+            self.sketch = KLLSketch(k, seed)
+        elif window <= 2 * k:
+            self.sketch = SortedWindow(window)
+        else:
+            self.sketch = RollingSketch(window, k, blocks, seed)
+        self.cached = None
+        self.pending = 0
+        self.rotations = 0
+
+    def bounds(self):
+        """
+        Return the current lower and upper bounds from the sketch.
+        """
+        q1, q3 = self.sketch.quantiles([0.25, 0.75])
+        iqr = q3 - q1
+        return q1 - self.scale * iqr, q3 + self.scale * iqr
+
+    def update(self, value):
+        """
+        Add an observation and return the bounds and whether the observation falls outside them.
+        """
+        self.sketch.update(value)
+        self.pending += 1
+        rotations = getattr(self.sketch, 'rotations', 0)
+        if self.cached is None or rotations != self.rotations or self.pending >= self.sketch.count / (2 * self.k):
+            self.cached = self.bounds()
+            self.pending = 0
+            self.rotations = rotations
+        lower_bound, upper_bound = self.cached
+        return lower_bound, upper_bound, value < lower_bound or value > upper_bound
+
+    def merge(self, other):
+        """
+        Combine the whole-history detector of another ticker or shard into this one.
+        """
+        if self.window is not None or other.window is not None:
+            raise ValueError('Only whole-history detectors can be merged')
+        self.sketch.merge(other.sketch)
+        self.cached = None
+        return self
+
+    def to_dict(self):
+        """
+        Return the state of a whole-history detector as a JSON-serializable dict.
+        """
+        if self.window is not None:
+            raise ValueError('Only whole-history detectors can be saved')
+        return {'scale': self.scale, 'sketch': self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restore a detector from `to_dict()` output.
+        """
+        detector = cls(state['scale'], k=state['sketch']['k'])
+        detector.sketch = KLLSketch.from_dict(state['sketch'])
+        return detector
@@ -0,0 +1,87 @@
+"""
+This script measures the import time of every script with `python -X importtime`.
+It fails when a script imports a heavy dependency at startup that should only be loaded on the
+path that needs it, or when an import takes longer than the budget, so startup regressions are
+caught before they reach the schedulers.
+
+Author: kangwijen
+
+Parameters: None
+Returns: exit code 1 when a script is over budget or imports a deferred dependency
+Example: python startup_bench.py --budget-ms 1500 --repeat 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+from prettytable import PrettyTable
+from colorama import Fore
+
+# Scripts whose startup is measured
+SCRIPTS = [
+    'sharpe', 'sortino', 'treynor', 'alpha', 'normality', 'unitroot', 'autocorrelation',
+    'decomposition', 'batch', 'sweep', 'runner', 'pyquant', 'benchmark', 'portfolio', 'universe', 'chunked',
+    'frequency', 'async_provider',
+]
+
+# Dependencies that must only be imported on the code path that uses them
+DEFERRED = ['plotly', 'scipy', 'statsmodels', 'arch', 'yfinance']
+
+
+def measure_import(module, directory):
+    """
+    Import a module in a fresh interpreter and return its cumulative import time in
+    milliseconds and the set of top-level packages it imported.
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=directory, capture_output=True, text=True, check=True
+    )
+    total = 0.0
+    packages = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        packages.add(name.strip().split('.')[0])
+        if name.strip() == module:
+            total = int(cumulative) / 1000
+    return total, packages
+
+
+def main(argv=None):
+    """
+    Measure every script and print a table of import times.
+    """
+    parser = argparse.ArgumentParser(description='Startup time of the scripts.')
+    parser.add_argument('--budget-ms', type=float, default=1500,
+                        help='maximum import time per script in milliseconds (default is 1500)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per script, the fastest one is kept (default is 3)')
+    args = parser.parse_args(argv)
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    table = PrettyTable()
+    table.field_names = ['Script', 'Import Time (ms)', 'Deferred Imports', 'Status']
+    failed = False
+    for module in SCRIPTS:
+        runs = [measure_import(module, directory) for _ in range(args.repeat)]
+        total = min(run[0] for run in runs)
+        loaded = sorted(set(DEFERRED) & set.union(*(run[1] for run in runs)))
+        ok = total <= args.budget_ms and not loaded
+        failed = failed or not ok
+        table.add_row([
+            module,
+            f'{total:.1f}',
+            ', '.join(loaded) or '-',
+            Fore.GREEN + 'OK' + Fore.RESET if ok else Fore.RED + 'FAIL' + Fore.RESET
+        ])
+
+    print(table)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,387 @@
+"""
+This module holds incremental estimators for the rolling ratios.
+Each estimator keeps a ring buffer of the current window and updates its running moments
+in O(1) per new observation, so a live feed can push one bar at a time instead of
+recomputing the rolling series over the full history. The state of every estimator can be
+saved with `to_dict()` and restored with `from_dict()`.
+
+Author: kangwijen
+
+Example:
+    ratios = StreamingRatios(window=21)
+    for close, benchmark_close in feed:
+        values = ratios.update(close, benchmark_close)
+        print(values['sharpe'], values['beta'], values['alpha'])
+    state = json.dumps(ratios.to_dict())
+"""
+
+import math
+from collections import deque
+
+NAN = float('nan')
+
+
+class RollingMoments:
+    """
+    Running mean and sample variance over the last `window` observations.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value):
+        """
+        Add an observation and drop the oldest one once the window is full.
+        """
+        if len(self.values) == self.window:
+            old = self.values[0]
+            count = len(self.values) - 1
+            if count == 0:
+                self.mean, self.m2 = 0.0, 0.0
+            else:
+                delta = old - self.mean
+                self.mean -= delta / count
+                self.m2 -= delta * (old - self.mean)
+        self.values.append(value)
+        count = len(self.values)
+        delta = value - self.mean
+        self.mean += delta / count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def ready(self):
+        """
+        Whether the window is full.
+        """
+        return len(self.values) == self.window
+
+    @property
+    def variance(self):
+        """
+        Sample variance of the window.
+        """
+        count = len(self.values)
+        return max(self.m2, 0.0) / (count - 1) if count > 1 else NAN
+
+    @property
+    def std(self):
+        """
+        Sample standard deviation of the window.
+        """
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        """
+        Return the state as a JSON-serializable dict.
+        """
+        return {'window': self.window, 'values': list(self.values), 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restore an estimator from `to_dict()` output.
+        """
+        estimator = cls(state['window'])
+        estimator.values.extend(state['values'])
+        estimator.mean = state['mean']
+        estimator.m2 = state['m2']
+        return estimator
+
+
+class RollingCovariance:
+    """
+    Running sample covariance of two series and variance of the second one over the last `window` pairs.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.pairs = deque(maxlen=window)
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.c_xy = 0.0
+        self.m2_y = 0.0
+
+    def update(self, x, y):
+        """
+        Add a pair and drop the oldest one once the window is full.
+        """
+        if len(self.pairs) == self.window:
+            old_x, old_y = self.pairs[0]
+            count = len(self.pairs) - 1
+            if count == 0:
+                self.mean_x = self.mean_y = self.c_xy = self.m2_y = 0.0
+            else:
+                delta_y = old_y - self.mean_y
+                self.mean_x -= (old_x - self.mean_x) / count
+                self.mean_y -= delta_y / count
+                self.c_xy -= (old_x - self.mean_x) * delta_y
+                self.m2_y -= (old_y - self.mean_y) * delta_y
+        self.pairs.append((x, y))
+        count = len(self.pairs)
+        delta_x = x - self.mean_x
+        delta_y = y - self.mean_y
+        self.mean_x += delta_x / count
+        self.mean_y += delta_y / count
+        self.c_xy += delta_x * (y - self.mean_y)
+        self.m2_y += delta_y * (y - self.mean_y)
+
+    @property
+    def ready(self):
+        """
+        Whether the window is full.
+        """
+        return len(self.pairs) == self.window
+
+    @property
+    def covariance(self):
+        """
+        Sample covariance of the window.
+        """
+        count = len(self.pairs)
+        return self.c_xy / (count - 1) if count > 1 else NAN
+
+    @property
+    def variance_y(self):
+        """
+        Sample variance of the second series over the window.
+        """
+        count = len(self.pairs)
+        return max(self.m2_y, 0.0) / (count - 1) if count > 1 else NAN
+
+    @property
+    def beta(self):
+        """
+        Covariance divided by the variance of the second series.
+        """
+        variance = self.variance_y
+        return self.covariance / variance if variance > 0 else NAN
+
+    def to_dict(self):
+        """
+        Return the state as a JSON-serializable dict.
+        """
+        return {
+            'window': self.window, 'pairs': [list(pair) for pair in self.pairs],
+            'mean_x': self.mean_x, 'mean_y': self.mean_y, 'c_xy': self.c_xy, 'm2_y': self.m2_y,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restore an estimator from `to_dict()` output.
+        """
+        estimator = cls(state['window'])
+        estimator.pairs.extend(tuple(pair) for pair in state['pairs'])
+        estimator.mean_x = state['mean_x']
+        estimator.mean_y = state['mean_y']
+        estimator.c_xy = state['c_xy']
+        estimator.m2_y = state['m2_y']
+        return estimator
+
+
+class RollingDownside:
+    """
+    Running downside deviation over the last `window` observations.
+    The downside deviation is the root mean square of the shortfalls below the minimum acceptable return.
+    """
+
+    def __init__(self, window, minimum_acceptable_return=0.0):
+        self.window = window
+        self.minimum_acceptable_return = minimum_acceptable_return
+        self.squares = deque(maxlen=window)
+        self.total = 0.0
+        self.shortfalls = 0
+
+    def update(self, value):
+        """
+        Add an observation and drop the oldest one once the window is full.
+        """
+        if len(self.squares) == self.window:
+            self.total -= self.squares[0]
+            self.shortfalls -= self.squares[0] > 0
+        shortfall = min(value - self.minimum_acceptable_return, 0.0)
+        self.squares.append(shortfall * shortfall)
+        self.total += shortfall * shortfall
+        self.shortfalls += shortfall < 0
+
+    @property
+    def ready(self):
+        """
+        Whether the window is full.
+        """
+        return len(self.squares) == self.window
+
+    @property
+    def deviation(self):
+        """
+        Downside deviation of the window.
+        """
+        count = len(self.squares)
+        if not count:
+            return NAN
+        # Reset the rounding error left by removals once the window has no shortfall
+        if not self.shortfalls:
+            self.total = 0.0
+        return math.sqrt(max(self.total, 0.0) / count)
+
+    def to_dict(self):
+        """
+        Return the state as a JSON-serializable dict.
+        """
+        return {
+            'window': self.window, 'minimum_acceptable_return': self.minimum_acceptable_return,
+            'squares': list(self.squares), 'total': self.total, 'shortfalls': self.shortfalls,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restore an estimator from `to_dict()` output.
+        """
+        estimator = cls(state['window'], state['minimum_acceptable_return'])
+        estimator.squares.extend(state['squares'])
+        estimator.total = state['total']
+        estimator.shortfalls = state['shortfalls']
+        return estimator
+
+
+class StreamingRatios:
+    """
+    Rolling Sharpe, Sortino, beta, Treynor and smoothed Alpha of a stock updated one bar at a time.
+    Values are forward filled like the batch pipeline and stay NaN until the first full window.
+    """
+
+    def __init__(self, window=21, risk_free_rate=0.05, period=252, minimum_acceptable_return=0.0):
+        self.window = window
+        self.risk_free_rate = risk_free_rate
+        self.period = period
+        self.returns = RollingMoments(window)
+        self.downside = RollingDownside(window, minimum_acceptable_return)
+        self.covariance = RollingCovariance(window)
+        self.benchmark = RollingMoments(window)
+        self.last_close = None
+        self.last_benchmark_close = None
+        self.last_values = {}
+        self.last_raw_values = {}
+        self.alpha_weight = 1.0 - 2.0 / (window + 1.0)
+        self.alpha_numerator = 0.0
+        self.alpha_denominator = 0.0
+        self.pending_alphas = 0
+
+    def update(self, close, benchmark_close):
+        """
+        Push the next close of the stock and of the benchmark.
+        Returns a dict with the current 'sharpe', 'sortino', 'beta', 'treynor' and 'alpha'.
+        """
+        last_close, self.last_close = self.last_close, close
+        last_benchmark_close, self.last_benchmark_close = self.last_benchmark_close, benchmark_close
+        if last_close is None or last_benchmark_close is None:
+            return self.values()
+        return self.update_returns(
+            math.log(close / last_close), math.log(benchmark_close / last_benchmark_close)
+        )
+
+    def update_returns(self, log_return, benchmark_log_return):
+        """
+        Push the next log return of the stock and of the benchmark.
+        Returns a dict with the current 'sharpe', 'sortino', 'beta', 'treynor' and 'alpha'.
+        """
+        daily_risk_free_rate = self.risk_free_rate / self.period
+        risk_adjusted_return = log_return - daily_risk_free_rate
+
+        # Update the running moments
+        self.returns.update(risk_adjusted_return)
+        self.downside.update(risk_adjusted_return)
+        self.covariance.update(risk_adjusted_return, benchmark_log_return)
+        self.benchmark.update(benchmark_log_return)
+        if not self.returns.ready:
+            self.pending_alphas += 1
+            return self.values()
+
+        mean = self.returns.mean
+        beta = self.covariance.beta
+        expected_return = daily_risk_free_rate + beta * (self.benchmark.mean - daily_risk_free_rate)
+        values = {
+            'sharpe': _divide(mean, self.returns.std),
+            'sortino': _divide(
+                mean - self.downside.minimum_acceptable_return, self.downside.deviation
+            ),
+            'beta': beta,
+            'treynor': _divide(mean, beta),
+            'alpha': risk_adjusted_return - expected_return,
+        }
+        for name, value in values.items():
+            if math.isnan(value):
+                values[name] = self.last_raw_values.get(name, NAN)
+        self.last_raw_values = dict(values)
+        values['alpha'] = self._smooth_alpha(values['alpha'])
+        self.last_values = values
+        return self.values()
+
+    def _smooth_alpha(self, alpha):
+        """
+        Exponentially smooth the Alpha with span `window`, matching `ewm(span=window).mean()`.
+        """
+        if math.isnan(alpha):
+            self.pending_alphas += 1
+            return NAN
+        # The batch pipeline backfills the first Alpha over the bars before it
+        for _ in range(self.pending_alphas):
+            self.alpha_numerator = alpha + self.alpha_weight * self.alpha_numerator
+            self.alpha_denominator = 1.0 + self.alpha_weight * self.alpha_denominator
+        self.pending_alphas = 0
+        self.alpha_numerator = alpha + self.alpha_weight * self.alpha_numerator
+        self.alpha_denominator = 1.0 + self.alpha_weight * self.alpha_denominator
+        return self.alpha_numerator / self.alpha_denominator
+
+    def values(self):
+        """
+        Return the current ratios, NaN before the first full window.
+        """
+        names = ['sharpe', 'sortino', 'beta', 'treynor', 'alpha']
+        return {name: self.last_values.get(name, NAN) for name in names}
+
+    def to_dict(self):
+        """
+        Return the state as a JSON-serializable dict.
+        """
+        return {
+            'window': self.window, 'risk_free_rate': self.risk_free_rate, 'period': self.period,
+            'returns': self.returns.to_dict(), 'downside': self.downside.to_dict(),
+            'covariance': self.covariance.to_dict(), 'benchmark': self.benchmark.to_dict(),
+            'last_close': self.last_close, 'last_benchmark_close': self.last_benchmark_close,
+            'last_values': self.last_values, 'last_raw_values': self.last_raw_values,
+            'alpha_numerator': self.alpha_numerator,
+            'alpha_denominator': self.alpha_denominator, 'pending_alphas': self.pending_alphas,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Restore the ratios from `to_dict()` output.
+        """
+        ratios = cls(state['window'], state['risk_free_rate'], state['period'])
+        ratios.returns = RollingMoments.from_dict(state['returns'])
+        ratios.downside = RollingDownside.from_dict(state['downside'])
+        ratios.covariance = RollingCovariance.from_dict(state['covariance'])
+        ratios.benchmark = RollingMoments.from_dict(state['benchmark'])
+        ratios.last_close = state['last_close']
+        ratios.last_benchmark_close = state['last_benchmark_close']
+        ratios.last_values = dict(state['last_values'])
+        ratios.last_raw_values = dict(state['last_raw_values'])
+        ratios.alpha_numerator = state['alpha_numerator']
+        ratios.alpha_denominator = state['alpha_denominator']
+        ratios.pending_alphas = state['pending_alphas']
+        return ratios
+
+
+def _divide(numerator, denominator):
+    """
+    Divide, returning NaN instead of raising on a zero or NaN denominator.
+    """
+    if denominator == 0 or math.isnan(denominator):
+        return NAN
+    return numerator / denominator
@@ -0,0 +1,119 @@
+"""
+This script sweeps the rolling Sharpe ratio of a stock over several window sizes and risk-free rates.
+The prefix sums of the log returns and of the squared log returns are computed once and every
+window's rolling mean and standard deviation is derived from them in O(n).
+
+Author: kangwijen
+
+Parameters: the stock symbol, the window sizes and optionally the risk-free rates
+Returns: None
+Example: python sweep.py BBCA.JK --windows 21 63 126 252 --risk-free-rates 0.05 0.06
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analytics import fill_missing, log_returns, cumulative_sums, window_sums
+from pricestore import get_prices
+
+
+def rolling_moments_sweep(returns, windows):
+    """
+    Calculate the rolling mean and sample standard deviation of a return series for many windows.
+    Returns two (dates x window) frames.
+    """
+    values = np.asarray(returns, dtype='float64')
+
+    # Center the returns so the squared prefix sums keep their precision
+    center = np.nanmean(values)
+    centered = values - center
+
+    # Calculate the prefix sums once for every window
+    cumulative, missing_count = cumulative_sums(np.column_stack([centered, centered ** 2]))
+
+    means = {}
+    stds = {}
+    for window in windows:
+        sums = window_sums(cumulative, missing_count, window)
+        mean = sums[:, 0] / window
+        variance = (sums[:, 1] - window * mean ** 2) / (window - 1)
+        means[window] = mean + center
+        stds[window] = np.sqrt(np.maximum(variance, 0.0))
+
+    index = getattr(returns, 'index', None)
+    means = pd.DataFrame(means, index=index)
+    stds = pd.DataFrame(stds, index=index)
+    means.columns.name = stds.columns.name = 'window'
+    return means, stds
+
+
+def sharpe_sweep(returns, windows, risk_free_rates=None, period=252):
+    """
+    Calculate the rolling Sharpe ratio of log returns for every window and risk-free rate.
+    Returns a dict with one frame per metric ('mean', 'std' and 'sharpe'). The columns are the
+    windows, or (risk_free_rate, window) pairs when risk-free rates are given.
+    """
+    means, stds = rolling_moments_sweep(returns, windows)
+    if risk_free_rates is None:
+        return {'mean': means, 'std': stds, 'sharpe': means / stds.where(stds > 0)}
+
+    # The risk-free rate only shifts the mean, the standard deviation is shared
+    adjusted_means = pd.concat(
+        {rate: means - rate / period for rate in risk_free_rates}, axis=1, names=['risk_free_rate']
+    )
+    repeated_stds = pd.concat(
+        {rate: stds for rate in risk_free_rates}, axis=1, names=['risk_free_rate']
+    )
+    return {
+        'mean': adjusted_means,
+        'std': repeated_stds,
+        'sharpe': adjusted_means / repeated_stds.where(repeated_stds > 0),
+    }
+
+
+def tidy_sweep(metrics):
+    """
+    Stack the sweep frames into one table with one row per date and parameter set.
+    Dates before a window is full are left out.
+    """
+    stacked = {
+        metric: frame.stack(list(range(frame.columns.nlevels)))
+        for metric, frame in metrics.items()
+    }
+    table = pd.DataFrame(stacked).dropna(subset=['mean'])
+    table.index = table.index.set_names('date', level=0)
+    return table.reset_index()
+
+
+def main(argv=None):
+    """
+    Parse the command line, run the sweep and write the result table.
+    """
+    parser = argparse.ArgumentParser(description='Rolling Sharpe ratio over several windows.')
+    parser.add_argument('symbol', help='stock symbol')
+    parser.add_argument('--windows', type=int, nargs='+', default=[21, 63, 126, 252],
+                        help='window sizes in days (default is 21 63 126 252)')
+    parser.add_argument('--risk-free-rates', type=float, nargs='+', default=[0.05],
+                        help='risk-free rates (default is 0.05)')
+    parser.add_argument('--period', type=int, default=252, help='period in days (default is 252)')
+    parser.add_argument('--output', help='output .csv or .parquet file (default is stdout)')
+    args = parser.parse_args(argv)
+
+    # Load the stock data and calculate the log returns
+    data = fill_missing(get_prices(args.symbol.upper())['Close'])
+    metrics = sharpe_sweep(log_returns(data), args.windows, args.risk_free_rates, args.period)
+    table = tidy_sweep(metrics)
+
+    if args.output is None:
+        table.to_csv(sys.stdout, index=False)
+    elif args.output.endswith('.parquet'):
+        table.to_parquet(args.output, index=False)
+    else:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
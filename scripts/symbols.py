@@ -0,0 +1,22 @@
+"""
+This module reads the symbol lists the command-line scripts take, from the command line and/or a
+file with one symbol per line. It only uses the standard library, so scripts that need nothing
+else from the batch runner do not pay for its imports.
+
+Author: kangwijen
+
+Example:
+    from symbols import read_symbols
+    symbols = read_symbols(['bbca.jk'], 'idx.txt')
+"""
+
+
+def read_symbols(symbols=None, path=None):
+    """
+    Collect unique upper-case symbols from a list and/or a file with one symbol per line.
+    """
+    collected = list(symbols or [])
+    if path:
+        with open(path, encoding='utf-8') as file:
+            collected += [line.split('#')[0].strip() for line in file]
+    return list(dict.fromkeys(symbol.upper() for symbol in collected if symbol))
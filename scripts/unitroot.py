@@ -9,41 +9,12 @@ Returns: None
 Example: python unitroot.py
 """
 
-import yfinance as yf
-import numpy as np
-from arch.unitroot import ADF, PhillipsPerron, KPSS
 from prettytable import PrettyTable
 from colorama import Fore
 
-# Define the stock symbol
-STOCK = input("Enter the stock symbol: ")
+from analytics import fill_missing, log_returns, unit_root_tests
+from pricestore import get_prices
 
-# Convert inputs to uppercase
-STOCK = str(STOCK).upper()
-
-# Download the stock data
-data = yf.download(STOCK, progress=False)
-
-# Use the 'Close' price and fill missing values
-data = data['Close'].ffill().bfill()
-
-# Calculate the log returns
-log_returns = np.log(data / data.shift(1)).dropna()
-
-# Perform the augmented Dickey-Fuller test
-adf_result = ADF(log_returns)
-adf_stat = adf_result.stat
-adf_p_value = adf_result.pvalue
-
-# Perform the Phillips-Perron test
-pp_result = PhillipsPerron(log_returns)
-pp_stat = pp_result.stat
-pp_p_value = pp_result.pvalue
-
-# Perform the Kwiatkowski-Phillips-Schmidt-Shin test
-kpss_result = KPSS(log_returns)
-kpss_stat = kpss_result.stat
-kpss_p_value = kpss_result.pvalue
 
 # Function to generate conclusion string based on p-value
 def get_adf_pp_conclusion(p_value):
@@ -66,23 +37,53 @@ def get_kpss_conclusion(p_value):
         else Fore.RED + 'The returns are not stationary' + Fore.RESET
     )
 
-# Make unit root test table
-unit_root_table = PrettyTable()
-unit_root_table.field_names = ['Test', 'Statistic', 'P-Value', 'Conclusion']
-unit_root_table.add_row([
-    'Augmented Dickey-Fuller',
-    f'{adf_stat:.4f}', f'{adf_p_value:.4f}',
-    get_adf_pp_conclusion(adf_p_value)
-])
-unit_root_table.add_row([
-    'Phillips-Perron',
-    f'{pp_stat:.4f}', f'{pp_p_value:.4f}',
-    get_adf_pp_conclusion(pp_p_value)
-])
-unit_root_table.add_row([
-    'Kwiatkowski-Phillips-Schmidt-Shin',
-    f'{kpss_stat:.4f}', f'{kpss_p_value:.4f}',
-    get_kpss_conclusion(kpss_p_value)
-])
-
-print(unit_root_table)
+
+def main():
+    """
+    Ask for the stock symbol, run the unit root tests and print the results.
+    """
+    # Define the stock symbol
+    STOCK = input("Enter the stock symbol: ")
+
+    # Convert inputs to uppercase
+    STOCK = str(STOCK).upper()
+
+    # Load the stock data from the local price store
+    data = get_prices(STOCK)
+
+    # Use the 'Close' price and fill missing values
+    data = fill_missing(data['Close'])
+
+    # Calculate the log returns
+    returns = log_returns(data)
+
+    # Perform the augmented Dickey-Fuller, Phillips-Perron and KPSS tests
+    tests = unit_root_tests(returns)
+    adf_stat, adf_p_value = tests['adf']
+    pp_stat, pp_p_value = tests['phillips_perron']
+    kpss_stat, kpss_p_value = tests['kpss']
+
+    # Make unit root test table
+    unit_root_table = PrettyTable()
+    unit_root_table.field_names = ['Test', 'Statistic', 'P-Value', 'Conclusion']
+    unit_root_table.add_row([
+        'Augmented Dickey-Fuller',
+        f'{adf_stat:.4f}', f'{adf_p_value:.4f}',
+        get_adf_pp_conclusion(adf_p_value)
+    ])
+    unit_root_table.add_row([
+        'Phillips-Perron',
+        f'{pp_stat:.4f}', f'{pp_p_value:.4f}',
+        get_adf_pp_conclusion(pp_p_value)
+    ])
+    unit_root_table.add_row([
+        'Kwiatkowski-Phillips-Schmidt-Shin',
+        f'{kpss_stat:.4f}', f'{kpss_p_value:.4f}',
+        get_kpss_conclusion(kpss_p_value)
+    ])
+
+    print(unit_root_table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+This module runs the augmented Dickey-Fuller test over rolling or expanding windows to show when
+stationarity breaks down. The lagged design matrix of the ADF regression is built once for the
+whole history and the OLS normal equations of every window come from prefix sums of its outer
+products, so sliding the window costs O(lags^3) per date instead of a new regression on the
+whole window.
+
+Author: kangwijen
+
+Example:
+    monitor = rolling_adf(log_returns, window=252, lags=1)
+    print(monitor.loc[monitor['adf_pvalue'] > 0.05])
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def default_max_lags(nobs):
+    """
+    Return arch's default maximum ADF lag, 12 (nobs / 100)^(1/4), for a sample of `nobs` values,
+    or for every sample size of an array.
+    """
+    nobs = np.asarray(nobs, dtype='int64')
+    max_lags = np.ceil(12.0 * (nobs / 100.0) ** 0.25).astype('int64')
+    max_lags = np.maximum(np.minimum(max_lags, (nobs - 1) // 2 - 2), 0)
+    return int(max_lags) if max_lags.ndim == 0 else max_lags
+
+
+def adf_design(values, max_lags):
+    """
+    Build the rows of the ADF regression with a constant once for the whole series.
+    Row t - 1 holds [dy_t, 1, y_{t-1}, dy_{t-1}, ..., dy_{t-max_lags}] for t = 1 to n - 1, with the
+    lags before the start of the series set to zero.
+    """
+    differences = np.diff(values)
+    rows = np.zeros((len(differences), max_lags + 3))
+    rows[:, 0] = differences
+    rows[:, 1] = 1.0
+    rows[:, 2] = values[:-1]
+    for lag in range(1, max_lags + 1):
+        rows[lag:, lag + 2] = differences[:-lag]
+    return rows
+
+
+def _window_moments(cumulative, first, last, lags):
+    """
+    Return the cross products of the rows `first` to `last` (regression times t, inclusive) for
+    the regression with `lags` lags, from the prefix sums of the row outer products.
+    """
+    columns = np.arange(lags + 3)
+    moments = cumulative[last] - cumulative[first - 1]
+    return moments[:, columns[:, None], columns[None, :]]
+
+
+def _fit(moments):
+    """
+    Solve the normal equations of every window.
+    Returns the y_{t-1} coefficient, the sum of squared residuals, the y_{t-1} diagonal element of
+    the inverse of X'X and the number of regressors.
+    """
+    xtx = moments[:, 1:, 1:]
+    xty = moments[:, 1:, 0]
+    size = xtx.shape[1]
+
+    # Solve for the coefficients and the y_{t-1} column of the inverse together
+    unit = np.zeros_like(xty)
+    unit[:, 1] = 1.0
+    solution = np.linalg.solve(xtx, np.stack([xty, unit], axis=2))
+    coefficients = solution[:, :, 0]
+    inverse = solution[:, 1, 1]
+    residuals = moments[:, 0, 0] - np.einsum('ij,ij->i', coefficients, xty)
+    return coefficients[:, 1], residuals, inverse, size
+
+
+def rolling_adf(data, window=252, lags=None, max_lags=None, min_periods=None):
+    """
+    Run the augmented Dickey-Fuller test with a constant over rolling windows of `window` values,
+    or over expanding windows from `min_periods` values when `window` is None.
+    With a fixed `lags` every window uses the same regression, which makes the results
+    reproducible and matches `arch.unitroot.ADF(window_values, lags=lags)`. Otherwise the lag is
+    picked per window by AIC over 0 to `max_lags` on the common sample, like arch does. Without a
+    `max_lags` every window searches arch's default for its own size, which grows with the
+    expanding windows, so each window matches `arch.unitroot.ADF(window_values)`.
+    Returns a frame with the 'adf_stat', 'adf_pvalue', 'adf_lags' and 'nobs' columns, NaN until the
+    first full window.
+    """
+    from arch.unitroot.unitroot import mackinnonp
+
+    series = pd.Series(data).dropna()
+    values = series.to_numpy(dtype='float64')
+    length = len(values)
+    if window is None:
+        min_periods = min_periods or 100
+        end = np.arange(min_periods - 1, length)
+        start = np.zeros_like(end)
+    else:
+        end = np.arange(window - 1, length)
+        start = end - window + 1
+
+    # Largest lag searched by every window
+    if lags is not None:
+        window_max_lags = np.full(len(end), lags)
+    elif max_lags is not None:
+        window_max_lags = np.full(len(end), max_lags)
+    else:
+        window_max_lags = default_max_lags(end - start + 1)
+
+    result = pd.DataFrame(np.nan, index=series.index, columns=['adf_stat', 'adf_pvalue', 'adf_lags', 'nobs'])
+    # Windows too short for their regression stay missing
+    nobs = end - start + 1
+    feasible = nobs - window_max_lags - 1 > window_max_lags + 2
+    end, start, window_max_lags = end[feasible], start[feasible], window_max_lags[feasible]
+    if len(end) == 0:
+        return result.reindex(pd.Series(data).index)
+
+    # Build the design once and the prefix sums of its row outer products, centred for precision
+    rows = adf_design(values - values.mean(), int(window_max_lags.max()))
+    outer = rows[:, :, None] * rows[:, None, :]
+    cumulative = np.concatenate([np.zeros((1,) + outer.shape[1:]), np.cumsum(outer, axis=0)])
+
+    statistic = np.empty(len(end))
+    selected = np.empty(len(end))
+    count = np.empty(len(end))
+    for group_max_lags in np.unique(window_max_lags):
+        group = window_max_lags == group_max_lags
+        statistic[group], selected[group], count[group] = _select_lags(
+            cumulative, start[group], end[group], lags, int(group_max_lags)
+        )
+
+    result.iloc[end, 0] = statistic
+    result.iloc[end, 1] = [mackinnonp(value, regression='c', num_unit_roots=1) for value in statistic]
+    result.iloc[end, 2] = selected
+    result.iloc[end, 3] = count
+    return result.reindex(pd.Series(data).index)
+
+
+def _select_lags(cumulative, start, end, lags, max_lags):
+    """
+    Fit the ADF regressions of windows that search the same lags and keep the one with the
+    smallest AIC, or the fixed `lags`.
+    Returns the statistic, the lag and the number of observations of every window.
+    """
+    candidates = [lags] if lags is not None else range(max_lags + 1)
+    statistics = np.empty((len(candidates), len(end)))
+    counts = np.empty((len(candidates), len(end)))
+    criteria = np.empty((len(candidates), len(end)))
+    for position, lag in enumerate(candidates):
+        # Regression on the window's own sample, rows t = start + lag + 1 to end
+        first = start + lag + 1
+        beta, residuals, inverse, size = _fit(_window_moments(cumulative, first, end, lag))
+        count = end - first + 1
+        statistics[position] = beta / np.sqrt(residuals / (count - size) * inverse)
+        counts[position] = count
+
+        # AIC on the common sample of the largest lag, rows t = start + max_lags + 1 to end
+        if lags is None:
+            first = start + max_lags + 1
+            _, residuals, _, _ = _fit(_window_moments(cumulative, first, end, lag))
+            common = end - first + 1
+            criteria[position] = common * np.log(residuals / common) + 2 * lag
+
+    # Keep the lag with the smallest AIC, the first one on ties like arch
+    best = np.argmin(criteria, axis=0) if lags is None else np.zeros(len(end), dtype='int64')
+    columns = np.arange(len(end))
+    return statistics[best, columns], np.asarray(candidates)[best], counts[best, columns]
@@ -0,0 +1,271 @@
+"""
+This script keeps the close history of a whole universe as one memory-mapped matrix on disk.
+The closes are a (dates x symbols) float32, or float64, NumPy array with the date index and the
+symbol index stored next to it, so the matrix is never loaded into memory as a whole. Filling the
+gaps and computing the log returns run in place, or into a second memory-mapped file, a block of
+rows at a time, and screens run a block of symbols at a time, so memory is bounded by the block
+size instead of the history length and the universe width.
+
+Author: kangwijen
+
+Parameters: build or screen, with the symbols and the universe directory
+Returns: None
+Example: python universe.py build --file idx.txt --root idx_universe
+         python universe.py screen --root idx_universe --window 63 --output screen.csv
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analytics import risk_adjust, rolling_sharpe
+from symbols import read_symbols
+from pricestore import PriceStore
+
+# Default size of a block in bytes
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Data types a universe can be stored in
+DTYPES = ['float32', 'float64']
+
+
+def row_chunks(rows, chunk_rows):
+    """
+    Yield the (start, stop) bounds of consecutive blocks of `chunk_rows` rows.
+    """
+    for start in range(0, rows, chunk_rows):
+        yield start, min(start + chunk_rows, rows)
+
+
+class Universe:
+    """
+    Memory-mapped (dates x symbols) close matrix with its date and symbol indexes, stored in a
+    directory as 'closes.npy', 'dates.npy' and 'symbols.json'.
+    """
+
+    def __init__(self, root, mode='r', chunk_bytes=DEFAULT_CHUNK_BYTES):
+        self.root = root
+        with open(os.path.join(root, 'symbols.json'), encoding='utf-8') as file:
+            self.symbols = json.load(file)
+        self.dates = pd.DatetimeIndex(np.load(os.path.join(root, 'dates.npy')))
+        self.closes = np.load(os.path.join(root, 'closes.npy'), mmap_mode=mode)
+        self.chunk_bytes = chunk_bytes
+        self.columns = {symbol: column for column, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def create(cls, root, dates, symbols, dtype='float32'):
+        """
+        Create an empty universe filled with NaN and open it for writing.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f'Unknown dtype {dtype}, expected one of {", ".join(DTYPES)}')
+        os.makedirs(root, exist_ok=True)
+        dates = pd.DatetimeIndex(dates)
+        np.save(os.path.join(root, 'dates.npy'), dates.values.astype('datetime64[ns]'))
+        with open(os.path.join(root, 'symbols.json'), 'w', encoding='utf-8') as file:
+            json.dump(list(symbols), file)
+        closes = np.lib.format.open_memmap(
+            os.path.join(root, 'closes.npy'), mode='w+', dtype=dtype, shape=(len(dates), len(symbols))
+        )
+        closes[:] = np.nan
+        closes.flush()
+        del closes
+        return cls(root, mode='r+')
+
+    @classmethod
+    def build(cls, root, symbols, store=None, dtype='float32'):
+        """
+        Build a universe from the closes in the price store, reading one symbol at a time.
+        Returns the universe and a dict of the symbols that failed to load with their error.
+        """
+        store = store or PriceStore()
+        dates = pd.DatetimeIndex([])
+        loaded = []
+        errors = {}
+
+        # Collect the union of the dates first so the matrix is allocated once
+        for symbol in symbols:
+            try:
+                dates = dates.union(store.update(symbol).index)
+                loaded.append(symbol)
+            except Exception as error:
+                errors[symbol] = str(error)
+
+        universe = cls.create(root, dates, loaded, dtype)
+        for column, symbol in enumerate(loaded):
+            closes = store.load(symbol)['Close']
+            universe.closes[dates.get_indexer(closes.index), column] = closes.to_numpy()
+        universe.closes.flush()
+        return universe, errors
+
+    def chunk_rows(self, columns=None):
+        """
+        Return the number of rows of a block of `chunk_bytes`, at least one.
+        """
+        columns = columns or max(len(self.symbols), 1)
+        return max(self.chunk_bytes // (columns * self.closes.dtype.itemsize), 1)
+
+    def frame(self, symbols=None, start=None, end=None):
+        """
+        Return a slice of the matrix as a float64 DataFrame, for the symbols and dates that fit in memory.
+        """
+        symbols = list(symbols or self.symbols)
+        rows = self.dates.slice_indexer(start, end)
+        columns = [self.columns[symbol] for symbol in symbols]
+        return pd.DataFrame(
+            self.closes[rows][:, columns].astype('float64'), index=self.dates[rows], columns=symbols
+        )
+
+    def fill_missing(self, backward=True):
+        """
+        Forward fill and then backward fill the missing closes in place, a block of rows at a time,
+        like `analytics.fill_missing`. With `backward=False` the dates before a symbol's first
+        close stay missing, like `batch.build_returns_matrix`.
+        """
+        closes = self.closes
+        last = np.full(closes.shape[1], np.nan, dtype=closes.dtype)
+        first = np.full(closes.shape[1], np.nan, dtype=closes.dtype)
+        first_row = np.zeros(closes.shape[1], dtype='int64')
+        chunk_rows = self.chunk_rows()
+        for start, stop in row_chunks(len(closes), chunk_rows):
+            block = np.concatenate([last[None, :], closes[start:stop]])
+            missing = np.isnan(block)
+
+            # Index of the last close at or before every row of the block, starting from the carried row
+            index = np.where(missing, 0, np.arange(len(block))[:, None])
+            np.maximum.accumulate(index, axis=0, out=index)
+            filled = block[index, np.arange(block.shape[1])]
+
+            # Record the first close of every symbol
+            found = np.isnan(first) & ~np.isnan(filled[-1])
+            first_row[found] = start + (~missing[1:, found]).argmax(axis=0)
+            first[found] = block[1:][first_row[found] - start, np.flatnonzero(found)]
+
+            closes[start:stop] = filled[1:]
+            last = filled[-1]
+
+        if backward:
+            # Only the rows before a symbol's first close are still missing
+            for start, stop in row_chunks(int(first_row.max(initial=0)), chunk_rows):
+                block = closes[start:stop]
+                closes[start:stop] = np.where(np.isnan(block), first, block)
+        closes.flush()
+
+    def log_returns(self, in_place=False):
+        """
+        Calculate the log returns of the closes a block of rows at a time, in float64 and stored
+        in the universe's data type. The returns share the date index of the closes, with a
+        missing first row.
+        In place, the closes are overwritten from the last block backward, since every block
+        still needs the close before it; otherwise the returns go to 'returns.npy'.
+        Returns the memory-mapped returns.
+        """
+        closes = self.closes
+        if in_place:
+            returns = closes
+        else:
+            returns = np.lib.format.open_memmap(
+                os.path.join(self.root, 'returns.npy'), mode='w+', dtype=closes.dtype, shape=closes.shape
+            )
+        bounds = list(row_chunks(len(closes), self.chunk_rows()))
+        for start, stop in reversed(bounds):
+            previous = closes[max(start - 1, 0):stop - 1].astype('float64')
+            current = closes[max(start, 1):stop].astype('float64')
+            returns[max(start, 1):stop] = np.log(current / previous)
+        if len(closes):
+            returns[0] = np.nan
+        returns.flush()
+        return returns
+
+    def open_returns(self, mode='r'):
+        """
+        Return the memory-mapped returns written by `log_returns()`.
+        """
+        return np.load(os.path.join(self.root, 'returns.npy'), mmap_mode=mode)
+
+    def map_columns(self, function, values=None, chunk_columns=None):
+        """
+        Apply `function` to a float64 (dates x symbols) frame of a block of symbols at a time and
+        concatenate the results, so a cross-sectional screen never holds more than one block.
+        `values` is the memory-mapped matrix to read, the closes by default.
+        """
+        values = self.closes if values is None else values
+        chunk_columns = chunk_columns or max(
+            self.chunk_bytes // (max(len(values), 1) * np.dtype('float64').itemsize), 1
+        )
+        results = []
+        for start, stop in row_chunks(len(self.symbols), chunk_columns):
+            block = pd.DataFrame(
+                np.asarray(values[:, start:stop], dtype='float64'), index=self.dates,
+                columns=self.symbols[start:stop]
+            )
+            results.append(function(block))
+        return pd.concat(results)
+
+
+def screen(universe, returns, window=21, risk_free_rate=0.05, period=252):
+    """
+    Screen every symbol on its full-history annualized mean and volatility and its latest rolling
+    Sharpe ratio, a block of symbols at a time.
+    Returns one row per symbol.
+    """
+    def summarize(block):
+        risk_adjusted_returns = risk_adjust(block, risk_free_rate, period)
+        return pd.DataFrame({
+            'annual_return': block.mean() * period,
+            'annual_volatility': block.std() * np.sqrt(period),
+            'annual_sharpe': risk_adjusted_returns.mean() / block.std() * np.sqrt(period),
+            'rolling_sharpe': rolling_sharpe(risk_adjusted_returns.iloc[-window:], window).iloc[-1],
+        })
+
+    return universe.map_columns(summarize, returns)
+
+
+def main(argv=None):
+    """
+    Parse the command line and build or screen a universe.
+    """
+    parser = argparse.ArgumentParser(description='Memory-mapped close matrix of a whole universe.')
+    parser.add_argument('command', choices=['build', 'screen'], help='command to run')
+    parser.add_argument('symbols', nargs='*', help='stock symbols to build the universe from')
+    parser.add_argument('--file', help='file with one symbol per line')
+    parser.add_argument('--root', required=True, help='directory of the universe')
+    parser.add_argument('--dtype', choices=DTYPES, default='float32',
+                        help='data type of the stored closes (default is float32)')
+    parser.add_argument('--period', type=int, default=252, help='period in days (default is 252)')
+    parser.add_argument('--window', type=int, default=21, help='window size in days (default is 21)')
+    parser.add_argument('--risk-free-rate', type=float, default=0.05,
+                        help='risk-free rate (default is 0.05)')
+    parser.add_argument('--output', help='output .csv or .parquet file of the screen (default is stdout)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        symbols = read_symbols(args.symbols, args.file)
+        if not symbols:
+            parser.error('no symbols given')
+        universe, errors = Universe.build(args.root, symbols, dtype=args.dtype)
+        for symbol, error in errors.items():
+            print(f'Skipped {symbol}: {error}', file=sys.stderr)
+        universe.fill_missing(backward=False)
+        universe.log_returns()
+        print(f'Built {len(universe.symbols)} symbols over {len(universe.dates)} dates in {args.root}')
+        return
+
+    universe = Universe(args.root)
+    table = screen(universe, universe.open_returns(), args.window, args.risk_free_rate, args.period)
+    table.index.name = 'symbol'
+    table = table.reset_index()
+    if args.output is None:
+        table.to_csv(sys.stdout, index=False)
+    elif args.output.endswith('.parquet'):
+        table.to_parquet(args.output, index=False)
+    else:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+
+def write_prices(directory, symbol, closes):
+    """
+    Write a `<SYMBOL>.csv` file of OHLCV bars around the closes for `CSVProvider`.
+    """
+    data = pd.DataFrame({
+        'Open': closes, 'High': closes * 1.01, 'Low': closes * 0.99, 'Close': closes, 'Volume': 1000.0
+    })
+    data.to_csv(os.path.join(directory, f'{symbol}.csv'))
+
+
+@pytest.fixture
+def store(tmp_path):
+    """
+    Price store over offline CSV bars of a benchmark and two stocks, one of them listed later.
+    """
+    from pricestore import PriceStore, CSVProvider
+
+    generator = np.random.default_rng(0)
+    dates = pd.bdate_range('2010-01-04', periods=800)
+    market = generator.normal(0.0003, 0.01, len(dates))
+    source = tmp_path / 'csv'
+    source.mkdir()
+    write_prices(source, '^JKSE', pd.Series(1000 * np.exp(np.cumsum(market)), index=dates))
+    write_prices(source, 'AAA', pd.Series(
+        100 * np.exp(np.cumsum(1.2 * market + generator.normal(0, 0.01, len(dates)))), index=dates
+    ))
+    listed = dates[200:]
+    write_prices(source, 'BBB', pd.Series(
+        50 * np.exp(np.cumsum(0.8 * market[200:] + generator.normal(0, 0.02, len(listed)))), index=listed
+    ))
+    return PriceStore(str(tmp_path / 'store'), CSVProvider(str(source)))
@@ -0,0 +1,83 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import kernels
+from analytics import normality_tests, rolling_downside_deviation, rolling_quantiles, rolling_sortino
+from normality_engine import batch_normality
+
+
+@pytest.mark.parametrize('engine', [None, 'python'])
+def test_rolling_quantiles_match_pandas_with_missing_values(engine):
+    values = np.random.default_rng(0).standard_normal((300, 3))
+    values[[10, 150, 151], 0] = np.nan
+    values[:40, 2] = np.nan
+    data = pd.DataFrame(values, columns=['A', 'B', 'C'])
+
+    if engine is None:
+        q1, q3 = rolling_quantiles(data, 21, [0.25, 0.75])
+    else:
+        q1, q3 = kernels.rolling_quantiles(data, 21, [0.25, 0.75], engine)
+    pd.testing.assert_frame_equal(q1, data.rolling(21).quantile(0.25))
+    pd.testing.assert_frame_equal(q3, data.rolling(21).quantile(0.75))
+    assert q1['A'].iloc[150:172].isna().all()
+    assert q1['A'].iloc[172:].notna().all()
+
+
+def downside_by_apply(returns, window, minimum_acceptable_return):
+    """
+    Root mean square of the shortfalls of every window, one window at a time.
+    """
+    return returns.rolling(window).apply(
+        lambda x: np.sqrt(np.mean(np.minimum(x - minimum_acceptable_return, 0.0) ** 2)), raw=True
+    )
+
+
+@pytest.mark.parametrize('minimum_acceptable_return', [0.0, 0.001])
+def test_rolling_downside_deviation_matches_rolling_apply(minimum_acceptable_return):
+    values = np.random.default_rng(1).normal(0.0005, 0.01, (400, 3))
+    values[[30, 200, 201], 0] = np.nan
+    values[:50, 1] = np.nan
+    # A stretch without any shortfall
+    values[300:340, 2] = np.abs(values[300:340, 2]) + 0.002
+    data = pd.DataFrame(values, columns=['A', 'B', 'C'])
+
+    expected = downside_by_apply(data, 21, minimum_acceptable_return)
+    pd.testing.assert_frame_equal(
+        rolling_downside_deviation(data, 21, minimum_acceptable_return), expected, rtol=1e-9, atol=1e-15
+    )
+    assert expected['A'].iloc[200:222].isna().all()
+
+    for column in data:
+        deviation = expected[column]
+        sortino = (data[column].rolling(21).mean() - minimum_acceptable_return) / deviation.where(deviation > 0)
+        pd.testing.assert_series_equal(
+            rolling_sortino(data[column], 21, minimum_acceptable_return), sortino, rtol=1e-9
+        )
+    assert rolling_sortino(data['C'], 21, minimum_acceptable_return).iloc[320:340].isna().all()
+
+
+@pytest.mark.parametrize('length', [30, 252, 1000])
+def test_anderson_darling_is_called_without_deprecated_arguments(length):
+    from scipy.stats import anderson
+
+    values = np.random.default_rng(length).standard_t(5, length) * 0.01
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        _, result = normality_tests(pd.Series(values))
+
+    scipy_result = anderson(values, method='interpolate')
+    assert result.statistic == pytest.approx(scipy_result.statistic)
+    assert result.pvalue == pytest.approx(scipy_result.pvalue)
+    assert list(result.significance_level) == [15.0, 10.0, 5.0, 2.5, 1.0]
+    # The critical values scipy reports without `method` until it drops them
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        legacy = anderson(values)
+    if hasattr(legacy, 'critical_values'):
+        np.testing.assert_array_equal(result.critical_values, legacy.critical_values)
+    engine = batch_normality(pd.DataFrame({'A': values}), exact_tests='none')
+    assert engine.loc['A', 'anderson_darling_critical_5'] == result.critical_values[2]
+    assert engine.loc['A', 'anderson_darling_stat'] == pytest.approx(result.statistic)
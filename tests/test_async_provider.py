@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+
+from async_provider import AsyncProvider, refresh_async
+from pricestore import PriceStore
+
+DATES = pd.bdate_range('2024-01-02', periods=30)
+
+
+class StubServer:
+    """
+    Local chart endpoint that dates IDX bars at midnight Jakarta time, throttles and fails on
+    purpose, and records the requests it served.
+    """
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.calls = {}
+        self.times = []
+        self.in_flight = 0
+        self.peak = 0
+        self.peers = set()
+
+    async def chart(self, request):
+        symbol = request.match_info['symbol']
+        calls = self.calls[symbol] = self.calls.get(symbol, 0) + 1
+        self.times.append(time.perf_counter())
+        self.peers.add(request.transport.get_extra_info('peername'))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if symbol == 'THROTTLED' and calls <= 2:
+                return web.Response(status=429, headers={'Retry-After': '0.05'})
+            if symbol == 'FLAKY' and calls == 1:
+                return web.Response(status=503)
+            if symbol == 'DROPPED' and calls == 1:
+                request.transport.close()
+                return web.Response()
+            if symbol == 'MISSING':
+                return web.json_response({'chart': {'result': None, 'error': {'description': 'No data found'}}},
+                                         status=404)
+            return web.json_response(self.payload(int(request.query['period1'])))
+        finally:
+            self.in_flight -= 1
+
+    @staticmethod
+    def payload(period1):
+        stamps = [int(date.tz_localize('Asia/Jakarta').timestamp()) for date in DATES]
+        stamps = [stamp for stamp in stamps if stamp >= period1]
+        closes = np.arange(1.0, len(stamps) + 1)
+        quote = {name: closes.tolist() for name in ['open', 'high', 'low', 'close']}
+        quote['volume'] = [100] * len(stamps)
+        result = {'meta': {'exchangeTimezoneName': 'Asia/Jakarta'}, 'timestamp': stamps, 'indicators': {'quote': [quote]}}
+        return {'chart': {'result': [result], 'error': None}}
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/v8/finance/chart/{symbol}', self.chart)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        return f'http://127.0.0.1:{port}'
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def run_with_server(function):
+    async def run():
+        server = StubServer()
+        base_url = await server.start()
+        try:
+            return server, await function(base_url)
+        finally:
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+def test_fetch_many_pools_retries_and_limits_the_rate():
+    symbols = [f'S{number}' for number in range(12)] + ['THROTTLED', 'FLAKY', 'DROPPED', 'MISSING']
+    rate, burst = 40.0, 4
+
+    async def fetch(base_url):
+        provider = AsyncProvider(base_url, concurrency=3, rate=rate, burst=burst, retries=3, backoff=0.01)
+        async with provider:
+            return await provider.fetch_many(symbols)
+
+    server, (bars, errors) = run_with_server(fetch)
+
+    assert set(errors) == {'MISSING'}
+    assert len(bars) == len(symbols) - 1
+    assert all(len(data) == len(DATES) for data in bars.values())
+    assert server.calls['THROTTLED'] == 3 and server.calls['FLAKY'] == 2 and server.calls['DROPPED'] == 2
+
+    # At most `concurrency` requests in flight over at most that many pooled connections, plus the dropped one
+    assert server.peak <= 3
+    assert len(server.peers) <= 4
+
+    # No more than the burst plus the refill in any stretch of time
+    times = np.asarray(server.times)
+    for first in range(len(times)):
+        elapsed = times[first:] - times[first]
+        assert (np.arange(1, len(elapsed) + 1) <= burst + elapsed * rate + 1).all()
+
+
+def test_refresh_fetches_the_last_cached_session_again(tmp_path):
+    async def refresh(base_url):
+        provider = AsyncProvider(base_url, rate=100.0)
+        store = PriceStore(str(tmp_path), provider=provider)
+        store._write('BBCA.JK', _cached())
+        errors = await refresh_async(['BBCA.JK'], store, provider)
+        return errors, store.load('BBCA.JK')
+
+    server, (errors, data) = run_with_server(refresh)
+
+    assert not errors
+    assert data.index.equals(pd.DatetimeIndex(DATES, name='Date'))
+    # The partial last cached session was replaced by the served bar
+    assert data.loc[DATES[9], 'Close'] != -1.0
+
+
+def _cached():
+    """
+    Cached bars up to DATES[9] with a partial last session.
+    """
+    closes = np.arange(1.0, 11.0)
+    closes[-1] = -1.0
+    data = pd.DataFrame({column: closes for column in ['Open', 'High', 'Low', 'Close']}, index=DATES[:10])
+    data['Volume'] = 100.0
+    data.index.name = 'Date'
+    return data
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from statsmodels.stats.diagnostic import acorr_ljungbox
+from statsmodels.stats.stattools import durbin_watson
+from statsmodels.tsa.stattools import acf
+
+from autocorr_engine import (
+    batch_acf, batch_ljung_box, batch_durbin_watson, rolling_ljung_box, rolling_durbin_watson
+)
+
+
+def sample_returns():
+    generator = np.random.default_rng(3)
+    noise = generator.normal(0, 0.01, (600, 3))
+    # An AR(1) column, white noise, and a column that starts later
+    noise[1:, 0] += 0.3 * noise[:-1, 0]
+    returns = pd.DataFrame(noise, columns=['AR', 'NOISE', 'LATE'])
+    returns.iloc[:150, 2] = np.nan
+    return returns
+
+
+def test_batch_tests_match_statsmodels_per_column():
+    returns = sample_returns()
+    correlations, count = batch_acf(returns, 10)
+    tests = batch_ljung_box(returns, [1, 5, 10])
+    statistics = batch_durbin_watson(returns)
+
+    for position, symbol in enumerate(returns.columns):
+        values = returns[symbol].dropna()
+        assert count[position] == len(values)
+        np.testing.assert_allclose(correlations[:, position], acf(values, nlags=10, fft=False), atol=1e-12)
+        expected = acorr_ljungbox(values, lags=[1, 5, 10])
+        np.testing.assert_allclose(tests.loc[symbol, 'lb_stat'], expected['lb_stat'], rtol=1e-9)
+        np.testing.assert_allclose(tests.loc[symbol, 'lb_pvalue'], expected['lb_pvalue'], rtol=1e-8, atol=1e-300)
+        np.testing.assert_allclose(statistics[symbol], durbin_watson(values), rtol=1e-12)
+
+
+def test_rolling_tests_match_statsmodels_on_every_window():
+    returns = sample_returns()
+    statistic, p_value = rolling_ljung_box(returns, window=100, lags=5)
+    durbin = rolling_durbin_watson(returns, window=100)
+
+    assert statistic.iloc[:99].isna().all().all()
+    assert statistic['LATE'].iloc[:249].isna().all()
+    for end in (99, 250, 387, 599):
+        for symbol in returns.columns:
+            window = returns[symbol].iloc[end - 99:end + 1]
+            if window.isna().any():
+                continue
+            expected = acorr_ljungbox(window, lags=[5])
+            np.testing.assert_allclose(statistic[symbol].iloc[end], expected['lb_stat'].iloc[0], rtol=1e-8)
+            np.testing.assert_allclose(p_value[symbol].iloc[end], expected['lb_pvalue'].iloc[0], rtol=1e-7)
+            np.testing.assert_allclose(durbin[symbol].iloc[end], durbin_watson(window), rtol=1e-10)
@@ -0,0 +1,29 @@
+import numpy as np
+
+from analytics import (
+    fill_missing, log_returns, risk_adjust, align_returns, rolling_sharpe, rolling_beta, rolling_alpha,
+    iqr_bounds
+)
+from batch import load_closes, build_returns_matrix, rolling_ratios, tidy_results
+
+
+def test_late_listing_matches_the_single_stock_scripts(store):
+    closes, errors = load_closes(['AAA', 'BBB'], store)
+    benchmark_returns = log_returns(fill_missing(store.update('^JKSE')['Close']))
+    ratios = rolling_ratios(build_returns_matrix(closes), benchmark_returns)
+
+    # Like sharpe.py and alpha.py on BBB alone
+    returns = risk_adjust(log_returns(fill_missing(store.update('BBB')['Close'])), 0.05, 252)
+    sharpe = fill_missing(rolling_sharpe(returns, 21))
+    returns, aligned_benchmark = align_returns(returns, benchmark_returns)
+    alpha = rolling_alpha(returns, aligned_benchmark, rolling_beta(returns, aligned_benchmark, 21))
+
+    assert not errors
+    np.testing.assert_allclose(ratios['sharpe']['BBB'].dropna(), sharpe, atol=1e-10)
+    np.testing.assert_allclose(ratios['alpha']['BBB'].dropna(), alpha, atol=1e-10)
+
+    table = tidy_results(ratios)
+    listed = table[table['symbol'] == 'BBB']
+    assert len(listed) == len(sharpe)
+    lower_bound, upper_bound = iqr_bounds(sharpe)
+    assert listed['sharpe_outlier'].sum() == ((sharpe < lower_bound) | (sharpe > upper_bound)).sum()
@@ -0,0 +1,20 @@
+import beta_engine
+from beta_engine import engine_for
+
+
+def test_engine_cache_sees_revised_bars_and_stays_bounded(store, monkeypatch):
+    from analytics import fill_missing, log_returns
+
+    benchmark_returns = log_returns(fill_missing(store.update('^JKSE')['Close']))
+    engine = engine_for('^JKSE', benchmark_returns, 21)
+    assert engine_for('^JKSE', benchmark_returns.copy(), 21) is engine
+
+    # A revised last bar keeps the dates but must not reuse the old moments
+    revised = benchmark_returns.copy()
+    revised.iloc[-1] += 0.01
+    assert engine_for('^JKSE', revised, 21) is not engine
+
+    monkeypatch.setattr(beta_engine, 'MAX_ENGINES', 2)
+    for window in (5, 10, 15):
+        engine_for('^JKSE', benchmark_returns, window)
+    assert len(beta_engine._ENGINES) == 2
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from analytics import (
+    fill_missing, log_returns, risk_adjust, align_returns, rolling_sharpe, rolling_sortino,
+    rolling_beta, rolling_alpha
+)
+from cache import DerivedSeries
+
+
+def pipeline_returns(store, symbol):
+    return risk_adjust(log_returns(fill_missing(store.update(symbol)['Close'])), 0.05, 252)
+
+
+def test_cached_ratios_match_the_scripts(store):
+    series = DerivedSeries(store)
+    returns = pipeline_returns(store, 'AAA')
+
+    np.testing.assert_allclose(series.sharpe('AAA', 21), fill_missing(rolling_sharpe(returns, 21)), atol=1e-10)
+    np.testing.assert_allclose(series.sortino('AAA', 21), fill_missing(rolling_sortino(returns, 21)), atol=1e-10)
+
+
+def test_cached_alpha_matches_the_pipeline(store):
+    series = DerivedSeries(store)
+    returns, benchmark_returns = align_returns(
+        pipeline_returns(store, 'AAA'), log_returns(fill_missing(store.update('^JKSE')['Close']))
+    )
+    beta = rolling_beta(returns, benchmark_returns, 21)
+    expected = rolling_alpha(returns, benchmark_returns, beta, 21, 0.05, 252)
+
+    alpha = series.alpha('AAA', '^JKSE', 21)
+    assert alpha.index.equals(expected.index)
+    np.testing.assert_allclose(alpha, expected, atol=1e-12)
+
+
+def test_repeated_queries_do_not_call_the_provider(store):
+    fetches = []
+    fetch = store.provider.fetch
+    store.provider.fetch = lambda symbol, start=None: fetches.append(symbol) or fetch(symbol, start)
+    series = DerivedSeries(store)
+
+    first = series.sharpe('AAA', 21)
+    for _ in range(3):
+        series.sharpe('AAA', 21)
+        series.sortino('AAA', 21)
+        series.closes('AAA')
+    assert fetches == ['AAA']
+
+    # Refreshing asks the provider again, and unchanged bars keep the cached series
+    series.refresh('AAA')
+    assert fetches == ['AAA', 'AAA']
+    assert series.sharpe('AAA', 21) is first
+
+
+def test_refresh_drops_the_entries_of_new_bars(store):
+    series = DerivedSeries(store)
+    before = series.sharpe('AAA', 21)
+
+    path = os.path.join(store.provider.directory, 'AAA.csv')
+    bars = pd.read_csv(path, index_col=0, parse_dates=True)
+    bars.loc[bars.index[-1] + pd.offsets.BDay()] = bars.iloc[-1] * 1.02
+    bars.to_csv(path)
+
+    assert series.sharpe('AAA', 21) is before
+    series.refresh('AAA')
+    after = series.sharpe('AAA', 21)
+    assert len(after) == len(before) + 1
+    pd.testing.assert_series_equal(after.iloc[:-1], before)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from analytics import (
+    fill_missing, log_returns, risk_adjust, rolling_sharpe, rolling_sortino, rolling_beta, rolling_treynor,
+    rolling_alpha
+)
+from chunked import ChunkedRatios, frame_blocks, parquet_blocks, run_chunked
+
+
+def sample_closes(length=3000, seed=5):
+    generator = np.random.default_rng(seed)
+    index = pd.date_range('2024-01-02 09:00', periods=length, freq='min')
+    market = generator.normal(0, 0.001, length)
+    data = pd.DataFrame({
+        'Close': 100 * np.exp(np.cumsum(1.2 * market + generator.normal(0, 0.001, length))),
+        'Benchmark': 1000 * np.exp(np.cumsum(market)),
+    }, index=index)
+    # Missing closes at the start and inside the series
+    data.iloc[:3, 0] = np.nan
+    data.iloc[[700, 701, 1900], 0] = np.nan
+    data.iloc[1200, 1] = np.nan
+    return data
+
+
+def chunked(data, block_rows, segment_rows=256):
+    ratios = ChunkedRatios(window=30, period=98280, benchmark=True, segment_rows=segment_rows)
+    parts = [ratios.process(block) for block in frame_blocks(data, block_rows)] + [ratios.finish()]
+    return pd.concat([part for part in parts if part is not None and not part.empty])
+
+
+def test_output_is_identical_for_any_block_size():
+    data = sample_closes()
+    expected = chunked(data, len(data))
+    for block_rows in (2, 29, 30, 255, 257, 1000):
+        pd.testing.assert_frame_equal(chunked(data, block_rows), expected, check_exact=True, check_freq=False)
+
+
+def test_output_matches_the_ratio_scripts():
+    data = sample_closes()
+    returns = risk_adjust(log_returns(fill_missing(data['Close'])), 0.05, 98280)
+    benchmark_returns = log_returns(fill_missing(data['Benchmark']))
+    beta = rolling_beta(returns, benchmark_returns, 30)
+    expected = pd.DataFrame({
+        'sharpe': fill_missing(rolling_sharpe(returns, 30)),
+        'sortino': fill_missing(rolling_sortino(returns, 30)),
+        'beta': fill_missing(beta),
+        'treynor': fill_missing(rolling_treynor(returns, beta, 30)),
+        'alpha': rolling_alpha(returns, benchmark_returns, beta, 30, 0.05, 98280),
+    })
+    pd.testing.assert_frame_equal(chunked(data, 333), expected, rtol=1e-7, check_freq=False)
+
+
+def test_parquet_files_stream_through(tmp_path):
+    data = sample_closes()
+    source, output = str(tmp_path / 'bars.parquet'), str(tmp_path / 'ratios.parquet')
+    data.to_parquet(source)
+    rows = run_chunked(parquet_blocks(source, block_rows=400), output, window=30, period=98280, benchmark=True)
+
+    written = pd.read_parquet(output)
+    assert rows == len(data) - 1
+    pd.testing.assert_frame_equal(written, chunked(data, len(data), segment_rows=65536), check_freq=False,
+                                  check_names=False)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tsa.seasonal import seasonal_decompose
+
+from decomposition_engine import IncrementalDecomposition, decompose
+
+
+def sample_closes(length=400, tickers=3, seed=4):
+    generator = np.random.default_rng(seed)
+    dates = pd.bdate_range('2019-01-01', periods=length)
+    cycle = 1 + 0.02 * np.sin(2 * np.pi * np.arange(length) / 7)[:, None]
+    steps = generator.normal(0.0003, 0.01, (length, tickers))
+    return pd.DataFrame(100 * np.exp(np.cumsum(steps, axis=0)) * cycle, index=dates,
+                        columns=[f'S{ticker}' for ticker in range(tickers)])
+
+
+@pytest.mark.parametrize('model', ['multiplicative', 'additive'])
+@pytest.mark.parametrize('period', [7, 30])
+def test_batch_matches_statsmodels(model, period):
+    closes = sample_closes()
+    result = decompose(closes, period, model)
+    for symbol in closes.columns:
+        expected = seasonal_decompose(closes[symbol], model=model, period=period)
+        for component in ('trend', 'seasonal', 'resid'):
+            np.testing.assert_allclose(getattr(result, component)[symbol], getattr(expected, component), rtol=1e-10)
+
+
+@pytest.mark.parametrize('model', ['multiplicative', 'additive'])
+def test_incremental_updates_match_the_batch_decomposition(model):
+    closes = sample_closes()
+    period, start = 30, 250
+    fitted = {symbol: seasonal_decompose(closes[symbol], model=model, period=period) for symbol in closes.columns}
+    expected = decompose(closes, period, model)._make(
+        pd.DataFrame({symbol: getattr(result, component) for symbol, result in fitted.items()})
+        for component in ('observed', 'trend', 'seasonal', 'resid')
+    )
+    decomposition = IncrementalDecomposition.from_history(closes.iloc[:start], period, model)
+
+    for row in range(start, len(closes)):
+        components = decomposition.update(closes.iloc[row].to_numpy())
+        # Every update completes the trend of the bar half a period back
+        centre = row - period // 2
+        np.testing.assert_allclose(components['trend'], expected.trend.iloc[centre], rtol=1e-10)
+
+    # After the same bars the seasonal factors are those of the batch decomposition
+    np.testing.assert_allclose(components['seasonal'], expected.seasonal.iloc[centre], rtol=1e-10)
+    np.testing.assert_allclose(components['resid'], expected.resid.iloc[centre], rtol=1e-10)
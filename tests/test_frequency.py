@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from frequency import Session, window_bars, window_starts, resample_ticks, rolling_ratios
+
+
+def session_bars(session, sessions=20):
+    days = pd.bdate_range('2024-01-01', periods=sessions)
+    index = pd.DatetimeIndex(np.concatenate([
+        pd.date_range(day + pd.Timedelta('9h'), day + pd.Timedelta('15h55min'), freq='5min') for day in days
+    ]))
+    return index[session.contains(index)]
+
+
+@pytest.mark.parametrize('window', ['30min', '2h', '1D', '5D'])
+def test_duration_windows_count_the_same_bars_everywhere(window):
+    session = Session.parse('09:00-12:00,13:30-16:00')
+    index = session_bars(session)
+    starts, _ = window_starts(index, window, session)
+    rows = np.arange(len(index)) - starts + 1
+    assert (rows[-300:] == window_bars(window, '5min', session)).all()
+
+
+def test_duration_and_count_windows_give_the_same_ratios():
+    session = Session.parse('09:00-12:00,13:30-16:00')
+    index = session_bars(session)
+    returns = pd.Series(np.random.default_rng(0).normal(0, 1e-3, len(index)), index=index)
+    by_time = rolling_ratios(returns, '5D', session=session)['sharpe']
+    by_count = rolling_ratios(returns, window_bars('5D', '5min', session))['sharpe']
+    np.testing.assert_allclose(by_time.iloc[400:], by_count.iloc[400:])
+
+
+def test_calendar_frequencies_are_rejected_clearly():
+    ticks = pd.Series([1.0, 2.0], index=pd.to_datetime(['2024-01-02 09:00', '2024-01-02 09:01']))
+    with pytest.raises(ValueError, match='not a fixed bar frequency'):
+        resample_ticks(ticks, 'W')
+    with pytest.raises(ValueError, match='not a fixed bar frequency'):
+        window_bars('5D', 'ME')
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from kernels import fused_ratios, parity
+
+
+def test_engines_match_the_scripts_when_the_benchmark_misses_dates():
+    generator = np.random.default_rng(0)
+    dates = pd.bdate_range('2000-01-03', periods=400)
+    steps = generator.normal(0.0003, 0.02, (len(dates), 3))
+    closes = pd.DataFrame(100 * np.exp(np.cumsum(steps, axis=0)), index=dates, columns=['A', 'B', 'C'])
+    benchmark_closes = pd.Series(1000 * np.exp(np.cumsum(steps.mean(axis=1))), index=dates).drop(dates[[50, 200]])
+
+    assert parity(closes, benchmark_closes, engines=['numpy', 'python'])['match'].all()
+
+    # Sharpe and Sortino keep every date of the closes, Treynor and Alpha only the common ones
+    ratios = fused_ratios(closes, benchmark_closes, engine='numpy')
+    assert ratios['sharpe'].index.equals(dates[1:])
+    assert ratios['alpha'].index.equals(benchmark_closes.index[1:])
+
+
+def test_engines_match_the_scripts_when_both_sides_miss_dates():
+    generator = np.random.default_rng(1)
+    dates = pd.bdate_range('2000-01-03', periods=300)
+    steps = generator.normal(0.0003, 0.02, (len(dates), 2))
+    closes = pd.DataFrame(100 * np.exp(np.cumsum(steps, axis=0)), index=dates, columns=['A', 'B'])
+    benchmark_closes = pd.Series(1000 * np.exp(np.cumsum(steps.mean(axis=1))), index=dates)
+
+    # The closes miss a stretch the benchmark has, and the benchmark misses a few dates of the closes
+    closes = closes.drop(dates[100:110])
+    benchmark_closes = benchmark_closes.drop(dates[[30, 31, 250]])
+    assert parity(closes, benchmark_closes, engines=['numpy', 'python'])['match'].all()
+
+    ratios = fused_ratios(closes['A'], benchmark_closes, engine='python')
+    assert ratios['sharpe'].index.equals(closes.index[1:])
+    assert ratios['treynor'].index.equals(closes.index[1:].intersection(benchmark_closes.index[1:]))
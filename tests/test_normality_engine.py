@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import jarque_bera, kstest
+
+from normality_engine import batch_normality
+from runner import normality_task
+
+
+def test_batch_tests_match_scipy_and_keep_apart_from_the_runner():
+    generator = np.random.default_rng(0)
+    returns = pd.DataFrame({
+        'AAA': generator.normal(0.0005, 0.02, 500), 'BBB': generator.standard_t(4, 500) * 0.01
+    })
+    returns.iloc[:50, 1] = np.nan
+    batch = batch_normality(returns, ks_method='exact')
+
+    for symbol in returns.columns:
+        values = returns[symbol].dropna()
+        fitted = kstest(values, 'norm', args=(values.mean(), values.std()))
+        np.testing.assert_allclose(batch.loc[symbol, 'kolmogorov_smirnov_fitted_stat'], fitted.statistic, rtol=1e-10)
+        np.testing.assert_allclose(batch.loc[symbol, 'kolmogorov_smirnov_fitted_pvalue'], fitted.pvalue, rtol=1e-8)
+        np.testing.assert_allclose(batch.loc[symbol, 'jarque_bera_stat'], jarque_bera(values).statistic, rtol=1e-10)
+
+    # The runner's columns keep scipy's test against the standard normal
+    task = normality_task(returns['AAA'])
+    assert task['kolmogorov_smirnov_stat'] == kstest(returns['AAA'], 'norm').statistic
+    assert 'kolmogorov_smirnov_stat' not in batch.columns
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from analytics import (
+    fill_missing, risk_adjust, align_returns, rolling_sharpe, rolling_sortino, rolling_beta, rolling_treynor,
+    rolling_alpha
+)
+from portfolio import RollingCovarianceMatrix, portfolio_ratios, portfolio_returns
+
+
+def sample_returns(length=300, tickers=3, seed=0):
+    generator = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-01', periods=length)
+    market = pd.Series(generator.normal(0.0003, 0.01, length), index=dates)
+    returns = pd.DataFrame(
+        market.to_numpy()[:, None] * generator.uniform(0.5, 1.5, tickers) + generator.normal(0, 0.01, (length, tickers)),
+        index=dates, columns=[f'S{ticker}' for ticker in range(tickers)]
+    )
+    return returns, market
+
+
+def test_rank_two_updates_match_the_window_covariance():
+    values = np.random.default_rng(1).normal(size=(100, 4))
+    estimator = RollingCovarianceMatrix(21, 4)
+    for row, observation in enumerate(values):
+        estimator.update(observation)
+        if row >= 20:
+            window = values[row - 20:row + 1]
+            np.testing.assert_allclose(estimator.mean, window.mean(axis=0), atol=1e-12)
+            np.testing.assert_allclose(estimator.covariance, np.cov(window, rowvar=False), atol=1e-12)
+
+
+def test_fixed_weights_match_the_scripts_on_the_portfolio_returns():
+    returns, benchmark_returns = sample_returns()
+    weights = [0.5, 0.3, 0.2]
+    ratios = portfolio_ratios(returns, weights, benchmark_returns, 21)
+
+    stock, benchmark = align_returns(risk_adjust(portfolio_returns(returns, weights)), benchmark_returns)
+    beta = rolling_beta(stock, benchmark, 21)
+    np.testing.assert_allclose(ratios['sharpe'], fill_missing(rolling_sharpe(stock, 21)), atol=1e-9)
+    np.testing.assert_allclose(ratios['sortino'], fill_missing(rolling_sortino(stock, 21)), atol=1e-9)
+    np.testing.assert_allclose(ratios['beta'][20:], beta[20:], atol=1e-9)
+    np.testing.assert_allclose(ratios['treynor'], fill_missing(rolling_treynor(stock, beta, 21)), atol=1e-9)
+    np.testing.assert_allclose(ratios['alpha'], rolling_alpha(stock, benchmark, beta, 21), atol=1e-12)
+
+
+def test_time_varying_weights_measure_the_held_portfolio():
+    returns, benchmark_returns = sample_returns()
+    rebalances = pd.DataFrame([[1.0, 0.0, 0.0], [0.0, 0.5, 0.5]], index=returns.index[[0, 150]],
+                              columns=returns.columns)
+    ratios = portfolio_ratios(returns, rebalances, benchmark_returns, 21)
+
+    # Every ratio after a rebalance is that of the new weights held over the whole window
+    held = risk_adjust(returns @ np.array([0.0, 0.5, 0.5]))
+    expected_sharpe = rolling_sharpe(held, 21)
+    expected_sortino = rolling_sortino(held, 21)
+    np.testing.assert_allclose(ratios['sharpe'].iloc[151:], expected_sharpe.iloc[151:], atol=1e-9)
+    np.testing.assert_allclose(ratios['sortino'].iloc[151:], expected_sortino.iloc[151:], atol=1e-9)
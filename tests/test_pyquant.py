@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+import pyquant
+
+
+@pytest.fixture
+def cached_store(store, monkeypatch):
+    """
+    Run the command line on the fixture's offline store instead of the default one.
+    """
+    monkeypatch.setattr(pyquant, 'PriceStore', lambda: store)
+    return store
+
+
+@pytest.mark.parametrize('command, flags, columns, rows', [
+    ('sharpe', ['--latest'], ['symbol', 'date', 'value', 'lower_bound', 'upper_bound'], 2),
+    ('sortino', ['--bounds-window', '63'], ['symbol', 'date', 'value'], 799 + 599),
+    ('treynor', ['--latest'], ['symbol', 'date', 'value'], 2),
+    ('alpha', ['--window', '63', '--latest'], ['symbol', 'date', 'value'], 2),
+    ('normality', [], ['symbol', 'jarque_bera_pvalue', 'kolmogorov_smirnov_stat', 'anderson_darling_stat'], 2),
+    ('unitroot', [], ['symbol', 'adf_stat', 'adf_pvalue'], 2),
+    ('unitroot', ['--window', '252', '--lags', '1'], ['symbol', 'date'], 799 - 251 + 599 - 251),
+    ('autocorr', ['--lags', '5'], ['symbol', 'lag', 'lb_stat', 'lb_pvalue', 'significant', 'durbin_watson'], 10),
+    ('decompose', ['--period', '21'], ['symbol', 'date', 'trend', 'seasonal', 'residual'], 800 + 600),
+])
+def test_subcommands_write_one_table_for_every_symbol(cached_store, tmp_path, command, flags, columns, rows):
+    output = tmp_path / 'out.csv'
+    with pytest.raises(SystemExit) as exit_info:
+        pyquant.main([command, 'aaa', 'BBB', *flags, '--format', 'csv', '--output', str(output)])
+    assert exit_info.value.code == 0
+
+    table = pd.read_csv(output)
+    assert set(columns) <= set(table.columns)
+    assert list(table['symbol'].unique()) == ['AAA', 'BBB']
+    assert len(table) == rows
+
+
+def test_jsonl_output_and_failed_symbols(cached_store, tmp_path, capsys):
+    output = tmp_path / 'out.jsonl'
+    with pytest.raises(SystemExit) as exit_info:
+        pyquant.main(['sharpe', 'AAA', 'MISSING', '--latest', '--output', str(output)])
+    assert exit_info.value.code == 0
+    assert pd.read_json(output, lines=True)['symbol'].tolist() == ['AAA']
+    assert 'Skipped MISSING' in capsys.readouterr().err
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import report
+import sharpe
+from report import build_ratio_figure, output_mode, ratio_data, render
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+
+
+def sample_data():
+    ratio = pd.Series(np.sin(np.arange(50) / 5.0), index=pd.bdate_range('2020-01-01', periods=50), name='value')
+    return ratio_data(ratio, -0.9, 0.9)
+
+
+def no_figure():
+    raise AssertionError('the figure should not be built')
+
+
+def test_scripts_do_not_import_plotly_at_module_load():
+    code = 'import sys, report, sharpe; print(any(name.startswith("plotly") for name in sys.modules))'
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=SCRIPTS, capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == 'False'
+
+
+def test_output_mode_comes_from_the_environment(monkeypatch):
+    monkeypatch.delenv('PYQUANT_OUTPUT', raising=False)
+    assert output_mode() == 'show'
+    monkeypatch.setenv('PYQUANT_OUTPUT', 'Parquet')
+    assert output_mode() == 'parquet'
+    assert output_mode('html') == 'html'
+    with pytest.raises(ValueError):
+        output_mode('gif')
+
+
+@pytest.mark.parametrize('mode', report.DATA_MODES)
+def test_data_modes_write_the_series_without_a_figure(mode, tmp_path, monkeypatch):
+    monkeypatch.setenv('PYQUANT_OUTPUT', mode)
+    monkeypatch.setenv('PYQUANT_OUTPUT_DIR', str(tmp_path / 'out'))
+    data = sample_data()
+    path = render(no_figure, data, 'sharpe_BBCA.JK')
+
+    assert path == os.path.join(str(tmp_path / 'out'), f'sharpe_BBCA.JK.{mode}')
+    written = pd.read_parquet(path) if mode == 'parquet' else pd.read_json(path, orient='table')
+    pd.testing.assert_frame_equal(written, data, check_freq=False, check_index_type=False)
+
+
+def test_html_mode_writes_the_figure(tmp_path):
+    pytest.importorskip('plotly')
+    data = sample_data()
+    path = render(
+        lambda: build_ratio_figure(data, 'Rolling Sharpe Ratio', 'Rolling Sharpe Ratio', 'Sharpe Ratio'),
+        data, 'sharpe/AAA', mode='html', directory=str(tmp_path)
+    )
+
+    assert path == os.path.join(str(tmp_path), 'sharpe_AAA.html')
+    with open(path, encoding='utf-8') as file:
+        assert 'Rolling Sharpe Ratio' in file.read()
+
+
+def test_script_writes_its_series_in_a_data_mode(store, tmp_path, monkeypatch):
+    monkeypatch.setenv('PYQUANT_OUTPUT', 'parquet')
+    monkeypatch.setenv('PYQUANT_OUTPUT_DIR', str(tmp_path))
+    monkeypatch.setattr(sharpe, 'get_prices', lambda symbol: store.update(symbol))
+    monkeypatch.setattr(sharpe, 'build_ratio_figure', no_figure)
+    answers = iter(['aaa', '', '', ''])
+    monkeypatch.setattr('builtins.input', lambda prompt: next(answers))
+    sharpe.main()
+
+    written = pd.read_parquet(tmp_path / 'sharpe_AAA.parquet')
+    assert list(written.columns) == ['value', 'lower_bound', 'upper_bound', 'outlier']
+    assert len(written) == len(store.load('AAA')) - 1
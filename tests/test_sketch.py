@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from sketch import OutlierDetector
+
+
+def test_cached_bounds_stay_close_and_are_refreshed_rarely():
+    values = np.random.default_rng(0).standard_normal(50000)
+    detector = OutlierDetector(k=200, seed=1)
+    queries = []
+    bounds = detector.bounds
+    detector.bounds = lambda: queries.append(1) or bounds()
+
+    for value in values:
+        lower_bound, upper_bound, _ = detector.update(value)
+
+    q1, q3 = np.quantile(values, [0.25, 0.75])
+    exact = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    np.testing.assert_allclose([lower_bound, upper_bound], exact, atol=0.1)
+    assert len(queries) < len(values) / 20
+
+
+def test_rolling_bounds_follow_a_level_shift():
+    values = np.concatenate([np.zeros(2000), np.full(2000, 10.0)]) + np.random.default_rng(2).standard_normal(4000)
+    detector = OutlierDetector(window=500, k=100, seed=3)
+    for value in values:
+        lower_bound, upper_bound, _ = detector.update(value)
+    assert 5 < lower_bound < 10 < upper_bound < 15
+
+
+def rolling_iqr_bounds(values, window, scale=1.5):
+    rolling = pd.Series(values).rolling(window)
+    q1, q3 = rolling.quantile(0.25), rolling.quantile(0.75)
+    return q1 - scale * (q3 - q1), q3 + scale * (q3 - q1)
+
+
+def test_small_rolling_windows_match_pandas_exactly():
+    values = np.random.default_rng(4).standard_t(3, 3000)
+    detector = OutlierDetector(window=252, k=200)
+    bounds = np.array([detector.update(value)[:2] for value in values])
+
+    lower_bound, upper_bound = rolling_iqr_bounds(values, 252)
+    np.testing.assert_allclose(bounds[251:, 0], lower_bound[251:], rtol=1e-12)
+    np.testing.assert_allclose(bounds[251:, 1], upper_bound[251:], rtol=1e-12)
+
+
+def test_large_rolling_windows_stay_close_to_pandas():
+    values = np.random.default_rng(5).standard_normal(12000)
+    detector = OutlierDetector(window=2000, k=100, seed=6)
+    bounds = np.array([detector.update(value)[:2] for value in values])
+
+    # The sketch covers up to window / blocks older observations and lags by count / (2 k) ranks
+    lower_bound, upper_bound = rolling_iqr_bounds(values, 2000)
+    np.testing.assert_allclose(bounds[2000:, 0], lower_bound[2000:], atol=0.15)
+    np.testing.assert_allclose(bounds[2000:, 1], upper_bound[2000:], atol=0.15)
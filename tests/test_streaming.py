@@ -0,0 +1,67 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from analytics import (
+    fill_missing, log_returns, risk_adjust, rolling_sharpe, rolling_sortino, rolling_beta, rolling_treynor,
+    rolling_alpha, rolling_downside_deviation
+)
+from streaming import RollingCovariance, RollingDownside, RollingMoments, StreamingRatios
+
+
+def sample_closes(length=400, seed=0):
+    generator = np.random.default_rng(seed)
+    dates = pd.bdate_range('2018-01-01', periods=length)
+    market = generator.normal(0.0003, 0.01, length)
+    closes = pd.Series(100 * np.exp(np.cumsum(1.1 * market + generator.normal(0, 0.01, length))), index=dates)
+    benchmark_closes = pd.Series(1000 * np.exp(np.cumsum(market)), index=dates)
+    return closes, benchmark_closes
+
+
+def test_estimators_match_pandas_after_the_buffer_wraps():
+    generator = np.random.default_rng(1)
+    x = pd.Series(generator.normal(0, 0.01, 200))
+    y = pd.Series(generator.normal(0, 0.01, 200))
+    moments, covariance, downside = RollingMoments(21), RollingCovariance(21), RollingDownside(21)
+    means, variances, covariances, betas, deviations = [], [], [], [], []
+    for x_value, y_value in zip(x, y):
+        moments.update(x_value)
+        covariance.update(x_value, y_value)
+        downside.update(x_value)
+        means.append(moments.mean)
+        variances.append(moments.variance)
+        covariances.append(covariance.covariance)
+        betas.append(covariance.beta)
+        deviations.append(downside.deviation)
+
+    np.testing.assert_allclose(means[20:], x.rolling(21).mean()[20:], atol=1e-15)
+    np.testing.assert_allclose(variances[20:], x.rolling(21).var()[20:], rtol=1e-9)
+    np.testing.assert_allclose(covariances[20:], x.rolling(21).cov(y)[20:], rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(betas[20:], rolling_beta(x, y, 21)[20:], rtol=1e-9)
+    np.testing.assert_allclose(deviations[20:], rolling_downside_deviation(x, 21)[20:], rtol=1e-9)
+
+
+def test_streaming_ratios_match_the_scripts_across_a_saved_state():
+    closes, benchmark_closes = sample_closes()
+    ratios = StreamingRatios(window=21)
+    streamed = []
+    for position, (close, benchmark_close) in enumerate(zip(closes, benchmark_closes)):
+        if position == 250:
+            # The state survives a round trip through JSON mid-stream
+            ratios = StreamingRatios.from_dict(json.loads(json.dumps(ratios.to_dict())))
+        streamed.append(ratios.update(close, benchmark_close))
+    streamed = pd.DataFrame(streamed[1:], index=closes.index[1:])
+
+    returns = risk_adjust(log_returns(fill_missing(closes)))
+    benchmark_returns = log_returns(fill_missing(benchmark_closes))
+    beta = rolling_beta(returns, benchmark_returns, 21)
+    expected = pd.DataFrame({
+        'sharpe': fill_missing(rolling_sharpe(returns, 21)),
+        'sortino': fill_missing(rolling_sortino(returns, 21)),
+        'beta': beta,
+        'treynor': fill_missing(rolling_treynor(returns, beta, 21)),
+        'alpha': rolling_alpha(returns, benchmark_returns, beta, 21),
+    })
+    assert streamed.iloc[:20].isna().all().all()
+    pd.testing.assert_frame_equal(streamed.iloc[20:], expected.iloc[20:], rtol=1e-8, check_freq=False)
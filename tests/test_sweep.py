@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+import sweep
+from analytics import fill_missing, log_returns, risk_adjust, rolling_sharpe
+from sweep import sharpe_sweep, tidy_sweep
+
+
+def sample_returns():
+    generator = np.random.default_rng(2)
+    returns = pd.Series(generator.normal(0.0004, 0.01, 600), index=pd.bdate_range('2020-01-01', periods=600))
+    returns.iloc[[0, 300]] = np.nan
+    return returns
+
+
+def test_sweep_matches_rolling_sharpe_for_every_window_and_rate():
+    returns = sample_returns()
+    metrics = sharpe_sweep(returns, [5, 21, 63], [0.05, 0.06])
+
+    assert list(metrics) == ['mean', 'std', 'sharpe']
+    assert metrics['sharpe'].shape == (600, 6)
+    assert metrics['sharpe'].columns.names == ['risk_free_rate', 'window']
+    for rate in [0.05, 0.06]:
+        for window in [5, 21, 63]:
+            expected = rolling_sharpe(risk_adjust(returns, rate), window)
+            pd.testing.assert_series_equal(
+                metrics['sharpe'][(rate, window)], expected, check_names=False, rtol=1e-8
+            )
+
+
+def test_sweep_without_rates_is_keyed_by_window():
+    returns = sample_returns()
+    metrics = sharpe_sweep(returns, [21, 63])
+
+    assert list(metrics['sharpe'].columns) == [21, 63]
+    pd.testing.assert_series_equal(
+        metrics['std'][21], returns.rolling(21).std(), check_names=False, rtol=1e-8
+    )
+
+
+def test_tidy_table_has_one_row_per_full_window_and_rate():
+    returns = sample_returns()
+    table = tidy_sweep(sharpe_sweep(returns, [5, 21], [0.05, 0.06]))
+
+    # Windows that contain the missing return at row 300 are left out too
+    full_windows = sum(returns.rolling(window).mean().notna().sum() for window in [5, 21])
+    assert len(table) == 2 * full_windows
+    assert list(table.columns) == ['date', 'risk_free_rate', 'window', 'mean', 'std', 'sharpe']
+    assert table['sharpe'].notna().all()
+
+
+def test_main_writes_the_tidy_table(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(sweep, 'get_prices', lambda symbol: store.update(symbol))
+    output = tmp_path / 'sweep.parquet'
+    sweep.main(['aaa', '--windows', '21', '63', '--risk-free-rates', '0.05', '--output', str(output)])
+
+    table = pd.read_parquet(output)
+    returns = log_returns(fill_missing(store.load('AAA')['Close']))
+    last = table[(table['window'] == 63) & (table['date'] == returns.index[-1])]
+    assert len(table) == (len(returns) - 20) + (len(returns) - 62)
+    assert np.isclose(last['sharpe'].item(), rolling_sharpe(risk_adjust(returns, 0.05), 63).iloc[-1])
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+from arch.unitroot import ADF
+
+from unitroot_monitor import rolling_adf
+
+
+def test_expanding_windows_match_arch_default_lag_search():
+    generator = np.random.default_rng(2)
+    noise = generator.normal(size=1200)
+    values = np.zeros(1200)
+    for t in range(5, 1200):
+        values[t] = 0.5 * values[t - 1] - 0.3 * values[t - 2] + 0.25 * values[t - 5] + noise[t]
+    series = pd.Series(np.cumsum(values))
+
+    monitor = rolling_adf(series, window=None, min_periods=100)
+    for end in (99, 400, 1199):
+        expected = ADF(series.iloc[:end + 1].to_numpy())
+        assert monitor['adf_lags'].iloc[end] == expected.lags
+        assert np.isclose(monitor['adf_stat'].iloc[end], expected.stat)
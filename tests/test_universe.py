@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import fill_missing
+from batch import build_returns_matrix, load_closes
+from universe import Universe, screen
+
+SYMBOLS = ['^JKSE', 'AAA', 'BBB']
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 37, 10000])
+def test_blocked_returns_match_the_batch_matrix(store, tmp_path, chunk_rows):
+    root = str(tmp_path / 'universe')
+    _, errors = Universe.build(root, SYMBOLS + ['MISSING'], store, dtype='float64')
+    assert list(errors) == ['MISSING']
+    universe = Universe(root, mode='r+', chunk_bytes=chunk_rows * len(SYMBOLS) * 8)
+    assert universe.chunk_rows() == chunk_rows
+
+    closes, _ = load_closes(SYMBOLS, store)
+    pd.testing.assert_frame_equal(universe.frame(), closes, check_names=False, check_freq=False, check_index_type=False)
+
+    # BBB is listed at row 200, so the blocks cross its first close
+    universe.fill_missing(backward=False)
+    returns = pd.DataFrame(universe.log_returns(), index=universe.dates, columns=universe.symbols)
+    expected = build_returns_matrix(closes)
+    pd.testing.assert_frame_equal(returns.iloc[1:], expected, check_names=False, check_freq=False, check_index_type=False, rtol=1e-12)
+
+    # The screen gives the same rows whatever the number of symbols per block
+    whole = screen(universe, universe.open_returns(), window=21)
+    universe.chunk_bytes = len(universe.dates) * 8
+    pd.testing.assert_frame_equal(screen(universe, universe.open_returns(), window=21), whole)
+
+
+def test_blocked_fill_matches_fill_missing(store, tmp_path):
+    root = str(tmp_path / 'universe')
+    Universe.build(root, SYMBOLS, store, dtype='float64')
+    universe = Universe(root, mode='r+', chunk_bytes=13 * len(SYMBOLS) * 8)
+    closes = universe.frame()
+    closes.iloc[[5, 6, 300, 301, 302], 1] = np.nan
+    universe.closes[[5, 6, 300, 301, 302], 1] = np.nan
+
+    universe.fill_missing()
+    pd.testing.assert_frame_equal(universe.frame(), fill_missing(closes))